@@ -51,7 +51,10 @@ CREATE TABLE alerts (
     message TEXT,
     status VARCHAR(20) DEFAULT 'active',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    resolved_at TIMESTAMP
+    resolved_at TIMESTAMP,
+    last_seen_at TIMESTAMP,
+    last_notified_at TIMESTAMP,
+    occurrences INTEGER DEFAULT 1
 );
 
 -- Users table for authentication
@@ -77,4 +80,11 @@ CREATE TABLE user_site_access (
 -- Indexes for performance
 CREATE INDEX idx_test_runs_site_timestamp ON test_runs(site_id, timestamp);
 CREATE INDEX idx_endpoint_results_test_run ON endpoint_results(test_run_id);
-CREATE INDEX idx_alerts_site_status ON alerts(site_id, status);
\ No newline at end of file
+CREATE INDEX idx_alerts_site_status ON alerts(site_id, status);
+
+-- Covering partial index for the recent low-health alert lookup
+CREATE INDEX idx_endpoint_results_low_health ON endpoint_results(timestamp, health_score)
+    INCLUDE (test_run_id, endpoint) WHERE health_score < 70;
+
+-- At most one active alert per site/endpoint/type (repeat breaches update it)
+CREATE UNIQUE INDEX idx_alerts_active_key ON alerts(site_id, endpoint, alert_type) WHERE status = 'active';
\ No newline at end of file
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 
-import smtplib
 import json
 import os
-import requests
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from database_manager import DatabaseManager
+from notification_dispatcher import NotificationDispatcher, EmailChannel, SlackChannel
+from rule_engine import RuleEngine, AlertRule, DEFAULT_STATE_FILE as DEFAULT_RULE_STATE_FILE
+from anomaly_detector import AnomalyDetector
 from typing import Dict, List
 from dotenv import load_dotenv
 
@@ -15,8 +14,12 @@ dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path)
 
 class AlertManager:
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, db=None, anomaly_state: str = None, rule_state: str = None):
+        # The caller's DatabaseManager, or a callable returning one (e.g. the processor's
+        # lazy property); either way nothing connects until an alert actually needs the DB,
+        # so rules and anomaly detection keep working while it is unreachable
+        self._db = None if callable(db) else db
+        self._db_factory = db if callable(db) else DatabaseManager
         self.smtp_config = {
             'host': os.getenv('SMTP_HOST', 'smtp.gmail.com'),
             'port': int(os.getenv('SMTP_PORT', '587')),
@@ -25,80 +28,164 @@ class AlertManager:
         }
         self.slack_webhook = os.getenv('SLACK_WEBHOOK_URL', '')
         self.alert_email = os.getenv('ALERT_EMAIL', 'admin@company.com')
+        # Minutes before a still-active alert is notified again
+        self.cooldown_minutes = int(os.getenv('ALERT_COOLDOWN_MINUTES', '30'))
         
-    def check_health_alerts(self, site: str, health_threshold: int = 70):
-        """Check for health score alerts and send notifications"""
-        alerts = self.db.check_health_alerts(site, health_threshold)
+        # Channels keep their SMTP connection / HTTP session open between alerts
+        self.email_channel = None
+        if self.smtp_config['username'] and self.smtp_config['password']:
+            self.email_channel = EmailChannel(
+                self.smtp_config['host'], self.smtp_config['port'],
+                self.smtp_config['username'], self.smtp_config['password'], self.alert_email,
+                starttls=os.getenv('SMTP_STARTTLS', '1') != '0'
+            )
+        self.slack_channel = None
+        if self.slack_webhook:
+            self.slack_channel = SlackChannel(self.slack_webhook, timeout=float(os.getenv('SLACK_TIMEOUT_SECONDS', '5')))
         
-        for alert in alerts:
-            message = f"Health Alert: {alert['endpoint']} on {alert['name']} has health score {alert['health_score']}"
-            
-            # Create alert record
-            self.db.create_alert(
-                site=alert['name'],
-                endpoint=alert['endpoint'],
-                alert_type='health_score',
-                threshold=health_threshold,
-                current=alert['health_score'],
-                message=message
+        # Streaming rules (alert_rules.json) evaluated on in-memory aggregates
+        # Streaks and notification times persist, as each log file may be processed by a new process
+        self.rule_engine = RuleEngine(renotify_seconds=self.cooldown_minutes * 60,
+                                      state_path=rule_state if rule_state is not None else os.getenv('APILENS_RULE_STATE', DEFAULT_RULE_STATE_FILE))
+        
+        # Per-endpoint latency/error-rate baselines, persisted between restarts
+        self.anomaly_detector = None
+        if os.getenv('APILENS_ANOMALY_DETECTION', '1') != '0':
+            self.anomaly_detector = AnomalyDetector(
+                alpha=float(os.getenv('ANOMALY_EWMA_ALPHA', '0.2')),
+                z_threshold=float(os.getenv('ANOMALY_Z_THRESHOLD', '3.0')),
+                state_path=anomaly_state
             )
-            
-            # Send notifications
-            if self.smtp_config['username'] and self.smtp_config['password']:
-                self.send_email_alert(alert['name'], message)
-            
-            if self.slack_webhook:
-                self.send_slack_alert(alert['name'], message)
+        
+        # Notifications are delivered off the processing loop, coalesced per site
+        self.dispatcher = NotificationDispatcher(
+            [c for c in (self.email_channel, self.slack_channel) if c],
+            coalesce_window=float(os.getenv('ALERT_COALESCE_SECONDS', '60')),
+            rate_per_minute=float(os.getenv('ALERT_RATE_LIMIT_PER_MINUTE', '10'))
+        )
+    
+    @property
+    def db(self) -> DatabaseManager:
+        if self._db is None:
+            self._db = self._db_factory()
+        return self._db
+        
+    def check_health_alerts(self, site: str, health_threshold: int = 70):
+        """Check for health score alerts and send one digest notification per site"""
+        outcome = self.db.evaluate_health_alerts(site, health_threshold, self.cooldown_minutes)
+        self.notify(site, outcome)
+        return outcome
+    
+    def notify(self, site: str, outcome: Dict[str, List[Dict]]):
+        """Send a single notification covering every alert opened, repeated or resolved"""
+        firing = outcome.get('opened', []) + outcome.get('repeated', [])
+        resolved = outcome.get('resolved', [])
+        if not firing and not resolved:
+            return
+        
+        self.dispatcher.notify(site, self.format_digest(site, outcome))
+    
+    def format_digest(self, site: str, outcome: Dict[str, List[Dict]], max_lines: int = 20) -> str:
+        """Summarize alert changes for a site in one message"""
+        lines = []
+        for label, key in (('New', 'opened'), ('Still failing', 'repeated')):
+            alerts = outcome.get(key, [])
+            if not alerts:
+                continue
+            lines.append(f"{label} ({len(alerts)}):")
+            for alert in alerts[:max_lines]:
+                lines.append(f"  - {alert['message']}")
+            if len(alerts) > max_lines:
+                lines.append(f"  ... and {len(alerts) - max_lines} more")
+        
+        resolved = outcome.get('resolved', [])
+        if resolved:
+            lines.append(f"Resolved ({len(resolved)}): " + ", ".join(a['endpoint'] for a in resolved[:max_lines])
+                         + (" ..." if len(resolved) > max_lines else ""))
+        
+        return f"API Lens alerts for {site}\n" + "\n".join(lines)
     
     def send_email_alert(self, site: str, message: str):
-        """Send email alert"""
+        """Send email alert immediately, reusing the SMTP connection"""
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.smtp_config['username']
-            msg['To'] = self.alert_email
-            msg['Subject'] = f'API Lens Alert - {site}'
-            
-            msg.attach(MIMEText(message, 'plain'))
-            
-            server = smtplib.SMTP(self.smtp_config['host'], self.smtp_config['port'])
-            server.starttls()
-            server.login(self.smtp_config['username'], self.smtp_config['password'])
-            server.send_message(msg)
-            server.quit()
-            
+            if not self.email_channel:
+                raise RuntimeError("SMTP credentials are not configured")
+            self.email_channel.send(site, message)
             print(f"Email alert sent for {site}")
         except Exception as e:
             print(f"Failed to send email alert: {e}")
     
     def send_slack_alert(self, site: str, message: str):
-        """Send Slack alert"""
+        """Send Slack alert immediately through the pooled session"""
         try:
-            payload = {
-                'text': f'API Lens Alert',
-                'attachments': [{
-                    'color': 'danger',
-                    'fields': [{
-                        'title': f'Site: {site}',
-                        'value': message,
-                        'short': False
-                    }]
-                }]
-            }
-            
-            response = requests.post(self.slack_webhook, json=payload)
-            if response.status_code == 200:
-                print(f"Slack alert sent for {site}")
-            else:
-                print(f"Failed to send Slack alert: {response.status_code}")
+            if not self.slack_channel:
+                raise RuntimeError("SLACK_WEBHOOK_URL is not configured")
+            self.slack_channel.send(site, message)
+            print(f"Slack alert sent for {site}")
         except Exception as e:
             print(f"Failed to send Slack alert: {e}")
     
-    def check_latency_alerts(self, site: str, latency_threshold: int = 5000):
-        """Check for high latency alerts"""
-        # Implementation for latency-based alerts
-        pass
+    def close(self):
+        """Deliver pending notifications and close channel connections"""
+        self.dispatcher.close()
+        self.rule_engine.save()
+        if self.anomaly_detector:
+            self.anomaly_detector.save()
+    
+    def evaluate_rules(self, site: str, endpoint_stats: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+        """Evaluate streaming alert rules on a run's per-endpoint aggregates.
+        
+        Evaluation happens in memory; the database is only touched to record
+        alerts when a rule opens, repeats or resolves."""
+        events = self.rule_engine.evaluate(site, endpoint_stats)
+        if not any(events.values()):
+            return events
+        
+        self.notify(site, events)
+        
+        try:
+            self._record_rule_events(site, events)
+        except Exception as e:
+            print(f"Failed to record rule alerts: {e}")
+        return events
+    
+    def detect_anomalies(self, site: str, endpoint_stats: Dict[str, Dict]) -> Dict[str, List]:
+        """Update the online latency/error-rate baselines with a run and alert on anomalies"""
+        if not self.anomaly_detector:
+            return {'opened': [], 'repeated': [], 'resolved': [], 'scores': []}
+        events = self.anomaly_detector.observe_run(site, endpoint_stats)
+        if not events['opened'] and not events['resolved']:
+            return events
+        
+        self.notify(site, events)
+        
+        try:
+            self._record_rule_events(site, events)
+        except Exception as e:
+            print(f"Failed to record anomaly alerts: {e}")
+        return events
+    
+    def _record_rule_events(self, site: str, events: Dict[str, List[Dict]]):
+        by_type = {}
+        for alert in events['opened'] + events['repeated']:
+            by_type.setdefault(alert['alert_type'], {'breaches': {}, 'messages': {}, 'resolve': [], 'threshold': alert['threshold']})
+            by_type[alert['alert_type']]['breaches'][alert['endpoint']] = alert['current']
+            by_type[alert['alert_type']]['messages'][alert['endpoint']] = alert['message']
+        for alert in events['resolved']:
+            by_type.setdefault(alert['alert_type'], {'breaches': {}, 'messages': {}, 'resolve': [], 'threshold': None})
+            by_type[alert['alert_type']]['resolve'].append(alert['endpoint'])
+        
+        for alert_type, change in by_type.items():
+            self.db.upsert_alerts(site, alert_type, change['breaches'], change['threshold'], change['messages'],
+                                  cooldown_minutes=self.cooldown_minutes, resolve_missing=False,
+                                  resolve=change['resolve'])
+    
+    def check_latency_alerts(self, site: str, latency_threshold: int = 5000, endpoint_stats: Dict[str, Dict] = None) -> Dict[str, float]:
+        """Check for high latency alerts: endpoints whose average latency exceeds the threshold"""
+        rule = AlertRule('latency', 'avg_latency', '>', latency_threshold)
+        return self.rule_engine.check(rule, site, endpoint_stats or {})
     
-    def check_failure_rate_alerts(self, site: str, failure_threshold: float = 0.1):
-        """Check for high failure rate alerts"""
-        # Implementation for failure rate alerts
-        pass
\ No newline at end of file
+    def check_failure_rate_alerts(self, site: str, failure_threshold: float = 0.1, endpoint_stats: Dict[str, Dict] = None) -> Dict[str, float]:
+        """Check for high failure rate alerts: endpoints failing more than the threshold"""
+        rule = AlertRule('failure_rate', 'failure_rate', '>', failure_threshold)
+        return self.rule_engine.check(rule, site, endpoint_stats or {})
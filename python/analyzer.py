@@ -6,13 +6,20 @@ import os
 from datetime import datetime
 from snapshot_loader import SnapshotLoader
 from comparison_engine import ComparisonEngine
-from prometheus_server import PrometheusServer
 
 class ApiLensAnalyzer:
     def __init__(self):
         self.loader = SnapshotLoader()
         self.comparator = ComparisonEngine()
-        self.prometheus = PrometheusServer()
+        # prometheus_client is only imported, and gauges registered, in server mode
+        self._prometheus = None
+    
+    @property
+    def prometheus(self):
+        if self._prometheus is None:
+            from prometheus_server import PrometheusServer
+            self._prometheus = PrometheusServer()
+        return self._prometheus
     
     def analyze_latest_runs(self, output_file: str = None):
         """Analyze the two most recent runs"""
@@ -24,16 +31,12 @@ class ApiLensAnalyzer:
         
         print(f"📊 Comparing runs: {timestamps[0]} vs {timestamps[1]}")
         
-        # Load snapshots
-        current_apis = self.loader.load_snapshot(timestamps[0])
-        previous_apis = self.loader.load_snapshot(timestamps[1])
-        
-        # Group by patterns
-        current_groups = self.loader.group_apis_by_pattern(current_apis)
-        previous_groups = self.loader.group_apis_by_pattern(previous_apis)
+        # Summaries come from sidecar files; snapshots are only parsed when new or changed
+        current = self.loader.load_summary(timestamps[0], self.comparator)
+        previous = self.loader.load_summary(timestamps[1], self.comparator)
         
         # Compare and generate insights
-        comparison = self.comparator.compare_runs(current_groups, previous_groups)
+        comparison = self.comparator.compare_summaries(current, previous)
         
         # Print insights
         self._print_insights(comparison)
@@ -44,11 +47,46 @@ class ApiLensAnalyzer:
                 json.dump(comparison, f, indent=2)
             print(f"💾 Analysis saved to {output_file}")
         
-        # Update Prometheus metrics
-        self.prometheus.update_metrics(current_groups)
+        # Update Prometheus metrics when serving them
+        if self._prometheus is not None:
+            self._prometheus.update_from_summary(current)
         
         return comparison
     
+    def load_summaries(self, count: int) -> list:
+        """(snapshot, summary) pairs for the latest `count` snapshots, oldest first"""
+        return [(timestamp, self.loader.load_summary(timestamp, self.comparator))
+                for timestamp in reversed(self.loader.get_latest_snapshots(count))]
+    
+    def analyze_trend(self, count: int = 24, output_file: str = None):
+        """Trend over the last `count` runs plus a week-over-week comparison"""
+        summaries = self.load_summaries(count)
+        if len(summaries) < 2:
+            print("❌ Need at least 2 snapshots for a trend")
+            return None
+        
+        print(f"📊 Trend over {len(summaries)} runs: {summaries[0][0]} → {summaries[-1][0]}")
+        trend = self.comparator.compare_trend(summaries)
+        trend['week_over_week'] = self.comparator.compare_periods([summary for _, summary in summaries])
+        
+        for point in trend['series']:
+            print(f"   {point['snapshot']}: {point['total']} APIs, {point['failures']} failures, {point['empty']} empty")
+        if trend['insights']:
+            print(f"\n💡 INSIGHTS:")
+            for insight in trend['insights']:
+                print(f"   • {insight}")
+        if trend['week_over_week']:
+            print(f"\n📅 WEEK OVER WEEK:")
+            for insight in trend['week_over_week']['insights'] or ["No significant changes detected"]:
+                print(f"   • {insight}")
+        
+        if output_file:
+            with open(output_file, 'w') as f:
+                json.dump(trend, f, indent=2)
+            print(f"💾 Trend saved to {output_file}")
+        
+        return trend
+    
     def _print_insights(self, comparison: dict):
         """Print comparison insights to console"""
         print("\n" + "="*60)
@@ -108,8 +146,11 @@ def main():
         elif sys.argv[1] == "analyze":
             output_file = sys.argv[2] if len(sys.argv) > 2 else "analysis_summary.json"
             analyzer.analyze_latest_runs(output_file)
+        elif sys.argv[1] == "trend":
+            count = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+            analyzer.analyze_trend(count)
         else:
-            print("Usage: python analyzer.py [analyze|server] [output_file]")
+            print("Usage: python analyzer.py [analyze|server|trend] [output_file|count]")
     else:
         # Default: analyze and print
         analyzer.analyze_latest_runs()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Online anomaly detection for per-endpoint latency and error rate.
+
+Each (site, endpoint, metric) series keeps an exponentially weighted mean and
+variance (EWMA/EWMV) plus one-sided CUSUM sums, i.e. O(1) state updated once
+per run. A run is flagged when its z-score against the running baseline
+exceeds z_threshold (sudden spike) or when the CUSUM statistic crosses
+cusum_h (smaller but sustained shift). State is saved to a JSON file so
+baselines survive restarts.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'anomaly_state.json')
+
+class SeriesState:
+    """EWMA/EWMV baseline and CUSUM sums for one metric series"""
+    __slots__ = ('count', 'mean', 'var', 'cusum', 'flagged')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, var: float = 0.0, cusum: float = 0.0, flagged: bool = False):
+        self.count = count
+        self.mean = mean
+        self.var = var
+        self.cusum = cusum
+        self.flagged = flagged
+
+    def to_list(self) -> list:
+        return [self.count, self.mean, self.var, self.cusum, self.flagged]
+
+    @classmethod
+    def from_list(cls, values: list) -> 'SeriesState':
+        return cls(*values)
+
+class AnomalyDetector:
+    def __init__(self, alpha: float = 0.2, z_threshold: float = 3.0, warmup: int = 5,
+                 cusum_k: float = 0.5, cusum_h: float = 5.0, min_std: Dict[str, float] = None,
+                 min_rel_std: float = 0.05, state_path: str = None, save_every: int = 50,
+                 save_interval: float = 30.0):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        # Floors keep a perfectly flat baseline (e.g. 0% errors) from turning any blip into z=inf
+        self.min_std = min_std or {'latency': 5.0, 'error_rate': 0.02}
+        self.min_rel_std = min_rel_std
+        self.state_path = state_path if state_path is not None else os.getenv('APILENS_ANOMALY_STATE', DEFAULT_STATE_FILE)
+        self.save_every = save_every
+        # Periodic saves rewrite every series, so they are also spaced in time:
+        # a backfill feeding thousands of runs must not re-serialize the state per run
+        self.save_interval = save_interval
+
+        self._series = {}
+        self._lock = threading.Lock()
+        self._updates_since_save = 0
+        self._last_save = time.monotonic()
+        self.load()
+
+    def update(self, key: Tuple[str, str, str], value: float) -> Optional[Dict]:
+        """Feed one observation. Returns a dict with the score and whether the
+        series is anomalous, or None while the baseline is still warming up."""
+        metric = key[2]
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = SeriesState()
+
+            result = None
+            if state.count >= self.warmup:
+                std = max(math.sqrt(state.var), self.min_std.get(metric, 0.0), self.min_rel_std * abs(state.mean))
+                z = (value - state.mean) / std if std > 0 else 0.0
+                state.cusum = max(0.0, state.cusum + z - self.cusum_k)
+
+                spike = z > self.z_threshold
+                shift = state.cusum > self.cusum_h
+                if shift:
+                    # Signal once, then start accumulating evidence afresh
+                    state.cusum = 0.0
+
+                was_flagged = state.flagged
+                if spike or shift:
+                    state.flagged = True
+                elif was_flagged and z < self.z_threshold / 2:
+                    state.flagged = False
+
+                result = {'zscore': z, 'baseline': state.mean, 'value': value, 'spike': spike, 'shift': shift,
+                          'started': state.flagged and not was_flagged,
+                          'recovered': was_flagged and not state.flagged}
+
+            # EWMA / EWMV update (West's incremental form)
+            if state.count == 0:
+                state.mean = value
+            else:
+                diff = value - state.mean
+                increment = self.alpha * diff
+                state.mean += increment
+                state.var = (1 - self.alpha) * (state.var + diff * increment)
+            state.count += 1
+
+            self._updates_since_save += 1
+            due = (self.save_every and self._updates_since_save >= self.save_every
+                   and time.monotonic() - self._last_save >= self.save_interval)
+
+        if due:
+            self.save()
+        return result
+
+    def observe_run(self, site: str, endpoint_stats: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+        """Update latency and error-rate series for every endpoint in a run.
+
+        Only increases are treated as anomalies. Returns the same event shape
+        as RuleEngine.evaluate ('opened' / 'resolved'), plus 'scores' with the
+        (endpoint, metric, zscore) of every series past its warmup."""
+        events = {'opened': [], 'repeated': [], 'resolved': [], 'scores': []}
+        for endpoint, stats in endpoint_stats.items():
+            calls = stats.get('calls', 0)
+            if not calls:
+                continue
+            latencies = stats.get('latencies') or []
+            latency = stats.get('avg_latency', sum(latencies) / len(latencies) if latencies else 0)
+            values = {'latency': latency, 'error_rate': stats.get('failures', 0) / calls}
+
+            for metric, value in values.items():
+                result = self.update((site, endpoint, metric), value)
+                if result is None:
+                    continue
+                events['scores'].append((endpoint, metric, result['zscore']))
+                alert_type = f"{metric}_anomaly"
+                if result['started']:
+                    kind = 'spike' if result['spike'] else 'sustained shift'
+                    events['opened'].append({
+                        'site': site, 'endpoint': endpoint, 'alert_type': alert_type,
+                        'threshold': self.z_threshold, 'current': round(result['zscore'], 2),
+                        'message': (f"{metric.replace('_', ' ').capitalize()} anomaly ({kind}): {endpoint} on {site} "
+                                    f"at {value:.4g} vs baseline {result['baseline']:.4g} (z={result['zscore']:.1f})")
+                    })
+                elif result['recovered']:
+                    events['resolved'].append({'site': site, 'endpoint': endpoint, 'alert_type': alert_type})
+        return events
+
+    def load(self):
+        """Restore baselines saved by a previous process"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                saved = json.load(f)
+            with self._lock:
+                self._series = {}
+            self.import_state(saved.get('series', {}))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Ignoring unreadable anomaly state {self.state_path}: {e}")
+
+    def save(self):
+        """Write baselines atomically"""
+        if not self.state_path:
+            return
+        snapshot = self.export_state()
+        with self._lock:
+            self._updates_since_save = 0
+            self._last_save = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'series': snapshot}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def export_state(self, site: str = None) -> Dict[str, list]:
+        """Series as saved to disk ({"site\tendpoint\tmetric": [...]}), optionally for one site"""
+        with self._lock:
+            return {'\t'.join(key): state.to_list() for key, state in self._series.items()
+                    if site is None or key[0] == site}
+
+    def import_state(self, series: Dict[str, list], replace_sites: Iterable[str] = ()):
+        """Load series from export_state(); existing series of replace_sites are dropped first"""
+        replace_sites = set(replace_sites)
+        with self._lock:
+            if replace_sites:
+                self._series = {key: state for key, state in self._series.items() if key[0] not in replace_sites}
+            for key, values in series.items():
+                self._series[tuple(key.split('\t'))] = SeriesState.from_list(values)
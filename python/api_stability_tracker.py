@@ -56,6 +56,51 @@ class ApiStabilityTracker:
         prev_failures = sum(1 for log in previous_logs if log['status_code'] >= 500)
         prev_empty = sum(1 for log in previous_logs if log['response_size'] == 0)
         
+        return self._score_counts(total_calls, failures, empty_responses, prev_total, prev_failures, prev_empty)
+    
+    def compute_stability_scores_from_history(self, store, site: str = None, now: datetime = None) -> Dict[str, Dict[str, Any]]:
+        """Stability scores straight from a HistoryStore, without loading logs into memory.
+        
+        Only the chunks overlapping the last 14 days are scanned, reading the
+        mapped columns in place."""
+        from datetime import timezone
+        from history_store import to_epoch_ms
+        now = now or datetime.now(timezone.utc)
+        current_start = to_epoch_ms(now - timedelta(days=7))
+        previous_start = to_epoch_ms(now - timedelta(days=14))
+        site_id = store.string_id(site) if site is not None else None
+        if site is not None and site_id is None:
+            return {}
+        
+        # endpoint id -> [total, failures, empty, prev_total, prev_failures, prev_empty]
+        counts = {}
+        for columns in store.scan(start=previous_start, site=site):
+            # The empty flag, not size == 0: captures store no sizes (size 0 for every call)
+            rows = zip(columns['timestamp'], columns['site'], columns['endpoint'], columns['status'], columns['empty'])
+            for ts, row_site, endpoint, status, empty in rows:
+                if ts < previous_start or (site_id is not None and row_site != site_id):
+                    continue
+                endpoint_counts = counts.get(endpoint)
+                if endpoint_counts is None:
+                    endpoint_counts = counts[endpoint] = [0, 0, 0, 0, 0, 0]
+                offset = 0 if ts >= current_start else 3
+                endpoint_counts[offset] += 1
+                if status >= 500:
+                    endpoint_counts[offset + 1] += 1
+                if empty:
+                    endpoint_counts[offset + 2] += 1
+        
+        return self.compute_stability_scores_from_counts(
+            {store.string(endpoint): endpoint_counts for endpoint, endpoint_counts in counts.items()})
+    
+    def compute_stability_scores_from_counts(self, counts: Dict[str, List[int]]) -> Dict[str, Dict[str, Any]]:
+        """Stability scores from per-endpoint window counts
+        ([total, failures, empty, prev_total, prev_failures, prev_empty])"""
+        return {endpoint: self._score_counts(*endpoint_counts) for endpoint, endpoint_counts in counts.items()}
+    
+    def _score_counts(self, total_calls: int, failures: int, empty_responses: int,
+                      prev_total: int, prev_failures: int, prev_empty: int) -> Dict[str, Any]:
+        """Score an endpoint from its current and previous window counts"""
         # Calculate rates
         current_failure_rate = (failures + empty_responses) / total_calls if total_calls > 0 else 0
         prev_failure_rate = (prev_failures + prev_empty) / prev_total if prev_total > 0 else 0
@@ -96,9 +141,10 @@ class ApiStabilityTracker:
         
         return max(0, int(score))
     
-    def export_summary(self, filepath: str = None) -> str:
+    def export_summary(self, filepath: str = None, summary: Dict[str, Dict[str, Any]] = None) -> str:
         """Export stability summary as JSON"""
-        summary = self.compute_stability_scores()
+        if summary is None:
+            summary = self.compute_stability_scores()
         json_output = json.dumps(summary, indent=2)
         
         if filepath:
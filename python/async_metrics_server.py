@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+asyncio implementation of the multi-site metrics daemon.
+
+The event loop only schedules work, so one process can follow hundreds of
+sites without one site's backlog delaying another site's new runs:
+
+- a watcher task lists new logs every scan interval (directory listing and
+  shard leases run off the loop);
+- each site has its own task and queue, processing that site's logs in
+  order; if one site task fails, the others are cancelled and the daemon
+  stops with its error;
+- parsing, aggregation and the HTML report (load_run) run in a process
+  pool, so CPU-bound work never holds the loop's GIL;
+- publishing (gauges, alert rules, anomaly baselines, history and the
+  database hand-off) runs on a single processor thread, as
+  MultiSiteProcessor is not thread-safe;
+- with an ingest port, runs POSTed to /ingest/<site> (push_ingest.py) are
+  validated and aggregated in the same pool and queued on their site's
+  task, with at most APILENS_INGEST_QUEUE accepted runs waiting (429 beyond).
+
+/metrics is served live, so instead of a textfile per run (each a dump of
+every site's series) one textfile is written per scan interval in which
+runs were published.
+
+Database writes leave the processor thread through the write-behind queue
+and notifications through the dispatcher's delivery thread, so neither
+PostgreSQL, SMTP nor Slack calls block the loop or the other sites.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from prometheus_client import start_http_server
+from multi_site_metrics_server import MultiSiteMetricsServer
+from multi_site_processor import default_batch_metrics_file, load_run
+from profiling import start_sampling_if_requested
+from push_ingest import DEFAULT_MAX_BYTES, IngestError, IngestServer, prepare_pushed_run
+
+class AsyncMultiSiteMetricsServer(MultiSiteMetricsServer):
+    def __init__(self, port=9879, shard_dir=None, shard_id=None, workers=None, scan_interval=None, metrics_file=None,
+                 ingest_port=None):
+        super().__init__(port=port, shard_dir=shard_dir, shard_id=shard_id)
+        if workers is None:
+            workers = int(os.getenv('APILENS_INGEST_WORKERS', '0')) or os.cpu_count() or 1
+        self.workers = workers
+        self.scan_interval = scan_interval if scan_interval is not None else float(os.getenv('APILENS_SCAN_INTERVAL', '5'))
+        self.metrics_file = metrics_file or default_batch_metrics_file()
+        self._published_since_export = 0
+        
+        # Push ingest (POST /ingest/<site>); off unless a port is set
+        if ingest_port is None and os.getenv('APILENS_INGEST_PORT'):
+            ingest_port = int(os.getenv('APILENS_INGEST_PORT'))
+        self.ingest_port = ingest_port
+        self.ingest_host = os.getenv('APILENS_INGEST_HOST', '0.0.0.0')
+        # Pushed runs accepted but not yet published; beyond this, requests get 429
+        self.ingest_queue_size = int(os.getenv('APILENS_INGEST_QUEUE', '1000'))
+        self.ingest_max_bytes = int(os.getenv('APILENS_INGEST_MAX_BYTES', str(DEFAULT_MAX_BYTES)))
+        self.ingest = None
+        self._pushed_pending = 0
+        
+        # site -> (queue, task) of the task processing that site's logs and pushed runs
+        self._sites = {}
+        self._running = False
+        self._failure = None
+        self._stop = None
+        # Logs queued or in progress, so a scan does not queue them twice
+        self._queued = set()
+        self._pool = None
+        self._publisher = None
+
+    async def run(self, stop: asyncio.Event):
+        """Watch for and process logs (and serve push ingest) until stop is set"""
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='apilens-publisher')
+        self._running, self._failure, self._stop = True, None, stop
+        try:
+            try:
+                if self.ingest_port is not None:
+                    self.ingest = await IngestServer(self.ingest_push, admit=self.admit_push, health=self.ingest_health,
+                                                     max_bytes=self.ingest_max_bytes).start(self.ingest_host, self.ingest_port)
+                    print(f"Push ingest listening on http://{self.ingest_host}:{self.ingest.port}/ingest/<site>")
+                try:
+                    await self.watch(stop)
+                finally:
+                    if self.ingest:
+                        await self.ingest.close()
+                if self._failure is None:
+                    await self.drain_pushed()
+            finally:
+                # Queued logs are left for the next start; a run being published is finished
+                self._running = False
+                tasks = [task for _, task in self._sites.values()]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if self._failure is not None:
+                raise self._failure
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+            loop = asyncio.get_running_loop()
+            if self._published_since_export:
+                await loop.run_in_executor(self._publisher, self.export_metrics)
+            await loop.run_in_executor(self._publisher, self.close)
+            self._publisher.shutdown()
+
+    def site_queue(self, site: str) -> asyncio.Queue:
+        """The queue of a site's task, starting the task for a new site"""
+        if site not in self._sites:
+            queue = asyncio.Queue()
+            task = asyncio.get_running_loop().create_task(self.process_site(site, queue), name=f"site:{site}")
+            task.add_done_callback(self.site_done)
+            self._sites[site] = (queue, task)
+        return self._sites[site][0]
+
+    def site_done(self, task: asyncio.Task):
+        """A site task that fails stops the daemon, which cancels the other sites"""
+        if task.cancelled() or task.exception() is None:
+            return
+        if self._failure is None:
+            self._failure = task.exception()
+            print(f"Error in {task.get_name()}: {self._failure}; stopping")
+        self._stop.set()
+
+    async def watch(self, stop: asyncio.Event):
+        """Queue new logs on their site's task every scan interval"""
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            try:
+                # The shard rebalance may drop a site's series, so it shares the processor thread
+                pending = await loop.run_in_executor(self._publisher, self.pending_logs)
+            except Exception as e:
+                print(f"Error scanning {self.logs_dir}: {e}")
+                pending = []
+            for site, log_file in pending:
+                if log_file in self._queued:
+                    continue
+                self._queued.add(log_file)
+                self.site_queue(site).put_nowait((log_file, None))
+            if self._published_since_export:
+                self._published_since_export = 0
+                await loop.run_in_executor(self._publisher, self.export_metrics)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.scan_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain_pushed(self):
+        """Publish the pushed runs already accepted (they exist nowhere else); queued logs are dropped"""
+        for queue, _ in self._sites.values():
+            items = [queue.get_nowait() for _ in range(queue.qsize())]
+            for log_file, pushed in items:
+                if pushed is None:
+                    self._queued.discard(log_file)
+                else:
+                    queue.put_nowait((log_file, pushed))
+        while self._pushed_pending and self._failure is None:
+            await asyncio.sleep(0.05)
+
+    async def process_site(self, site: str, queue: asyncio.Queue):
+        """Process one site's logs and pushed runs in order: parse in the pool, then publish"""
+        loop = asyncio.get_running_loop()
+        while True:
+            log_file, pushed = await queue.get()
+            if pushed is not None:
+                try:
+                    if await loop.run_in_executor(self._publisher, self.publish_pushed, site, *pushed):
+                        self._published_since_export += 1
+                finally:
+                    self._pushed_pending -= 1
+                continue
+            try:
+                print(f"Processing new log: {site} - {os.path.basename(log_file)}")
+                loaded, error = None, None
+                try:
+                    loaded = await loop.run_in_executor(self._pool, load_run, site, log_file)
+                except Exception as e:
+                    error = e
+                if await loop.run_in_executor(self._publisher, self.process_log, site, log_file, loaded, error, False):
+                    self._published_since_export += 1
+            finally:
+                self._queued.discard(log_file)
+
+    def publish_pushed(self, site: str, loaded, received: float) -> bool:
+        """Publish a run pushed over HTTP (already validated and aggregated)"""
+        if self.shards and not self.shards.holds(site):
+            print(f"⚠️ Lost the claim on {site}; dropping pushed run {loaded[0]['runId']}")
+            return False
+        try:
+            self.processor.apply_run(site, None, *loaded, export=False, received=received)
+            return True
+        except Exception as e:
+            print(f"Error processing pushed run {loaded[0]['runId']} for {site}: {e}")
+            return False
+
+    def admit_push(self, site: str):
+        """None to accept a push for site, else the (status, response) refusing it"""
+        if not self._running:
+            return 503, {'error': 'Shutting down', 'retry_after': 5}
+        if self.shards and site not in self.shards.owned:
+            return 421, {'error': f"Site {site} is handled by another shard"}
+        if self._pushed_pending >= self.ingest_queue_size:
+            return 429, {'error': 'Ingest queue is full', 'retry_after': 1}
+        return None
+
+    async def ingest_push(self, site: str, body: bytes, headers, params):
+        """Validate and aggregate a pushed run in the parse pool, then queue it on its site"""
+        # Checked again: other pushes may have filled the queue while this body was read
+        refusal = self.admit_push(site)
+        if refusal:
+            return refusal
+        self._pushed_pending += 1
+        received = time.time()
+        try:
+            loaded = await asyncio.get_running_loop().run_in_executor(
+                self._pool, prepare_pushed_run, site, body, headers.get('content-type', ''),
+                headers.get('content-encoding', ''), params, self.ingest_max_bytes)
+        except Exception as e:
+            self._pushed_pending -= 1
+            if isinstance(e, IngestError):
+                return e.status, {'error': e.message}
+            print(f"Error preparing pushed run for {site}: {e}")
+            return 500, {'error': str(e)}
+        self.site_queue(site).put_nowait((None, (loaded, received)))
+        data = loaded[0]
+        return 202, {'site': site, 'runId': data['runId'], 'records': len(data['results']), 'pending': self._pushed_pending}
+
+    def ingest_health(self):
+        return {'status': 'ok', 'pending': self._pushed_pending, 'capacity': self.ingest_queue_size, 'sites': len(self._sites)}
+
+    def export_metrics(self):
+        try:
+            self.processor.export_metrics(self.metrics_file)
+        except Exception as e:
+            print(f"Failed to export metrics to {self.metrics_file}: {e}")
+
+    async def serve(self):
+        """Serve /metrics and process logs until SIGINT/SIGTERM"""
+        start_http_server(self.port)
+        print(f"Async multi-site metrics server started on http://localhost:{self.port}/metrics")
+        if self.shards:
+            print(f"Sharded mode: {self.shards.shard_id} (leases in {self.shards.lease_dir})")
+        print(f"Monitoring for new log files every {self.scan_interval:g}s with {self.workers} parse workers... "
+              f"Press Ctrl+C to stop")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await self.run(stop)
+        print("\nAsync multi-site metrics server stopped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve metrics for new runner logs (asyncio daemon)')
+    parser.add_argument('--port', type=int, default=9879, help='Metrics port')
+    parser.add_argument('--shard-dir', help='Shared lease directory; enables sharding (default APILENS_SHARD_DIR)')
+    parser.add_argument('--shard-id', help='Name of this shard (default APILENS_SHARD_ID or host:port)')
+    parser.add_argument('--workers', type=int, help='Parse worker processes (default APILENS_INGEST_WORKERS or CPUs)')
+    parser.add_argument('--interval', type=float, help='Seconds between log scans (default APILENS_SCAN_INTERVAL)')
+    parser.add_argument('--metrics-file', help='Textfile export (default logs/multi_site.prom)')
+    parser.add_argument('--ingest-port', type=int, help='Port for POST /ingest/<site> (default APILENS_INGEST_PORT; unset = off)')
+    # Takes --profile-sampling out of sys.argv before argparse sees it
+    start_sampling_if_requested('async_metrics_server')
+    args = parser.parse_args()
+    server = AsyncMultiSiteMetricsServer(port=args.port, shard_dir=args.shard_dir, shard_id=args.shard_id,
+                                         workers=args.workers, scan_interval=args.interval,
+                                         metrics_file=args.metrics_file, ingest_port=args.ingest_port)
+    asyncio.run(server.serve())
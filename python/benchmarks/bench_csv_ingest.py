@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+CSV capture ingestion benchmark
+
+Times parsing, aggregation (serial and across a process pool), stability
+tracking and snapshot summaries on a captured-traffic CSV. The capture can
+be repeated to simulate larger files.
+
+Usage:
+    python benchmarks/bench_csv_ingest.py [--csv ../healthmug_api_logs.csv] [--repeat 100] [--workers 4]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comparison_engine import ComparisonEngine
+from csv_ingest import aggregate_csv, iter_csv_records, load_tracker, summarize_csv
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           'healthmug_api_logs.csv')
+
+def build_input(csv_path: str, repeat: int, directory: str) -> str:
+    """The capture with its data rows repeated `repeat` times"""
+    if repeat <= 1:
+        return csv_path
+    path = os.path.join(directory, 'capture.csv')
+    with open(csv_path, 'rb') as src:
+        header = src.readline()
+        body = src.read()
+    if not body.endswith(b'\n'):
+        body += b'\n'
+    with open(path, 'wb') as dst:
+        dst.write(header)
+        for _ in range(repeat):
+            dst.write(body)
+    return path
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def run(csv_path: str, workers: int) -> dict:
+    timings = {}
+    rows, timings['parse_s'] = timed(lambda: sum(1 for _ in iter_csv_records(csv_path)))
+    _, timings['aggregate_serial_s'] = timed(lambda: aggregate_csv(csv_path, workers=1))
+    if workers > 1:
+        _, timings[f'aggregate_{workers}_workers_s'] = timed(lambda: aggregate_csv(csv_path, workers=workers))
+    tracker, timings['tracker_load_s'] = timed(lambda: load_tracker(csv_path))
+    _, timings['stability_scores_s'] = timed(tracker.compute_stability_scores)
+    _, timings['summary_s'] = timed(lambda: summarize_csv(csv_path, ComparisonEngine()))
+    timings['rows_per_s'] = rows / timings['parse_s'] if timings['parse_s'] else 0
+    return rows, {k: round(v, 4) for k, v in timings.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV capture ingestion')
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--repeat', type=int, default=20, help='Repeat the capture rows this many times')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        csv_path = build_input(args.csv, args.repeat, directory)
+        size = os.path.getsize(csv_path)
+        rows, timings = run(csv_path, args.workers)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"\nCapture: {rows:,} rows, {size / 1e6:.1f} MB ({args.repeat}x {os.path.basename(args.csv)})")
+    for metric, value in timings.items():
+        print(f"  {metric:<26} {value}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'csv': os.path.basename(args.csv), 'repeat': args.repeat, 'rows': rows,
+                       'workers': args.workers, 'results': timings}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the command-line entry points
+
+Each case runs in a fresh interpreter, so module imports, exporter setup and
+database connections are all part of the measured time:
+
+    import_analyzer     python -c "import analyzer"
+    import_processor    python -c "import multi_site_processor"
+    analyze             run_analysis.py analyze on two generated snapshots
+    process             multi_site_processor.py on one generated run log (SQLite)
+
+Reports min/median wall seconds over `--repeat` runs. With --importtime the
+slowest imports of each import case are listed (python -X importtime).
+
+Usage:
+    python benchmarks/bench_startup.py [--cases import_analyzer,analyze] [--repeat 5]
+                                       [--importtime] [--output startup.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(PYTHON_DIR)
+
+sys.path.insert(0, PYTHON_DIR)
+
+from workload_generator import WorkloadGenerator
+
+CASES = ('import_analyzer', 'import_processor', 'analyze', 'process')
+
+def prepare(directory: str) -> dict:
+    """Generated snapshots and a run log, plus an isolated SQLite environment"""
+    WorkloadGenerator(sites=1, runs=2, calls_per_run=200, seed=42).write(directory, formats=('logs', 'snapshots'))
+    # run_analysis.py reads ./snapshots
+    workdir = os.path.join(directory, 'work')
+    os.makedirs(workdir)
+    os.symlink(os.path.join(directory, 'snapshots', 'site-01'), os.path.join(workdir, 'snapshots'))
+
+    env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(directory, 'startup.db'),
+               APILENS_ANOMALY_STATE=os.path.join(directory, 'anomaly_state.json'), PYTHONDONTWRITEBYTECODE='1')
+    env.pop('APILENS_HISTORY_STORE', None)
+    log_file = sorted(glob.glob(os.path.join(directory, 'logs', 'site-01', '*.json')))[-1]
+    return {
+        'import_analyzer': ([sys.executable, '-c', 'import analyzer'], PYTHON_DIR),
+        'import_processor': ([sys.executable, '-c', 'import multi_site_processor'], PYTHON_DIR),
+        'analyze': ([sys.executable, os.path.join(PROJECT_ROOT, 'run_analysis.py'), 'analyze',
+                     os.path.join(directory, 'analysis.json')], workdir),
+        'process': ([sys.executable, 'multi_site_processor.py', 'site-01', log_file], PYTHON_DIR),
+    }, env
+
+def time_command(command, cwd: str, env: dict, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        timings.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{completed.stderr.decode(errors='replace')}")
+    return {'min_s': round(min(timings), 4), 'median_s': round(statistics.median(timings), 4)}
+
+def slowest_imports(module: str, cwd: str, env: dict, top: int = 10) -> list:
+    """(cumulative microseconds, module) for the slowest imports below `module`"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=cwd, env=env, capture_output=True, text=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((int(parts[1]), parts[2].strip()))
+    return sorted(imports, reverse=True)[1:top + 1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark entry point cold start')
+    parser.add_argument('--cases', default='all', help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--importtime', action='store_true', help='List the slowest imports of each import case')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    cases = list(CASES) if args.cases == 'all' else args.cases.split(',')
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    directory = tempfile.mkdtemp()
+    try:
+        commands, env = prepare(directory)
+        results = {}
+        for name in cases:
+            print(f"Running {name}...", flush=True)
+            results[name] = time_command(*commands[name], env, args.repeat)
+
+        print(f"\n{'case':<18} {'min_s':>8} {'median_s':>9}")
+        for name, result in results.items():
+            print(f"{name:<18} {result['min_s']:>8.3f} {result['median_s']:>9.3f}")
+
+        if args.importtime:
+            for name in cases:
+                if name.startswith('import_'):
+                    module = commands[name][0][-1].split()[-1]
+                    print(f"\nSlowest imports under {module} (cumulative ms)")
+                    for micros, imported in slowest_imports(module, PYTHON_DIR, env):
+                        print(f"  {micros / 1000:8.1f}  {imported}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'suite': 'startup', 'repeat': args.repeat, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
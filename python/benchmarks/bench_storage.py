@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Storage backend benchmark
+
+Runs the same workload (bulk saves, historical reads, low-health lookups)
+against each storage backend and prints timings. Historical reads are timed
+with the query cache off (backend cost) and on (cache hits) separately.
+
+The PostgreSQL leg only runs against an explicitly named scratch database
+(--postgres-db; the other DB_* settings still apply), and the bench-* sites
+it writes are deleted afterwards.
+
+Usage:
+    python benchmarks/bench_storage.py [--runs 200] [--endpoints 50] [--backends sqlite,postgres]
+                                       [--postgres-db apilens_bench]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from storage_backends import SqliteBackend, create_backend
+
+SITES = ['bench-alpha', 'bench-beta', 'bench-gamma']
+
+def generate_runs(runs: int, endpoints: int, seed: int = 42):
+    """Deterministic (site, run_data, endpoint_stats) tuples spread over the last day"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    workload = []
+    for i in range(runs):
+        site = SITES[i % len(SITES)]
+        ts = (now - timedelta(minutes=(runs - i) * 1440 // max(runs, 1))).isoformat().replace('+00:00', 'Z')
+        results = []
+        stats = {}
+        for e in range(endpoints):
+            endpoint = f"/api/bench/{e}"
+            success = rng.random() > 0.05
+            results.append({
+                'endpoint': endpoint, 'method': 'GET',
+                'statusCode': 200 if success else 500,
+                'latency': int(rng.lognormvariate(5, 0.6)),
+                'responseSize': rng.randint(0, 4096),
+                'isEmpty': rng.random() < 0.03,
+                'success': success,
+                'timestamp': ts
+            })
+            stats[endpoint] = {'health_score': rng.randint(40, 100)}
+        workload.append((site, {'runId': f"bench-{i}", 'timestamp': ts, 'results': results}, stats))
+    return workload
+
+def run_workload(db: DatabaseManager, workload, batch_size: int = 20) -> dict:
+    timings = {}
+
+    start = time.perf_counter()
+    for i in range(0, len(workload), batch_size):
+        db.save_test_runs(workload[i:i + batch_size])
+    timings['bulk_save_s'] = time.perf_counter() - start
+
+    # Every read goes to the backend: with the query cache on, 57 of 60 would be hits
+    ttl, db.query_cache.ttl = db.query_cache.ttl, 0
+    start = time.perf_counter()
+    for _ in range(20):
+        for site in SITES:
+            db.get_historical_data(site, days=7)
+    timings['historical_x60_s'] = time.perf_counter() - start
+    db.query_cache.ttl = ttl
+
+    start = time.perf_counter()
+    for _ in range(20):
+        for site in SITES:
+            db.get_historical_data(site, days=7)
+    timings['historical_cached_x60_s'] = time.perf_counter() - start
+
+    # The alert path used by AlertManager.check_health_alerts
+    start = time.perf_counter()
+    for _ in range(20):
+        for site in SITES:
+            db.evaluate_health_alerts(site, 70)
+    timings['low_health_x60_s'] = time.perf_counter() - start
+
+    rows = sum(len(run['results']) for _, run, _ in workload)
+    timings['rows_per_s'] = rows / timings['bulk_save_s'] if timings['bulk_save_s'] else 0
+    return {k: round(v, 4) for k, v in timings.items()}
+
+def remove_bench_data(db: DatabaseManager):
+    """Delete the bench sites and everything recorded for them"""
+    placeholders = ', '.join(['%s'] * len(SITES))
+    sites = f"SELECT id FROM sites WHERE name IN ({placeholders})"
+    with db.backend.transaction() as cur:
+        cur.execute(f"DELETE FROM endpoint_results WHERE test_run_id IN "
+                    f"(SELECT id FROM test_runs WHERE site_id IN ({sites}))", SITES)
+        for table in ('alerts', 'user_site_access', 'test_runs'):
+            cur.execute(f"DELETE FROM {table} WHERE site_id IN ({sites})", SITES)
+        cur.execute(f"DELETE FROM sites WHERE name IN ({placeholders})", SITES)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ApiLens storage backends')
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--endpoints', type=int, default=50)
+    parser.add_argument('--backends', default='sqlite,postgres')
+    parser.add_argument('--postgres-db', help='Scratch PostgreSQL database for the postgres backend (required to run it)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    workload = generate_runs(args.runs, args.endpoints, args.seed)
+    results = {}
+
+    for name in args.backends.split(','):
+        try:
+            if name == 'sqlite':
+                backend = SqliteBackend(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+            elif not args.postgres_db:
+                # Never write bench rows into whatever database DB_NAME points at
+                print(f"Skipping {name}: pass --postgres-db with a scratch database")
+                continue
+            else:
+                backend = create_backend(name, db_config={
+                    'host': os.getenv('DB_HOST', 'localhost'),
+                    'database': args.postgres_db,
+                    'user': os.getenv('DB_USER', 'postgres'),
+                    'password': os.getenv('DB_PASSWORD', 'password'),
+                    'port': os.getenv('DB_PORT', '5432')
+                })
+            db = DatabaseManager(backend=backend)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+
+        print(f"Running workload against {name}...")
+        try:
+            # Leftovers from an interrupted run would skew the reads
+            remove_bench_data(db)
+            results[name] = run_workload(db, workload)
+        finally:
+            remove_bench_data(db)
+
+    print(f"\nWorkload: {args.runs} runs x {args.endpoints} endpoints")
+    for name, timings in results.items():
+        print(f"  {name}:")
+        for metric, value in timings.items():
+            print(f"    {metric:<24} {value}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': args.runs, 'endpoints': args.endpoints, 'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
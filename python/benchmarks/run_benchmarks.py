@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmark runner
+
+Times the core analysis steps on deterministic synthetic data:
+
+    aggregate       MultiSiteProcessor aggregation + health scoring of a run's results
+    patterns        SnapshotLoader URL pattern grouping
+    compare_runs    ComparisonEngine.compare_runs on two grouped runs
+    stability       ApiStabilityTracker.compute_stability_scores
+    html_report     MultiSiteProcessor HTML report rendering
+    db_save         DatabaseManager.save_test_runs into a temporary SQLite database
+
+Each case runs at every requested size (records), `--repeat` times, and
+reports min/median seconds and records per second. Results are written as
+sorted JSON so two runs (e.g. before and after a change) can be diffed, or
+compared directly with --compare.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 1e3,1e4,1e5] [--cases aggregate,patterns]
+                                        [--repeat 3] [--seed 42] [--output results.json]
+    python benchmarks/run_benchmarks.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_stability_tracker import ApiStabilityTracker
+from comparison_engine import ComparisonEngine
+from database_manager import DatabaseManager
+from endpoint_stats import aggregate_results, score_endpoint_stats
+from multi_site_processor import MultiSiteProcessor
+from snapshot_loader import SnapshotLoader, detect_pattern
+from storage_backends import SqliteBackend
+
+# Fixed reference time, so generated timestamps do not depend on when the suite runs
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+ENDPOINT_TEMPLATES = [
+    '/api/products/{id}', '/api/products/{id}/reviews', '/api/categories/{slug}',
+    '/api/cart/{uuid}', '/api/orders/{id}', '/api/users/{id}/profile',
+    '/api/search', '/api/featured-products', '/api/session/{token}', '/api/health',
+]
+
+# -- data ---------------------------------------------------------------------
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        id=rng.randint(1, 10 ** 6),
+        slug=rng.choice(['vitamins', 'diabetes-care', 'skin-care', 'ayurveda', 'baby-care']),
+        uuid='%08x-%04x-%04x-%04x-%012x' % (rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                                            rng.getrandbits(16), rng.getrandbits(48)),
+        token=''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(24)),
+    )
+
+def make_results(n: int, seed: int, endpoints: int = 200):
+    """Runner results ('results' of a log file) over a fixed set of endpoints"""
+    rng = random.Random(seed)
+    names = [f"/api/bench/{e}" for e in range(endpoints)]
+    results = []
+    for i in range(n):
+        success = rng.random() > 0.05
+        results.append({
+            'endpoint': names[i % endpoints], 'method': 'GET',
+            'statusCode': 200 if success else 500,
+            'latency': int(rng.lognormvariate(5, 0.6)),
+            'responseSize': rng.randint(0, 4096),
+            'isEmpty': rng.random() < 0.03,
+            'success': success,
+            'timestamp': (EPOCH + timedelta(milliseconds=i)).isoformat().replace('+00:00', 'Z'),
+        })
+    return results
+
+def make_apis(n: int, seed: int, fail_rate: float = 0.05, latency_scale: float = 1.0):
+    """Snapshot APIs with ID/slug/UUID variation in their URLs"""
+    rng = random.Random(seed)
+    return [{
+        'url': 'https://shop.example' + _fill(rng.choice(ENDPOINT_TEMPLATES), rng),
+        'method': 'GET',
+        'status': 'fail' if rng.random() < fail_rate else 'pass',
+        'latency': int(rng.lognormvariate(5, 0.6) * latency_scale),
+        'isEmpty': rng.random() < 0.03,
+    } for _ in range(n)]
+
+def make_logs(n: int, seed: int, endpoints: int = 200):
+    """Tracker logs spread over the 14 days before now"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    return [{
+        'endpoint': f"/api/bench/{rng.randrange(endpoints)}",
+        'timestamp': now - timedelta(seconds=rng.randrange(14 * 86400)),
+        'status_code': 500 if rng.random() < 0.03 else 200,
+        'response_size': 0 if rng.random() < 0.02 else rng.randint(1, 4096),
+    } for _ in range(n)]
+
+# -- cases --------------------------------------------------------------------
+# Each case: prepare(n, seed) -> data (untimed), run(data) (timed), max records
+
+def _prepare_aggregate(n, seed):
+    return make_results(n, seed)
+
+def _run_aggregate(results):
+    score_endpoint_stats(aggregate_results(results))
+
+def _prepare_patterns(n, seed):
+    return SnapshotLoader(tempfile.gettempdir(), use_catalog=False), {'apis': make_apis(n, seed)}
+
+def _run_patterns(data):
+    loader, snapshot = data
+    detect_pattern.cache_clear()
+    loader.group_apis_by_pattern(snapshot)
+
+def _prepare_compare(n, seed):
+    loader = SnapshotLoader(tempfile.gettempdir(), use_catalog=False)
+    current = loader.group_apis_by_pattern(make_apis(n, seed, fail_rate=0.08, latency_scale=1.3))
+    previous = loader.group_apis_by_pattern(make_apis(n, seed + 1))
+    return current, previous
+
+def _run_compare(groups):
+    ComparisonEngine().compare_runs(*groups)
+
+def _prepare_stability(n, seed):
+    tracker = ApiStabilityTracker()
+    tracker.add_logs(make_logs(n, seed))
+    return tracker
+
+def _run_stability(tracker):
+    tracker.compute_stability_scores()
+
+def _prepare_html(n, seed):
+    results = make_results(n, seed)
+    stats = score_endpoint_stats(aggregate_results(results))
+    return {'runId': 'bench', 'timestamp': EPOCH.isoformat(), 'results': results}, stats
+
+def _run_html(data):
+    MultiSiteProcessor.render_html_report('bench', *data)
+
+def _prepare_db(n, seed, run_size: int = 1000):
+    results = make_results(n, seed)
+    runs = []
+    for i in range(0, n, run_size):
+        chunk = results[i:i + run_size]
+        stats = score_endpoint_stats(aggregate_results(chunk))
+        runs.append(('bench', {'runId': f'bench-{i // run_size}', 'timestamp': chunk[0]['timestamp'],
+                               'results': chunk}, stats))
+    return runs
+
+def _run_db(runs):
+    directory = tempfile.mkdtemp()
+    try:
+        # Fresh database per repetition; schema creation is a small constant cost
+        db = DatabaseManager(backend=SqliteBackend(os.path.join(directory, 'bench.db')))
+        for i in range(0, len(runs), 20):
+            db.save_test_runs(runs[i:i + 20])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+CASES = {
+    'aggregate': (_prepare_aggregate, _run_aggregate, 10 ** 7),
+    'patterns': (_prepare_patterns, _run_patterns, 10 ** 7),
+    'compare_runs': (_prepare_compare, _run_compare, 10 ** 7),
+    'stability': (_prepare_stability, _run_stability, 10 ** 7),
+    'html_report': (_prepare_html, _run_html, 10 ** 6),
+    'db_save': (_prepare_db, _run_db, 10 ** 6),
+}
+
+# -- runner -------------------------------------------------------------------
+
+def run_case(name: str, n: int, seed: int, repeat: int) -> dict:
+    prepare, run, max_records = CASES[name]
+    if n > max_records:
+        return {'skipped': f"above {max_records:.0e} records"}
+    data = prepare(n, seed)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(data)
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {
+        'min_s': round(min(timings), 6),
+        'median_s': round(median, 6),
+        'records_per_s': round(n / median) if median else None,
+    }
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'commit': commit}
+
+def compare(baseline_file: str, current_file: str):
+    with open(baseline_file) as f:
+        baseline = json.load(f)['results']
+    with open(current_file) as f:
+        current = json.load(f)['results']
+    print(f"{'case':<14} {'records':>10} {'before':>10} {'after':>10} {'change':>8}")
+    for name, sizes in current.items():
+        for size, result in sizes.items():
+            before = baseline.get(name, {}).get(size, {}).get('median_s')
+            after = result.get('median_s')
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0
+            print(f"{name:<14} {int(size):>10,} {before:>10.4f} {after:>10.4f} {change:>+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ApiLens analysis pipeline')
+    parser.add_argument('--sizes', default='1e3,1e4,1e5', help='Comma-separated record counts (1e3..1e7)')
+    parser.add_argument('--cases', default='all', help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    cases = list(CASES) if args.cases == 'all' else args.cases.split(',')
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = {}
+    for name in cases:
+        for n in sizes:
+            print(f"Running {name} at {n:,} records...", flush=True)
+            results.setdefault(name, {})[str(n)] = run_case(name, n, args.seed, args.repeat)
+
+    print(f"\n{'case':<14} {'records':>10} {'median_s':>10} {'records/s':>12}")
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            if 'skipped' in result:
+                print(f"{name:<14} {int(size):>10,} {'skipped':>10}")
+            else:
+                print(f"{name:<14} {int(size):>10,} {result['median_s']:>10.4f} {result['records_per_s'] or 0:>12,}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'suite': 'pipeline', 'seed': args.seed, 'repeat': args.repeat,
+                       'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,310 @@
-from typing import Dict, List, Any
-from datetime import datetime
+import math
+from itertools import repeat
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from snapshot_formats import MISSING
+
+# Latency sketch: log-spaced buckets, quantiles within ~2.5% relative error.
+# Bucket keys are strings so summaries round-trip through JSON unchanged.
+SKETCH_GAMMA = 1.05
+SKETCH_LOG_GAMMA = math.log(SKETCH_GAMMA)
+
+def sketch_add(sketch: Dict[str, int], value: float):
+    key = str(math.ceil(math.log(value) / SKETCH_LOG_GAMMA)) if value > 1 else '0'
+    sketch[key] = sketch.get(key, 0) + 1
+
+def sketch_merge(target: Dict[str, int], other: Dict[str, int]):
+    for key, count in other.items():
+        target[key] = target.get(key, 0) + count
+
+def sketch_quantile(sketch: Dict[str, int], q: float) -> float:
+    """Approximate q-quantile (0..1) of the values added to a sketch"""
+    total = sum(sketch.values())
+    if not total:
+        return 0
+    rank = q * (total - 1)
+    seen = 0
+    for index, count in sorted((int(key), count) for key, count in sketch.items()):
+        seen += count
+        if seen > rank:
+            return 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1) if index > 0 else 0
+    return 0
 
 class ComparisonEngine:
-    def __init__(self):
+    def __init__(self, max_cached_summaries: int = 256):
         self.insights = []
+        # snapshot id -> run summary, so each snapshot is only summarized once
+        self._summaries = OrderedDict()
+        self.max_cached_summaries = max_cached_summaries
     
     def compare_runs(self, current_groups: Dict[str, List[Dict]], 
-                    previous_groups: Dict[str, List[Dict]]) -> Dict[str, Any]:
-        """Compare two grouped API runs and generate insights"""
-        self.insights = []
+                    previous_groups: Dict[str, List[Dict]],
+                    current_key: str = None, previous_key: str = None) -> Dict[str, Any]:
+        """Compare two grouped API runs and generate insights.
+        
+        Pass the snapshot ids as current_key/previous_key to reuse cached summaries."""
+        current = self.summarize(current_groups, current_key)
+        previous = self.summarize(previous_groups, previous_key)
+        return self.compare_summaries(current, previous)
+    
+    def summarize(self, groups: Dict[str, List[Dict]], key: str = None, timestamp: str = None) -> Dict[str, Any]:
+        """Reduce a grouped run to per-group counts in a single pass over its APIs"""
+        if key is not None and key in self._summaries:
+            self._summaries.move_to_end(key)
+            return self._summaries[key]
+        
+        summary = {'timestamp': timestamp, 'total': 0, 'failures': 0, 'empty': 0, 'failed_apis': [], 'groups': {}}
+        failed_apis = set()
+        for group, apis in groups.items():
+            stats = {'count': 0, 'failures': 0, 'empty': 0, 'latency_sum': 0, 'latency_sketch': {}}
+            for api in apis:
+                latency = api.get('latency_ms', api.get('latency', 0))
+                stats['count'] += 1
+                stats['latency_sum'] += latency
+                sketch_add(stats['latency_sketch'], latency)
+                if api.get('status') == 'fail':
+                    stats['failures'] += 1
+                    failed_apis.add(api.get('api') or api.get('url', 'unknown'))
+                if api.get('empty_response', False) or api.get('isEmpty', False):
+                    stats['empty'] += 1
+            summary['groups'][group] = stats
+            summary['total'] += stats['count']
+            summary['failures'] += stats['failures']
+            summary['empty'] += stats['empty']
+        summary['failed_apis'] = sorted(failed_apis)
         
-        # Overall comparison
-        current_total = sum(len(apis) for apis in current_groups.values())
-        previous_total = sum(len(apis) for apis in previous_groups.values())
+        if key is not None:
+            self.cache_summary(key, summary)
+        return summary
+    
+    def summarize_columns(self, columns: Dict[str, list], pattern_for: Callable[[str], str],
+                          timestamp: str = None) -> Dict[str, Any]:
+        """Same summary as summarize(), built from a columnar snapshot (snapshot_formats.read_columns).
+        
+        Rows are grouped with pattern_for, called once per distinct URL."""
+        count = len(next(iter(columns.values()))) if columns else 0
+        column = lambda name: columns.get(name) or repeat(MISSING, count)
+        
+        summary = {'timestamp': timestamp, 'total': 0, 'failures': 0, 'empty': 0, 'failed_apis': [], 'groups': {}}
+        failed_apis = set()
+        patterns = {}
+        rows = zip(column('api'), column('url'), column('latency_ms'), column('latency'),
+                   column('status'), column('empty_response'), column('isEmpty'))
+        for api, url, latency_ms, latency, status, empty_response, is_empty in rows:
+            api = None if api is MISSING else api
+            key = api or (None if url is MISSING else url)
+            if not key:
+                # Mirrors SnapshotLoader.group_apis_by_pattern's str(api) fallback
+                key = str({name: values[summary['total']] for name, values in columns.items()
+                           if values[summary['total']] is not MISSING})
+            pattern = patterns.get(key)
+            if pattern is None:
+                pattern = patterns[key] = pattern_for(key)
+            
+            stats = summary['groups'].get(pattern)
+            if stats is None:
+                stats = summary['groups'][pattern] = {'count': 0, 'failures': 0, 'empty': 0, 'latency_sum': 0, 'latency_sketch': {}}
+            value = latency_ms if latency_ms is not MISSING else (latency if latency is not MISSING else 0)
+            stats['count'] += 1
+            stats['latency_sum'] += value
+            sketch_add(stats['latency_sketch'], value)
+            if status == 'fail':
+                stats['failures'] += 1
+                failed_apis.add(api or (url if url is not MISSING else 'unknown'))
+            if (empty_response is not MISSING and empty_response) or (is_empty is not MISSING and is_empty):
+                stats['empty'] += 1
+            summary['total'] += 1
+        
+        for stats in summary['groups'].values():
+            summary['failures'] += stats['failures']
+            summary['empty'] += stats['empty']
+        summary['failed_apis'] = sorted(failed_apis)
+        return summary
+    
+    def summarize_history(self, store, start: Any, end: Any, pattern_for: Callable[[str], str],
+                          site: str = None) -> Dict[str, Any]:
+        """Summary (as summarize()) of all calls in a HistoryStore between start and end.
+        
+        Reads the store's mapped columns in place; status >= 400 counts as a
+        failure, matching how snapshots mark APIs as 'fail'."""
+        from history_store import to_epoch_ms
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        site_id = store.string_id(site) if site is not None else None
         
-        # Failure analysis
-        current_failures = self._count_failures(current_groups)
-        previous_failures = self._count_failures(previous_groups)
+        summary = {'timestamp': datetime.fromtimestamp(end_ms / 1000, timezone.utc).isoformat(), 'total': 0, 'failures': 0,
+                   'empty': 0, 'failed_apis': [], 'groups': {}}
+        if site is not None and site_id is None:
+            return summary
         
-        # Empty response analysis
-        current_empty = self._count_empty_responses(current_groups)
-        previous_empty = self._count_empty_responses(previous_groups)
+        failed_ids = set()
+        group_for = {}  # endpoint id -> group stats
+        for columns in store.scan(start_ms, end_ms, site):
+            rows = zip(columns['timestamp'], columns['site'], columns['endpoint'],
+                       columns['status'], columns['latency'], columns['empty'])
+            for ts, row_site, endpoint, status, latency, empty in rows:
+                if ts < start_ms or ts >= end_ms or (site_id is not None and row_site != site_id):
+                    continue
+                stats = group_for.get(endpoint)
+                if stats is None:
+                    pattern = pattern_for(store.string(endpoint))
+                    stats = summary['groups'].get(pattern)
+                    if stats is None:
+                        stats = summary['groups'][pattern] = {'count': 0, 'failures': 0, 'empty': 0, 'latency_sum': 0, 'latency_sketch': {}}
+                    group_for[endpoint] = stats
+                stats['count'] += 1
+                stats['latency_sum'] += latency
+                sketch_add(stats['latency_sketch'], latency)
+                if status >= 400:
+                    stats['failures'] += 1
+                    failed_ids.add(endpoint)
+                if empty:
+                    stats['empty'] += 1
+        
+        for stats in summary['groups'].values():
+            summary['total'] += stats['count']
+            summary['failures'] += stats['failures']
+            summary['empty'] += stats['empty']
+        summary['failed_apis'] = sorted(store.string(endpoint) for endpoint in failed_ids)
+        return summary
+    
+    def get_summary(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached summary for a snapshot id, if it has been summarized"""
+        return self._summaries.get(key)
+    
+    def cache_summary(self, key: str, summary: Dict[str, Any]):
+        self._summaries[key] = summary
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_cached_summaries:
+            self._summaries.popitem(last=False)
+    
+    def compare_summaries(self, current: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+        """Compare two run summaries; same output as compare_runs"""
+        self.insights = []
         
         # Generate insights
-        self._analyze_failures(current_groups, previous_groups)
-        self._analyze_empty_responses(current_empty, previous_empty, current_total, previous_total)
-        self._analyze_latency_by_group(current_groups, previous_groups)
+        self._analyze_failures(current, previous)
+        self._analyze_empty_responses(current['empty'], previous['empty'], current['total'], previous['total'])
+        self._analyze_latency_by_group(current, previous)
         
         return {
             "timestamp": datetime.now().isoformat(),
             "summary": {
-                "current_total": current_total,
-                "previous_total": previous_total,
-                "current_failures": current_failures,
-                "previous_failures": previous_failures,
-                "current_empty": current_empty,
-                "previous_empty": previous_empty
+                "current_total": current['total'],
+                "previous_total": previous['total'],
+                "current_failures": current['failures'],
+                "previous_failures": previous['failures'],
+                "current_empty": current['empty'],
+                "previous_empty": previous['empty']
             },
             "insights": self.insights,
-            "group_analysis": self._analyze_groups(current_groups, previous_groups)
+            "group_analysis": self._analyze_groups(current, previous)
         }
     
-    def _count_failures(self, groups: Dict[str, List[Dict]]) -> int:
-        """Count total failures across all groups"""
-        return sum(1 for apis in groups.values() 
-                  for api in apis if api.get('status') == 'fail')
+    def compare_trend(self, summaries: List[Tuple[str, Dict[str, Any]]], latency_threshold: float = 20) -> Dict[str, Any]:
+        """N-way comparison over run summaries ordered oldest to newest.
+        
+        Returns overall and per-group series plus insights comparing the
+        latest run against the average of the earlier ones."""
+        series = []
+        groups = {}
+        for key, summary in summaries:
+            series.append({
+                "snapshot": key,
+                "timestamp": summary.get('timestamp'),
+                "total": summary['total'],
+                "failures": summary['failures'],
+                "empty": summary['empty'],
+                "failure_rate": summary['failures'] / summary['total'] if summary['total'] else 0
+            })
+            for group, stats in summary['groups'].items():
+                groups.setdefault(group, []).append({
+                    "snapshot": key,
+                    "count": stats['count'],
+                    "failures": stats['failures'],
+                    "avg_latency": stats['latency_sum'] / stats['count'] if stats['count'] else 0,
+                    "p95_latency": sketch_quantile(stats.get('latency_sketch', {}), 0.95)
+                })
+        
+        insights = []
+        for group, points in groups.items():
+            if len(points) < 2 or points[-1]['snapshot'] != series[-1]['snapshot']:
+                continue
+            latest, earlier = points[-1], points[:-1]
+            baseline_latency = sum(p['avg_latency'] for p in earlier) / len(earlier)
+            if baseline_latency > 0:
+                change_pct = (latest['avg_latency'] - baseline_latency) / baseline_latency * 100
+                if abs(change_pct) > latency_threshold:
+                    direction = "↑" if change_pct > 0 else "↓"
+                    insights.append(f"Latency {direction} {abs(change_pct):.0f}% in {group} vs {len(earlier)}-run average")
+            if latest['failures'] and not any(p['failures'] for p in earlier):
+                insights.append(f"{group} failing for the first time in {len(points)} runs")
+        
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "runs": len(series),
+            "series": series,
+            "groups": groups,
+            "insights": insights
+        }
     
-    def _count_empty_responses(self, groups: Dict[str, List[Dict]]) -> int:
-        """Count total empty responses across all groups"""
-        return sum(1 for apis in groups.values() 
-                  for api in apis if api.get('empty_response', False) or api.get('isEmpty', False))
+    def merge_summaries(self, summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine several run summaries into one (e.g. all runs in a week)"""
+        merged = {'timestamp': None, 'total': 0, 'failures': 0, 'empty': 0, 'failed_apis': [], 'groups': {}}
+        failed_apis = set()
+        for summary in summaries:
+            merged['total'] += summary['total']
+            merged['failures'] += summary['failures']
+            merged['empty'] += summary['empty']
+            failed_apis.update(summary['failed_apis'])
+            for group, stats in summary['groups'].items():
+                target = merged['groups'].setdefault(group, {'count': 0, 'failures': 0, 'empty': 0, 'latency_sum': 0, 'latency_sketch': {}})
+                for field in ('count', 'failures', 'empty', 'latency_sum'):
+                    target[field] += stats[field]
+                sketch_merge(target['latency_sketch'], stats.get('latency_sketch', {}))
+            if summary.get('timestamp') and (merged['timestamp'] is None or summary['timestamp'] > merged['timestamp']):
+                merged['timestamp'] = summary['timestamp']
+        merged['failed_apis'] = sorted(failed_apis)
+        return merged
     
-    def _analyze_failures(self, current_groups: Dict, previous_groups: Dict):
-        """Analyze failure changes between runs"""
-        current_failed_apis = set()
-        previous_failed_apis = set()
+    def compare_periods(self, summaries: List[Dict[str, Any]], period: timedelta = timedelta(days=7),
+                        now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Week-over-week style comparison: the last `period` of runs against the one before.
         
-        for group, apis in current_groups.items():
-            for api in apis:
-                if api.get('status') == 'fail':
-                    url = api.get('api') or api.get('url', 'unknown')
-                    current_failed_apis.add(url)
+        Summaries without a timestamp are ignored. Returns None if either period is empty."""
+        dated = []
+        for summary in summaries:
+            ts = self._parse_timestamp(summary.get('timestamp'))
+            if ts is not None:
+                dated.append((ts, summary))
+        if not dated:
+            return None
         
-        for group, apis in previous_groups.items():
-            for api in apis:
-                if api.get('status') == 'fail':
-                    url = api.get('api') or api.get('url', 'unknown')
-                    previous_failed_apis.add(url)
+        end = now or max(ts for ts, _ in dated)
+        current = [s for ts, s in dated if end - period < ts <= end]
+        previous = [s for ts, s in dated if end - 2 * period < ts <= end - period]
+        if not current or not previous:
+            return None
+        
+        comparison = self.compare_summaries(self.merge_summaries(current), self.merge_summaries(previous))
+        comparison['current_runs'] = len(current)
+        comparison['previous_runs'] = len(previous)
+        return comparison
+    
+    def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        # Compare naive and aware timestamps alike
+        return ts.replace(tzinfo=None) if ts.tzinfo is None else ts.astimezone().replace(tzinfo=None)
+    
+    def _analyze_failures(self, current: Dict, previous: Dict):
+        """Analyze failure changes between runs"""
+        current_failed_apis = set(current['failed_apis'])
+        previous_failed_apis = set(previous['failed_apis'])
         
         new_failures = current_failed_apis - previous_failed_apis
         recovered_apis = previous_failed_apis - current_failed_apis
@@ -91,20 +329,18 @@ class ComparisonEngine:
             direction = "up" if change > 0 else "down"
             self.insights.append(f"Empty responses {direction} {abs(change):.1f}% since last scan")
     
-    def _analyze_latency_by_group(self, current_groups: Dict, previous_groups: Dict):
+    def _analyze_latency_by_group(self, current: Dict, previous: Dict):
         """Analyze latency changes by endpoint group"""
-        for group in current_groups:
-            if group not in previous_groups:
+        for group, current_stats in current['groups'].items():
+            previous_stats = previous['groups'].get(group)
+            if previous_stats is None:
                 continue
             
-            current_latencies = [api.get('latency_ms', api.get('latency', 0)) for api in current_groups[group]]
-            previous_latencies = [api.get('latency_ms', api.get('latency', 0)) for api in previous_groups[group]]
-            
-            if not current_latencies or not previous_latencies:
+            if not current_stats['count'] or not previous_stats['count']:
                 continue
             
-            current_avg = sum(current_latencies) / len(current_latencies)
-            previous_avg = sum(previous_latencies) / len(previous_latencies)
+            current_avg = current_stats['latency_sum'] / current_stats['count']
+            previous_avg = previous_stats['latency_sum'] / previous_stats['count']
             
             if previous_avg == 0:
                 continue
@@ -115,23 +351,24 @@ class ComparisonEngine:
                 direction = "↑" if change_pct > 0 else "↓"
                 self.insights.append(f"Latency {direction} {abs(change_pct):.0f}% in {group}")
     
-    def _analyze_groups(self, current_groups: Dict, previous_groups: Dict) -> Dict:
+    def _analyze_groups(self, current: Dict, previous: Dict) -> Dict:
         """Detailed group-by-group analysis"""
         analysis = {}
+        empty = {'count': 0, 'failures': 0, 'empty': 0, 'latency_sum': 0}
         
-        all_groups = set(current_groups.keys()) | set(previous_groups.keys())
+        all_groups = set(current['groups'].keys()) | set(previous['groups'].keys())
         
         for group in all_groups:
-            current_apis = current_groups.get(group, [])
-            previous_apis = previous_groups.get(group, [])
+            current_stats = current['groups'].get(group, empty)
+            previous_stats = previous['groups'].get(group, empty)
             
             analysis[group] = {
-                "current_count": len(current_apis),
-                "previous_count": len(previous_apis),
-                "current_failures": sum(1 for api in current_apis if api.get('status') == 'fail'),
-                "previous_failures": sum(1 for api in previous_apis if api.get('status') == 'fail'),
-                "avg_latency_current": sum(api.get('latency_ms', api.get('latency', 0)) for api in current_apis) / len(current_apis) if current_apis else 0,
-                "avg_latency_previous": sum(api.get('latency_ms', api.get('latency', 0)) for api in previous_apis) / len(previous_apis) if previous_apis else 0
+                "current_count": current_stats['count'],
+                "previous_count": previous_stats['count'],
+                "current_failures": current_stats['failures'],
+                "previous_failures": previous_stats['failures'],
+                "avg_latency_current": current_stats['latency_sum'] / current_stats['count'] if current_stats['count'] else 0,
+                "avg_latency_previous": previous_stats['latency_sum'] / previous_stats['count'] if previous_stats['count'] else 0
             }
         
         return analysis
\ No newline at end of file
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Streaming ingestion of captured browser traffic in CSV form.
+
+The capture format (healthmug_api_logs.csv) has the columns
+URL, Method, StatusCode, ResponseTime, IsEmpty, Timestamp. Rows are parsed
+in chunks and converted to the shapes the rest of ApiLens expects:
+
+- tracker logs for ApiStabilityTracker / HistoryStore
+- runner results for the MultiSiteProcessor aggregates
+- snapshot APIs for SnapshotLoader grouping and ComparisonEngine summaries
+
+URLs are grouped by pattern (IDs replaced with wildcards), so per-product or
+per-session URLs collapse into one endpoint. Aggregation can be split across
+a process pool by byte range; quoted fields must not contain newlines.
+
+Usage:
+    python csv_ingest.py stats <capture.csv> [--workers N]
+    python csv_ingest.py snapshot <capture.csv> [--snapshots-dir ../snapshots] [--id snapshot_...]
+"""
+
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple
+from endpoint_stats import aggregate_results, merge_endpoint_stats, score_endpoint_stats
+from snapshot_loader import detect_pattern
+
+DEFAULT_CHUNK_ROWS = 10000
+
+# Capture column -> record field
+CSV_COLUMNS = {
+    'url': 'URL',
+    'method': 'Method',
+    'status_code': 'StatusCode',
+    'latency': 'ResponseTime',
+    'is_empty': 'IsEmpty',
+    'timestamp': 'Timestamp',
+}
+
+def _column_indexes(header: List[str]) -> Tuple[int, ...]:
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+    try:
+        return tuple(positions[column.lower()] for column in CSV_COLUMNS.values())
+    except KeyError as e:
+        raise ValueError(f"CSV capture is missing column {e.args[0]!r}") from None
+
+def _read_header(path: str) -> Tuple[Tuple[int, ...], int]:
+    """(column indexes, byte offset of the first data row)"""
+    with open(path, 'rb') as f:
+        line = f.readline()
+        header = next(csv.reader([line.decode('utf-8-sig')]))
+        return _column_indexes(header), f.tell()
+
+def _parse_rows(rows, indexes: Tuple[int, ...]) -> Iterator[Dict[str, Any]]:
+    url_i, method_i, status_i, latency_i, empty_i, ts_i = indexes
+    width = max(indexes)
+    for row in rows:
+        if len(row) <= width:
+            continue
+        try:
+            status = int(row[status_i] or 0)
+            latency = float(row[latency_i] or 0)
+        except ValueError:
+            continue
+        yield {
+            'url': row[url_i],
+            'method': row[method_i],
+            'status_code': status,
+            'latency': int(latency) if latency.is_integer() else latency,
+            'is_empty': row[empty_i].strip().lower() == 'true',
+            'timestamp': row[ts_i],
+        }
+
+def iter_csv_records(path: str, start: int = None, end: int = None) -> Iterator[Dict[str, Any]]:
+    """Stream parsed rows; start/end restrict to a byte range aligned to line starts"""
+    indexes, data_start = _read_header(path)
+    if start is None and end is None:
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from _parse_rows(reader, indexes)
+        return
+
+    start = max(start or 0, data_start)
+    yield from _parse_rows(csv.reader(_range_lines(path, start, end)), indexes)
+
+def _range_lines(path: str, start: int, end: int = None, block_size: int = 1 << 20) -> Iterator[str]:
+    """Decoded lines in [start, end), read in blocks"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = (end - start) if end is not None else None
+        tail = b''
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            tail = block[cut:]
+            if cut:
+                yield from block[:cut].decode('utf-8').splitlines(True)
+        if tail:
+            yield tail.decode('utf-8')
+
+def iter_csv_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    """Parsed rows in lists of at most chunk_size"""
+    records = iter_csv_records(path)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def split_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """Byte ranges covering the data rows, each starting at a line boundary"""
+    _, data_start = _read_header(path)
+    size = os.path.getsize(path)
+    boundaries = [data_start]
+    with open(path, 'rb') as f:
+        for i in range(1, parts):
+            target = data_start + (size - data_start) * i // parts
+            if target <= boundaries[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()  # finish the line the target falls in
+            if f.tell() >= size:
+                break
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+# -- adapters -----------------------------------------------------------------
+
+def to_tracker_log(record: Dict[str, Any]) -> Dict[str, Any]:
+    """ApiStabilityTracker / HistoryStore log. Captures carry no sizes, so
+    only empty responses get a response_size (0)."""
+    return {
+        'endpoint': detect_pattern(record['url']),
+        'timestamp': record['timestamp'],
+        'status_code': record['status_code'],
+        'response_size': 0 if record['is_empty'] else None,
+        'latency': record['latency'],
+        'is_empty': record['is_empty'],
+    }
+
+def to_result(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Runner result, as found in a log file's 'results'"""
+    return {
+        'endpoint': detect_pattern(record['url']),
+        'url': record['url'],
+        'method': record['method'],
+        'statusCode': record['status_code'],
+        'latency': record['latency'],
+        'responseSize': 0 if record['is_empty'] else None,
+        'isEmpty': record['is_empty'],
+        'success': 0 < record['status_code'] < 400,
+        'timestamp': record['timestamp'],
+    }
+
+def to_snapshot_api(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Snapshot API entry, as found in a snapshot's 'apis'"""
+    return {
+        'url': record['url'],
+        'method': record['method'],
+        'status': 'pass' if 0 < record['status_code'] < 400 else 'fail',
+        'statusCode': record['status_code'],
+        'latency': record['latency'],
+        'isEmpty': record['is_empty'],
+        'timestamp': record['timestamp'],
+    }
+
+# -- consumers ----------------------------------------------------------------
+
+def _aggregate_range(path: str, start: int, end: int) -> Dict[str, Dict]:
+    return aggregate_results(to_result(record) for record in iter_csv_records(path, start, end))
+
+def aggregate_csv(path: str, workers: int = None) -> Dict[str, Dict]:
+    """Unscored MultiSiteProcessor aggregates per URL pattern.
+
+    With workers > 1 (default APILENS_CSV_WORKERS, else 1) the file is split
+    into byte ranges parsed in a process pool; results are merged in file
+    order, so latencies come out in the same order as a serial pass."""
+    workers = workers or int(os.getenv('APILENS_CSV_WORKERS', '1'))
+    if workers <= 1:
+        return aggregate_results(to_result(record) for record in iter_csv_records(path))
+
+    ranges = split_ranges(path, workers)
+    endpoint_stats = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futures = [pool.submit(_aggregate_range, path, start, end) for start, end in ranges]
+        for future in futures:
+            merge_endpoint_stats(endpoint_stats, future.result())
+    return endpoint_stats
+
+def load_tracker(path: str, tracker=None, chunk_size: int = DEFAULT_CHUNK_ROWS):
+    """Feed a capture into an ApiStabilityTracker chunk by chunk"""
+    if tracker is None:
+        from api_stability_tracker import ApiStabilityTracker
+        tracker = ApiStabilityTracker()
+    for chunk in iter_csv_chunks(path, chunk_size):
+        tracker.add_logs([to_tracker_log(record) for record in chunk])
+    return tracker
+
+def group_csv_by_pattern(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Snapshot APIs grouped by pattern, like SnapshotLoader.group_apis_by_pattern"""
+    groups = {}
+    for record in iter_csv_records(path):
+        api = to_snapshot_api(record)
+        groups.setdefault(detect_pattern(api['url']), []).append(api)
+    return groups
+
+def summarize_csv(path: str, comparator, key: str = None, chunk_size: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Any]:
+    """ComparisonEngine summary of a capture, built chunk by chunk without keeping the rows"""
+    if key is not None and comparator.get_summary(key) is not None:
+        return comparator.get_summary(key)
+    partials = []
+    for chunk in iter_csv_chunks(path, chunk_size):
+        groups = {}
+        for record in chunk:
+            groups.setdefault(detect_pattern(record['url']), []).append(to_snapshot_api(record))
+        partials.append(comparator.summarize(groups))
+    summary = comparator.merge_summaries(partials)
+    if key is not None:
+        comparator.cache_summary(key, summary)
+    return summary
+
+def csv_to_snapshot(path: str, loader, snapshot_id: str = None) -> str:
+    """Store a capture as a snapshot (in the loader's format); returns the snapshot id"""
+    apis = [to_snapshot_api(record) for record in iter_csv_records(path)]
+    timestamp = min((api['timestamp'] for api in apis if api['timestamp']), default=None)
+    if snapshot_id is None:
+        stamp = (timestamp or '').replace(':', '-').split('.')[0]
+        snapshot_id = f"snapshot_{stamp}" if stamp else os.path.splitext(os.path.basename(path))[0]
+    loader.write_snapshot(snapshot_id, {'timestamp': timestamp, 'source': os.path.basename(path), 'apis': apis})
+    return snapshot_id
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest captured traffic CSV files')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    stats = subparsers.add_parser('stats', help='Print per-pattern health scores')
+    stats.add_argument('csv_file')
+    stats.add_argument('--workers', type=int, default=None)
+    snapshot = subparsers.add_parser('snapshot', help='Store the capture as a snapshot')
+    snapshot.add_argument('csv_file')
+    snapshot.add_argument('--snapshots-dir', default='../snapshots')
+    snapshot.add_argument('--id', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        endpoint_stats = score_endpoint_stats(aggregate_csv(args.csv_file, workers=args.workers))
+        for endpoint, s in sorted(endpoint_stats.items(), key=lambda x: x[1]['health_score']):
+            print(f"{s['health_score']:>3}  {s['calls']:>6} calls  {s['failures']:>4} failed  "
+                  f"{s['empty']:>4} empty  {s['avg_latency']:>7.0f}ms  {endpoint}")
+    else:
+        from snapshot_loader import SnapshotLoader
+        snapshot_id = csv_to_snapshot(args.csv_file, SnapshotLoader(args.snapshots_dir), args.id)
+        print(f"📸 Stored {args.csv_file} as {snapshot_id}")
+
+if __name__ == "__main__":
+    main()
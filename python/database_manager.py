@@ -1,219 +1,305 @@
 #!/usr/bin/env python3
 
-import psycopg2
 import json
 import os
 import sys
-from datetime import datetime
-from typing import Dict, List, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file in the project root
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path)
 
+from storage_backends import StorageBackend, create_backend, LOW_HEALTH_THRESHOLD
+from query_cache import QueryCache
+
 class DatabaseManager:
-    def __init__(self, db_config=None):
-        # Use provided config or load from environment variables
-        self.db_config = db_config or {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'database': os.getenv('DB_NAME', 'apilens'),
-            'user': os.getenv('DB_USER', 'postgres'),
-            'password': os.getenv('DB_PASSWORD', 'password'),
-            'port': os.getenv('DB_PORT', '5432')
-        }
+    def __init__(self, db_config=None, backend: StorageBackend = None):
+        # Use provided backend, or build one from config / environment variables
+        # (DB_BACKEND=postgres|sqlite, DB_HOST..., SQLITE_PATH)
+        self.backend = backend or create_backend(db_config=db_config)
+        self.db_config = getattr(self.backend, 'db_config', db_config)
+        
+        # Short-lived cache for historical/dashboard reads, invalidated per site on save
+        self.query_cache = QueryCache(
+            ttl=float(os.getenv('APILENS_QUERY_CACHE_TTL', '60')),
+            max_entries=int(os.getenv('APILENS_QUERY_CACHE_SIZE', '256'))
+        )
         self.init_database()
     
     def init_database(self):
         """Initialize database and tables if they don't exist"""
-        try:
-            # First try to connect to the database
-            conn = psycopg2.connect(**self.db_config)
-            conn.close()
-        except psycopg2.OperationalError:
-            # Database doesn't exist, create it
-            temp_config = self.db_config.copy()
-            temp_config['database'] = 'postgres'  # Connect to default database
-            
-            conn = psycopg2.connect(**temp_config)
-            conn.autocommit = True
-            with conn.cursor() as cur:
-                cur.execute(f"CREATE DATABASE {self.db_config['database']}")
-            conn.close()
-        
-        # Now create tables if they don't exist
-        self.create_tables()
+        self.backend.initialize()
     
     def create_tables(self):
         """Create database tables if they don't exist"""
-        schema_sql = """
-        CREATE TABLE IF NOT EXISTS sites (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) UNIQUE NOT NULL,
-            base_url VARCHAR(500) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE TABLE IF NOT EXISTS test_runs (
-            id SERIAL PRIMARY KEY,
-            site_id INTEGER REFERENCES sites(id),
-            run_id VARCHAR(100) NOT NULL,
-            timestamp TIMESTAMP NOT NULL,
-            total_endpoints INTEGER,
-            total_failures INTEGER,
-            total_empty_responses INTEGER,
-            avg_health_score DECIMAL(5,2),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE TABLE IF NOT EXISTS endpoint_results (
-            id SERIAL PRIMARY KEY,
-            test_run_id INTEGER REFERENCES test_runs(id),
-            endpoint VARCHAR(500) NOT NULL,
-            method VARCHAR(10) NOT NULL,
-            status_code INTEGER,
-            latency INTEGER,
-            response_size INTEGER,
-            is_empty BOOLEAN,
-            success BOOLEAN,
-            health_score INTEGER,
-            error_message TEXT,
-            timestamp TIMESTAMP NOT NULL
-        );
-        
-        CREATE TABLE IF NOT EXISTS alerts (
-            id SERIAL PRIMARY KEY,
-            site_id INTEGER REFERENCES sites(id),
-            endpoint VARCHAR(500),
-            alert_type VARCHAR(50) NOT NULL,
-            threshold_value DECIMAL(10,2),
-            current_value DECIMAL(10,2),
-            message TEXT,
-            status VARCHAR(20) DEFAULT 'active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            resolved_at TIMESTAMP
-        );
-        
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(100) UNIQUE NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            role VARCHAR(50) DEFAULT 'viewer',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE TABLE IF NOT EXISTS user_site_access (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            site_id INTEGER REFERENCES sites(id),
-            access_level VARCHAR(50) DEFAULT 'read',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, site_id)
-        );
-        
-        CREATE INDEX IF NOT EXISTS idx_test_runs_site_timestamp ON test_runs(site_id, timestamp);
-        CREATE INDEX IF NOT EXISTS idx_endpoint_results_test_run ON endpoint_results(test_run_id);
-        CREATE INDEX IF NOT EXISTS idx_alerts_site_status ON alerts(site_id, status);
-        """
-        
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(schema_sql)
-            conn.commit()
+        self.backend.initialize()
     
     def get_connection(self):
-        return psycopg2.connect(**self.db_config)
+        return self.backend.connect()
     
-    def save_test_run(self, site: str, run_data: Dict) -> int:
-        """Save test run data to database"""
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Get or create site
-                base_url = ''
-                if 'config' in run_data and isinstance(run_data['config'], dict):
-                    base_url = run_data['config'].get('baseUrl', '')
-                elif 'config' in run_data and isinstance(run_data['config'], str):
-                    base_url = run_data['config']
-                    
-                cur.execute("INSERT INTO sites (name, base_url) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING", 
-                           (site, base_url))
-                
-                cur.execute("SELECT id FROM sites WHERE name = %s", (site,))
-                site_id = cur.fetchone()[0]
-                
-                # Calculate summary stats
-                results = run_data.get('results', [])
-                total_endpoints = len(results)
-                total_failures = sum(1 for r in results if not r.get('success', False))
-                total_empty = sum(1 for r in results if r.get('isEmpty', False))
-                
-                # Insert test run
-                cur.execute("""
-                    INSERT INTO test_runs (site_id, run_id, timestamp, total_endpoints, total_failures, total_empty_responses)
-                    VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
-                """, (site_id, run_data['runId'], run_data['timestamp'], total_endpoints, total_failures, total_empty))
-                
-                test_run_id = cur.fetchone()[0]
-                
-                # Insert endpoint results
-                for result in results:
-                    cur.execute("""
-                        INSERT INTO endpoint_results 
-                        (test_run_id, endpoint, method, status_code, latency, response_size, is_empty, success, error_message, timestamp)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        test_run_id, result['endpoint'], result['method'], result['statusCode'],
-                        result['latency'], result['responseSize'], result['isEmpty'], result['success'],
-                        result.get('error'), result['timestamp']
-                    ))
-                
-                conn.commit()
-                return test_run_id
+    def save_test_run(self, site: str, run_data: Dict, endpoint_stats: Dict = None) -> int:
+        """Save test run data to database, including computed health scores"""
+        return self.save_test_runs([(site, run_data, endpoint_stats)])[0]
+    
+    def save_test_runs(self, runs: List[Tuple[str, Dict, Dict]]) -> List[int]:
+        """Save several (site, run_data, endpoint_stats) runs in a single transaction"""
+        with self.backend.transaction() as cur:
+            test_run_ids = [self._insert_test_run(cur, site, run_data, endpoint_stats)
+                            for site, run_data, endpoint_stats in runs]
+        
+        # Committed: cached reads for these sites are now out of date
+        for site in {site for site, _, _ in runs}:
+            self.query_cache.invalidate(site)
+        return test_run_ids
+    
+    def _insert_test_run(self, cur, site: str, run_data: Dict, endpoint_stats: Dict = None) -> int:
+        """Insert one test run and its endpoint results using an open cursor"""
+        endpoint_stats = endpoint_stats or {}
+        
+        # Get or create site
+        base_url = ''
+        if 'config' in run_data and isinstance(run_data['config'], dict):
+            base_url = run_data['config'].get('baseUrl', '')
+        elif 'config' in run_data and isinstance(run_data['config'], str):
+            base_url = run_data['config']
+            
+        cur.execute("INSERT INTO sites (name, base_url) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING", 
+                   (site, base_url))
+        
+        cur.execute("SELECT id FROM sites WHERE name = %s", (site,))
+        site_id = cur.fetchone()[0]
+        
+        # Calculate summary stats
+        results = run_data.get('results', [])
+        total_endpoints = len(results)
+        total_failures = sum(1 for r in results if not r.get('success', False))
+        total_empty = sum(1 for r in results if r.get('isEmpty', False))
+        
+        # Average health score across endpoints, as shown in the HTML report
+        health_scores = [s['health_score'] for s in endpoint_stats.values() if 'health_score' in s]
+        avg_health_score = round(sum(health_scores) / len(health_scores), 2) if health_scores else None
+        
+        # Insert test run
+        test_run_id = self.backend.insert_returning_id(cur, """
+            INSERT INTO test_runs (site_id, run_id, timestamp, total_endpoints, total_failures, total_empty_responses, avg_health_score)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (site_id, run_data['runId'], self.backend.adapt_timestamp(run_data['timestamp']),
+              total_endpoints, total_failures, total_empty, avg_health_score))
+        
+        # Insert endpoint results
+        rows = []
+        for result in results:
+            health_score = endpoint_stats.get(result['endpoint'], {}).get('health_score')
+            rows.append((
+                test_run_id, result['endpoint'], result['method'], result['statusCode'],
+                result['latency'], result['responseSize'], result['isEmpty'], result['success'],
+                health_score, result.get('error'), self.backend.adapt_timestamp(result['timestamp'])
+            ))
+        self.backend.bulk_insert(cur, 'endpoint_results', (
+            'test_run_id', 'endpoint', 'method', 'status_code', 'latency', 'response_size',
+            'is_empty', 'success', 'health_score', 'error_message', 'timestamp'
+        ), rows)
+        
+        return test_run_id
+    
+    def update_health_scores(self, site: str, runs: List[Tuple[str, Dict]]) -> int:
+        """Rewrite the stored health scores of already-saved runs, e.g. after the
+        scoring formula changed. `runs` are (run_id, scored endpoint_stats) pairs;
+        returns how many of them were found."""
+        if not runs:
+            return 0
+        with self.backend.transaction() as cur:
+            ids = {}
+            # Bounded IN lists keep under SQLite's parameter limit
+            for i in range(0, len(runs), 500):
+                run_ids = [run_id for run_id, _ in runs[i:i + 500]]
+                cur.execute(f"""
+                    SELECT tr.run_id, tr.id FROM test_runs tr JOIN sites s ON tr.site_id = s.id
+                    WHERE s.name = %s AND tr.run_id IN ({', '.join(['%s'] * len(run_ids))})
+                """, (site, *run_ids))
+                ids.update(cur.fetchall())
+            
+            endpoint_rows, run_rows = [], []
+            for run_id, endpoint_stats in runs:
+                test_run_id = ids.get(run_id)
+                if test_run_id is None:
+                    continue
+                for endpoint, stats in endpoint_stats.items():
+                    endpoint_rows.append((stats['health_score'], test_run_id, endpoint))
+                health_scores = [stats['health_score'] for stats in endpoint_stats.values()]
+                run_rows.append((round(sum(health_scores) / len(health_scores), 2) if health_scores else None,
+                                 test_run_id))
+            self.backend.execute_many(cur, "UPDATE endpoint_results SET health_score = %s "
+                                           "WHERE test_run_id = %s AND endpoint = %s", endpoint_rows)
+            self.backend.execute_many(cur, "UPDATE test_runs SET avg_health_score = %s WHERE id = %s", run_rows)
+        
+        self.query_cache.invalidate(site)
+        return len(run_rows)
     
     def get_historical_data(self, site: str, days: int = 30) -> List[Dict]:
-        """Get historical test data for a site"""
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT tr.run_id, tr.timestamp, tr.total_endpoints, tr.total_failures, tr.total_empty_responses,
-                           COUNT(er.id) as endpoint_count, AVG(er.health_score) as avg_health_score
-                    FROM test_runs tr
-                    JOIN sites s ON tr.site_id = s.id
-                    LEFT JOIN endpoint_results er ON tr.id = er.test_run_id
-                    WHERE s.name = %s AND tr.timestamp >= NOW() - INTERVAL '%s days'
-                    GROUP BY tr.id, tr.run_id, tr.timestamp, tr.total_endpoints, tr.total_failures, tr.total_empty_responses
-                    ORDER BY tr.timestamp DESC
-                """, (site, days))
-                
-                columns = [desc[0] for desc in cur.description]
-                return [dict(zip(columns, row)) for row in cur.fetchall()]
+        """Get historical test data for a site (cached until the site's next save)"""
+        rows = self.query_cache.get_or_load((site, 'historical', days),
+                                            lambda: self._query_historical_data(site, days))
+        return [dict(row) for row in rows]
+    
+    def _query_historical_data(self, site: str, days: int) -> List[Dict]:
+        with self.backend.transaction() as cur:
+            cur.execute(f"""
+                SELECT tr.run_id, tr.timestamp, tr.total_endpoints, tr.total_failures, tr.total_empty_responses,
+                       COUNT(er.id) as endpoint_count, AVG(er.health_score) as avg_health_score
+                FROM test_runs tr
+                JOIN sites s ON tr.site_id = s.id
+                LEFT JOIN endpoint_results er ON tr.id = er.test_run_id
+                WHERE s.name = %s AND {self.backend.since('tr.timestamp')}
+                GROUP BY tr.id, tr.run_id, tr.timestamp, tr.total_endpoints, tr.total_failures, tr.total_empty_responses
+                ORDER BY tr.timestamp DESC
+            """, (site, self.backend.ago(timedelta(days=days))))
+            
+            columns = [desc[0] for desc in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
     
-    def check_health_alerts(self, site: str, health_threshold: int = 70) -> List[Dict]:
-        """Check for health score alerts"""
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT s.name, er.endpoint, er.health_score, er.timestamp
-                    FROM endpoint_results er
-                    JOIN test_runs tr ON er.test_run_id = tr.id
-                    JOIN sites s ON tr.site_id = s.id
-                    WHERE s.name = %s AND er.health_score < %s
-                    AND er.timestamp >= NOW() - INTERVAL '1 hour'
-                    ORDER BY er.health_score ASC
-                """, (site, health_threshold))
-                
-                columns = [desc[0] for desc in cur.description]
-                return [dict(zip(columns, row)) for row in cur.fetchall()]
+    def cache_stats(self) -> Dict[str, int]:
+        """Query cache hit/miss counters"""
+        return self.query_cache.stats()
+    
+    def check_health_alerts(self, site: str, health_threshold: int = LOW_HEALTH_THRESHOLD) -> List[Dict]:
+        """Check for health score alerts (served by idx_endpoint_results_low_health)"""
+        with self.backend.transaction() as cur:
+            cur.execute(f"""
+                SELECT s.name, er.endpoint, er.health_score, er.timestamp
+                FROM endpoint_results er
+                JOIN test_runs tr ON er.test_run_id = tr.id
+                JOIN sites s ON tr.site_id = s.id
+                WHERE s.name = %s AND er.health_score < %s
+                AND {self.backend.since('er.timestamp')}
+                ORDER BY er.health_score ASC
+            """, (site, health_threshold, self.backend.ago(timedelta(hours=1))))
+            
+            columns = [desc[0] for desc in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
     
     def create_alert(self, site: str, endpoint: str, alert_type: str, threshold: float, current: float, message: str):
         """Create an alert record"""
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM sites WHERE name = %s", (site,))
-                site_id = cur.fetchone()[0]
-                
-                cur.execute("""
-                    INSERT INTO alerts (site_id, endpoint, alert_type, threshold_value, current_value, message)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (site_id, endpoint, alert_type, threshold, current, message))
\ No newline at end of file
+        with self.backend.transaction() as cur:
+            cur.execute("SELECT id FROM sites WHERE name = %s", (site,))
+            site_id = cur.fetchone()[0]
+            
+            cur.execute("""
+                INSERT INTO alerts (site_id, endpoint, alert_type, threshold_value, current_value, message)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (site_id, endpoint, alert_type, threshold, current, message))
+    
+    def evaluate_health_alerts(self, site: str, health_threshold: int = LOW_HEALTH_THRESHOLD,
+                               cooldown_minutes: int = 30) -> Dict[str, List[Dict]]:
+        """Set-based health alert evaluation: one query for breaching endpoints,
+        then a single upsert pass over the site's active alerts.
+        
+        Only each endpoint's most recent run in the last hour counts, so an endpoint
+        that has recovered since an earlier breach resolves instead of staying active.
+        Breaching rows are found through idx_endpoint_results_low_health."""
+        window = timedelta(hours=1)
+        with self.backend.transaction() as cur:
+            cur.execute(f"""
+                SELECT er.endpoint, MIN(er.health_score)
+                FROM endpoint_results er
+                JOIN test_runs tr ON er.test_run_id = tr.id
+                JOIN sites s ON tr.site_id = s.id
+                JOIN (
+                    SELECT er2.endpoint, MAX(tr2.timestamp) AS latest
+                    FROM endpoint_results er2
+                    JOIN test_runs tr2 ON er2.test_run_id = tr2.id
+                    JOIN sites s2 ON tr2.site_id = s2.id
+                    WHERE s2.name = %s AND {self.backend.since('tr2.timestamp')}
+                    GROUP BY er2.endpoint
+                ) latest ON latest.endpoint = er.endpoint AND latest.latest = tr.timestamp
+                WHERE s.name = %s AND er.health_score < %s
+                AND {self.backend.since('er.timestamp')} AND {self.backend.since('tr.timestamp')}
+                GROUP BY er.endpoint
+            """, (site, self.backend.ago(window), site, health_threshold, self.backend.ago(window), self.backend.ago(window)))
+            breaches = {endpoint: score for endpoint, score in cur.fetchall()}
+            
+            messages = {endpoint: f"Health Alert: {endpoint} on {site} has health score {score}"
+                        for endpoint, score in breaches.items()}
+            return self._upsert_alerts(cur, site, 'health_score', breaches, health_threshold,
+                                       messages, cooldown_minutes)
+    
+    def upsert_alerts(self, site: str, alert_type: str, breaches: Dict[str, float], threshold: float,
+                      messages: Dict[str, str] = None, cooldown_minutes: int = 30,
+                      resolve_missing: bool = True, resolve: List[str] = None) -> Dict[str, List[Dict]]:
+        """Record breaching endpoints as active alerts keyed by (site, endpoint, type).
+        
+        New breaches open an alert, repeat breaches update the existing one, and active
+        alerts whose endpoint is no longer breaching are resolved (or, with
+        resolve_missing=False, only those listed in resolve). Returns the alerts to
+        notify about: 'opened', 'repeated' (cooldown elapsed since the last notification)
+        and 'resolved'."""
+        with self.backend.transaction() as cur:
+            return self._upsert_alerts(cur, site, alert_type, breaches, threshold,
+                                       messages or {}, cooldown_minutes, resolve_missing, resolve)
+    
+    def _upsert_alerts(self, cur, site: str, alert_type: str, breaches: Dict[str, float], threshold: float,
+                       messages: Dict[str, str], cooldown_minutes: int, resolve_missing: bool = True,
+                       resolve: List[str] = None) -> Dict[str, List[Dict]]:
+        outcome = {'opened': [], 'repeated': [], 'resolved': []}
+        
+        cur.execute("SELECT id FROM sites WHERE name = %s", (site,))
+        row = cur.fetchone()
+        if row is None:
+            return outcome
+        site_id = row[0]
+        
+        utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+        now = self.backend.adapt_timestamp(utc_now)
+        notify_before = self.backend.adapt_timestamp(utc_now - timedelta(minutes=cooldown_minutes))
+        
+        cur.execute("""
+            SELECT id, endpoint, occurrences, (last_notified_at IS NULL OR last_notified_at < %s) AS due
+            FROM alerts
+            WHERE site_id = %s AND alert_type = %s AND status = 'active'
+        """, (notify_before, site_id, alert_type))
+        active = {endpoint: (alert_id, occurrences or 1, bool(due))
+                  for alert_id, endpoint, occurrences, due in cur.fetchall()}
+        
+        new_rows = []
+        repeat_rows = []
+        for endpoint, value in breaches.items():
+            message = messages.get(endpoint, f"{alert_type} alert: {endpoint} on {site} at {value}")
+            alert = {'site': site, 'endpoint': endpoint, 'alert_type': alert_type,
+                     'threshold': threshold, 'current': value, 'message': message}
+            
+            if endpoint not in active:
+                new_rows.append((site_id, endpoint, alert_type, threshold, value, message, now, now, 1))
+                outcome['opened'].append(alert)
+                continue
+            
+            alert_id, occurrences, due = active[endpoint]
+            alert['occurrences'] = occurrences + 1
+            repeat_rows.append((value, message, now, now if due else None, alert_id))
+            if due:
+                outcome['repeated'].append(alert)
+        
+        self.backend.bulk_insert(cur, 'alerts', (
+            'site_id', 'endpoint', 'alert_type', 'threshold_value', 'current_value', 'message',
+            'last_seen_at', 'last_notified_at', 'occurrences'
+        ), new_rows)
+        
+        if repeat_rows:
+            self.backend.execute_many(cur, """
+                UPDATE alerts
+                SET current_value = %s, message = %s, last_seen_at = %s,
+                    last_notified_at = COALESCE(%s, last_notified_at), occurrences = occurrences + 1
+                WHERE id = %s
+            """, repeat_rows)
+        
+        resolve = set(resolve or [])
+        recovered = [(now, alert_id, endpoint) for endpoint, (alert_id, _, _) in active.items()
+                     if endpoint not in breaches and (resolve_missing or endpoint in resolve)]
+        if recovered:
+            self.backend.execute_many(cur, "UPDATE alerts SET status = 'resolved', resolved_at = %s WHERE id = %s",
+                                      [(resolved_at, alert_id) for resolved_at, alert_id, _ in recovered])
+            outcome['resolved'] = [{'site': site, 'endpoint': endpoint, 'alert_type': alert_type}
+                                   for _, _, endpoint in recovered]
+        
+        return outcome
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint aggregates shared by the log processor and the CSV ingester.
+
+Aggregates are plain dicts (calls, failures, empty, latencies) that can be
+built from any slice of a run and merged, so large inputs can be split
+across workers and combined before scoring.
+"""
+
+from typing import Any, Dict, Iterable
+
+def new_endpoint_stats() -> Dict[str, Any]:
+    return {
+        'calls': 0,
+        'failures': 0,
+        'empty': 0,
+        'latencies': [],
+        'success_rate': 0,
+        'health_score': 0
+    }
+
+def aggregate_results(results: Iterable[Dict[str, Any]], endpoint_stats: Dict[str, Dict] = None) -> Dict[str, Dict]:
+    """Group runner results ({endpoint, latency, success, isEmpty}) by endpoint"""
+    endpoint_stats = {} if endpoint_stats is None else endpoint_stats
+    for result in results:
+        endpoint = result['endpoint']
+        stats = endpoint_stats.get(endpoint)
+        if stats is None:
+            stats = endpoint_stats[endpoint] = new_endpoint_stats()
+
+        stats['calls'] += 1
+        stats['latencies'].append(result['latency'])
+
+        if not result['success']:
+            stats['failures'] += 1
+
+        if result['isEmpty']:
+            stats['empty'] += 1
+    return endpoint_stats
+
+def merge_endpoint_stats(target: Dict[str, Dict], other: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Fold unscored aggregates from another slice into target"""
+    for endpoint, stats in other.items():
+        existing = target.get(endpoint)
+        if existing is None:
+            target[endpoint] = stats
+            continue
+        existing['calls'] += stats['calls']
+        existing['failures'] += stats['failures']
+        existing['empty'] += stats['empty']
+        existing['latencies'].extend(stats['latencies'])
+    return target
+
+def score_endpoint_stats(endpoint_stats: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Fill in success rate, average latency and health score (0-100) for every endpoint"""
+    for stats in endpoint_stats.values():
+        success_rate = (stats['calls'] - stats['failures']) / stats['calls']
+        empty_rate = stats['empty'] / stats['calls']
+        avg_latency = sum(stats['latencies']) / len(stats['latencies'])
+
+        # Health score formula
+        health_score = 100
+        health_score -= (1 - success_rate) * 60  # Failures penalty
+        health_score -= empty_rate * 30          # Empty responses penalty
+        health_score -= min(avg_latency / 1000 * 10, 10)  # Latency penalty (max 10 points)
+        health_score = max(0, int(health_score))
+
+        stats['health_score'] = health_score
+        stats['success_rate'] = success_rate
+        stats['avg_latency'] = avg_latency
+    return endpoint_stats
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Append-only, memory-mapped columnar store for API call history.
+
+Each column is a flat little-endian file of fixed-width values (timestamps,
+site/endpoint ids, status codes, latencies, sizes, empty flags). Strings are
+stored once in a dictionary file and referenced by id. Appends are committed
+by rewriting a small meta.json (row count plus per-chunk time ranges), so
+readers never see half-written batches. Queries return memoryview slices of
+the mapped files, so a 90-day scan copies nothing into Python objects until
+the caller reads values. Any number of processes may read and append:
+appends take an exclusive flock on append.lock, so each one sees the rows
+and strings committed by the previous one.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import sys
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+COLUMNS = {
+    'timestamp': 'q',   # epoch milliseconds (UTC)
+    'site': 'I',        # string id
+    'endpoint': 'I',    # string id
+    'status': 'H',      # HTTP status code
+    'latency': 'f',     # milliseconds
+    'size': 'q',        # response bytes
+    'empty': 'B',       # 1 if the response was empty
+}
+
+META_FILE = 'meta.json'
+STRINGS_FILE = 'strings.jsonl'
+SOURCES_FILE = 'sources.jsonl'
+LOCK_FILE = 'append.lock'
+
+# Appends extend the last chunk until it holds this many rows
+CHUNK_ROWS = 65536
+
+def to_epoch_ms(value: Any) -> int:
+    """Epoch milliseconds from a datetime, ISO string or number (seconds or ms)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    if isinstance(value, str):
+        return to_epoch_ms(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    value = float(value)
+    # Treat small numbers as seconds
+    return int(value * 1000) if value < 1e11 else int(value)
+
+class HistoryStore:
+    def __init__(self, path: str):
+        if not os.path.isabs(path):
+            # Relative paths are resolved against the project root, like the .env file
+            path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._strings_offset = 0
+        self._maps = {}
+        self._mapped_rows = 0
+        self._sources = {}
+        self.meta = self._read_meta()
+        self._load_strings()
+        self._load_sources()
+
+    # -- strings -------------------------------------------------------------
+
+    def _load_strings(self):
+        """Read dictionary entries appended since the last load (by us or another process)"""
+        strings_path = os.path.join(self.path, STRINGS_FILE)
+        if not os.path.exists(strings_path):
+            return
+        with open(strings_path, 'rb') as f:
+            f.seek(self._strings_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partially written by a concurrent appender
+                value = json.loads(line)
+                self._string_ids[value] = len(self._strings)
+                self._strings.append(value)
+                self._strings_offset += len(line)
+
+    def string(self, string_id: int) -> str:
+        if string_id >= len(self._strings):
+            self._load_strings()
+        return self._strings[string_id]
+
+    def string_id(self, value: str) -> Optional[int]:
+        """Id of an already stored string, or None"""
+        if value not in self._string_ids:
+            self._load_strings()
+        return self._string_ids.get(value)
+
+    def _intern(self, value: str, new_ids: Dict[str, int]) -> int:
+        """Id of a string, assigning the next free one in new_ids; the dictionary itself
+        is only extended once new_ids are written, so a failed append leaves no gaps"""
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = new_ids.get(value)
+            if string_id is None:
+                string_id = new_ids[value] = len(self._strings) + len(new_ids)
+        return string_id
+
+    # -- writing -------------------------------------------------------------
+
+    def append(self, site: str, records: Iterable[Dict[str, Any]], source: str = None) -> int:
+        """Append API calls for a site; returns the number of rows written.
+
+        Records use the ApiStabilityTracker log shape (endpoint, timestamp,
+        status_code, response_size) plus optional latency and is_empty.
+        `source` (e.g. a snapshot id) is recorded with the same commit so
+        has_source() can skip it on the next import; a source another process
+        imported first is skipped here (0 rows)."""
+        # The thread lock serializes this process's writers, the flock other processes
+        with self._lock, self._append_lock():
+            self.meta = self._read_meta()
+            self._load_strings()
+            if source is not None:
+                self._load_sources()
+                if self.has_source(source):
+                    return 0
+            new_ids = {}
+            site_id = self._intern(site, new_ids)
+            columns = {name: array(code) for name, code in COLUMNS.items()}
+
+            for record in records:
+                size = record.get('response_size', 0) or 0
+                columns['timestamp'].append(to_epoch_ms(record['timestamp']))
+                columns['site'].append(site_id)
+                columns['endpoint'].append(self._intern(record['endpoint'], new_ids))
+                columns['status'].append(int(record.get('status_code', 200) or 0))
+                columns['latency'].append(float(record.get('latency', 0) or 0))
+                columns['size'].append(int(size))
+                columns['empty'].append(1 if record.get('is_empty', size == 0) else 0)
+
+            rows = len(columns['timestamp'])
+            if not rows and source is None:
+                return 0
+
+            # Strings first, then columns, then the meta commit point
+            if new_ids:
+                with open(os.path.join(self.path, STRINGS_FILE), 'ab') as f:
+                    f.write(b''.join(json.dumps(s).encode('utf-8') + b'\n' for s in new_ids))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._strings_offset = os.path.getsize(os.path.join(self.path, STRINGS_FILE))
+                self._strings.extend(new_ids)
+                self._string_ids.update(new_ids)
+
+            start = self.meta['rows']
+            for name, values in columns.items():
+                column_path = self._column_path(name)
+                with open(column_path, 'ab') as f:
+                    # Drop bytes from an append that crashed before committing
+                    f.truncate(start * values.itemsize)
+                    if sys.byteorder == 'big':
+                        values.byteswap()
+                    f.write(values.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if source is not None:
+                # Only trusted once meta.json commits rows up to this point
+                with open(os.path.join(self.path, SOURCES_FILE), 'a') as f:
+                    f.write(json.dumps([source, start + rows]) + '\n')
+                self._sources[source] = start + rows
+
+            if rows:
+                self.meta['rows'] = start + rows
+                self._extend_chunks(start, rows, columns['timestamp'], site_id)
+            self._write_meta()
+            return rows
+
+    @contextmanager
+    def _append_lock(self):
+        with open(os.path.join(self.path, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _extend_chunks(self, start: int, rows: int, timestamps: array, site_id: int):
+        chunks = self.meta['chunks']
+        last = chunks[-1] if chunks else None
+        if last is None or last['end'] != start or last['end'] - last['start'] >= CHUNK_ROWS:
+            last = {'start': start, 'end': start, 'min_ts': min(timestamps), 'max_ts': max(timestamps), 'sites': []}
+            chunks.append(last)
+        last['end'] = start + rows
+        last['min_ts'] = min(last['min_ts'], min(timestamps))
+        last['max_ts'] = max(last['max_ts'], max(timestamps))
+        if site_id not in last['sites']:
+            last['sites'].append(site_id)
+
+    # -- reading -------------------------------------------------------------
+
+    def refresh(self):
+        """Pick up rows committed by other processes"""
+        with self._lock:
+            self.meta = self._read_meta()
+            self._load_strings()
+            self._load_sources()
+
+    def columns(self, start: int = 0, end: int = None) -> Dict[str, memoryview]:
+        """Zero-copy views of rows [start, end) for every column"""
+        end = self.meta['rows'] if end is None else end
+        self._ensure_mapped(end)
+        return {name: view[start:end] for name, view in self._maps.items()}
+
+    def scan(self, start: Any = None, end: Any = None, site: str = None) -> Iterator[Dict[str, memoryview]]:
+        """Column slices for chunks overlapping [start, end), optionally for one site.
+
+        Bounds accept datetimes, ISO strings or epoch numbers. Rows inside a
+        yielded chunk may still fall outside the bounds; filter on
+        'timestamp' when exactness matters."""
+        start_ms = to_epoch_ms(start) if start is not None else None
+        end_ms = to_epoch_ms(end) if end is not None else None
+        # Chunks can hold several sites; filter on 'site' as well
+        site_id = None
+        if site is not None:
+            site_id = self.string_id(site)
+            if site_id is None:
+                return
+
+        for chunk in self.meta['chunks']:
+            if start_ms is not None and chunk['max_ts'] < start_ms:
+                continue
+            if end_ms is not None and chunk['min_ts'] >= end_ms:
+                continue
+            if site_id is not None and site_id not in chunk['sites']:
+                continue
+            yield self.columns(chunk['start'], chunk['end'])
+
+    def row_count(self) -> int:
+        return self.meta['rows']
+
+    def _ensure_mapped(self, rows: int):
+        if rows <= self._mapped_rows and self._maps:
+            return
+        self._release_maps()
+        for name, code in COLUMNS.items():
+            column_path = self._column_path(name)
+            if rows == 0 or not os.path.exists(column_path):
+                self._maps[name] = memoryview(array(code))
+                continue
+            with open(column_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            itemsize = array(code).itemsize
+            view = memoryview(mapped)[:rows * itemsize]
+            if sys.byteorder == 'big':
+                # Stored little-endian: big-endian hosts need a (copied) swap
+                values = array(code, view.tobytes())
+                values.byteswap()
+                self._maps[name] = memoryview(values)
+            else:
+                self._maps[name] = view.cast(code)
+        self._mapped_rows = rows
+
+    def _release_maps(self):
+        for view in self._maps.values():
+            try:
+                view.release()
+            except (BufferError, ValueError):
+                # Slices handed out earlier keep the old mapping alive until dropped
+                pass
+        self._maps = {}
+        self._mapped_rows = 0
+
+    def close(self):
+        self._release_maps()
+
+    # -- metadata ------------------------------------------------------------
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.{COLUMNS[name]}.col")
+
+    def _read_meta(self) -> Dict[str, Any]:
+        meta_path = os.path.join(self.path, META_FILE)
+        if not os.path.exists(meta_path):
+            return {'version': 1, 'rows': 0, 'chunks': []}
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.path, META_FILE)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, meta_path)
+
+    def _load_sources(self):
+        sources_path = os.path.join(self.path, SOURCES_FILE)
+        if not os.path.exists(sources_path):
+            return
+        with open(sources_path, 'r') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    source, end_row = json.loads(line)
+                    self._sources[source] = end_row
+
+    def has_source(self, source: str) -> bool:
+        """Whether a snapshot/log file has already been imported"""
+        end_row = self._sources.get(source)
+        return end_row is not None and end_row <= self.meta['rows']
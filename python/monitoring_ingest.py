@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Streaming reader for monitoring-run output (healthmug_api_monitoring.json).
+
+The file is a JSON list of runs, each with `httpFailures`, `emptyResponses`
+and (in newer output) `successfulCalls` / `apiDetails` arrays of API calls.
+Runs are walked incrementally: only one call object is decoded at a time,
+so a multi-MB document is never held in memory. The same call usually
+appears in several arrays (apiDetails repeats every call), so calls are
+de-duplicated per run on (timestamp, url, method).
+
+Calls are flattened into ApiStabilityTracker logs keyed by URL pattern, so
+tracking pixels whose query strings differ on every request (facebook.com/tr,
+google-analytics collect, ...) score as one endpoint.
+
+Usage:
+    python monitoring_ingest.py <monitoring.json>
+"""
+
+import json
+import sys
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple
+from snapshot_loader import detect_pattern
+
+# Run keys holding arrays of API calls
+CALL_ARRAYS = ('httpFailures', 'emptyResponses', 'successfulCalls', 'apiDetails')
+
+# Call types whose response body is unusable
+EMPTY_TYPES = ('EMPTY_RESPONSE', 'READ_ERROR')
+
+DEFAULT_CHUNK_ROWS = 10000
+
+_decoder = json.JSONDecoder()
+
+class _JsonStream:
+    """Minimal pull parser over a text file: enough to walk lists and objects
+    and decode leaf values one at a time."""
+
+    def __init__(self, f, block_size: int = 1 << 16):
+        self.f = f
+        self.block_size = block_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        block = self.f.read(self.block_size)
+        if not block:
+            self.eof = True
+            return False
+        # Drop consumed text so the buffer stays around one value in size
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in monitoring output, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next block
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self) -> Iterator[None]:
+        """Step through a list; the caller consumes each element"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Malformed list in monitoring output near {char!r}")
+
+    def keys(self) -> Iterator[str]:
+        """Step through an object, yielding keys; the caller consumes each value"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"Malformed object in monitoring output near {char!r}")
+
+def iter_monitoring_calls(path: str) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(run info, call) pairs, each call once per run.
+
+    Run info holds the run's scalar fields (e.g. timestamp) seen before the call."""
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        runs = stream.items() if stream.peek() == '[' else iter([None])
+        for _ in runs:
+            run = {}
+            seen = set()
+            for key in stream.keys():
+                if key in CALL_ARRAYS and stream.peek() == '[':
+                    for _ in stream.items():
+                        call = stream.value()
+                        if not isinstance(call, dict):
+                            continue
+                        identity = (call.get('timestamp'), call.get('url'), call.get('method'))
+                        if identity in seen:
+                            continue
+                        seen.add(identity)
+                        yield run, call
+                else:
+                    value = stream.value()
+                    if not isinstance(value, (list, dict)):
+                        run[key] = value
+
+def to_tracker_log(run: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, Any]:
+    """ApiStabilityTracker / HistoryStore log for one monitored call"""
+    is_empty = bool(call.get('isEmpty')) or call.get('type') in EMPTY_TYPES
+    return {
+        # Interned, so thousands of pixel hits share one endpoint string
+        'endpoint': sys.intern(detect_pattern(call.get('url', 'unknown'))),
+        'timestamp': call.get('timestamp') or run.get('timestamp'),
+        'status_code': call.get('statusCode', 200),
+        'response_size': 0 if is_empty else None,
+        'latency': call.get('latency', call.get('duration', 0)),
+        'is_empty': is_empty,
+    }
+
+def iter_monitoring_logs(path: str) -> Iterator[Dict[str, Any]]:
+    for run, call in iter_monitoring_calls(path):
+        yield to_tracker_log(run, call)
+
+def iter_monitoring_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    logs = iter_monitoring_logs(path)
+    while True:
+        chunk = list(islice(logs, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def load_tracker(path: str, tracker=None, chunk_size: int = DEFAULT_CHUNK_ROWS):
+    """Feed monitoring output into an ApiStabilityTracker chunk by chunk"""
+    if tracker is None:
+        from api_stability_tracker import ApiStabilityTracker
+        tracker = ApiStabilityTracker()
+    for chunk in iter_monitoring_chunks(path, chunk_size):
+        tracker.add_logs(chunk)
+    return tracker
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python monitoring_ingest.py <monitoring.json>")
+        sys.exit(1)
+
+    counts = {}
+    for log in iter_monitoring_logs(sys.argv[1]):
+        stats = counts.setdefault(log['endpoint'], [0, 0])
+        stats[0] += 1
+        stats[1] += log['is_empty']
+    print(f"📊 {sum(c[0] for c in counts.values())} calls across {len(counts)} endpoint patterns")
+    for endpoint, (calls, empty) in sorted(counts.items(), key=lambda x: -x[1][1])[:20]:
+        print(f"  {calls:>6} calls  {empty:>5} empty  {endpoint}")
+
+if __name__ == "__main__":
+    main()
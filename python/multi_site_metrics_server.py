@@ -1,49 +1,197 @@
 #!/usr/bin/env python3
 
+import argparse
 import os
 import glob
+import json
+import socket
 import time
+from typing import List, Tuple
 from prometheus_client import start_http_server, REGISTRY
 from multi_site_processor import MultiSiteProcessor
+from anomaly_detector import DEFAULT_STATE_FILE
+from rule_engine import DEFAULT_STATE_FILE as RULE_STATE_FILE
+from profiling import start_sampling_if_requested
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 class MultiSiteMetricsServer:
-    def __init__(self, port=9879):
+    def __init__(self, port=9879, shard_dir=None, shard_id=None):
         self.port = port
         self.processor = MultiSiteProcessor()
         self.logs_dir = "../logs"
         self.processed_files = set()
+        # Sharded mode: attempts at a log that failed (it may still be being written);
+        # the site's watermark stays before it until it succeeds or runs out of attempts
+        self.max_attempts = max(1, int(os.getenv('APILENS_LOG_ATTEMPTS', '3')))
+        self._failed_attempts = {}
+        
+        # Sharded mode: several servers split the logs/<site> directories between them
+        self.shards = None
+        shard_dir = shard_dir or os.getenv('APILENS_SHARD_DIR')
+        if shard_dir:
+            from sharding import ShardCoordinator
+            if not os.path.isabs(shard_dir):
+                shard_dir = os.path.join(PROJECT_ROOT, shard_dir)
+            self.shards = ShardCoordinator(
+                shard_dir,
+                shard_id or os.getenv('APILENS_SHARD_ID') or f"{socket.gethostname()}:{port}",
+                ttl=float(os.getenv('APILENS_SHARD_TTL', '90'))
+            )
+            # Each shard keeps the anomaly baselines and rule streaks of its own sites
+            state_name = f"{self.shards.shard_id.replace(os.sep, '_')}.json"
+            self.processor.anomaly_state = self.shards.path('anomaly', state_name)
+            self.processor.rule_state = self.shards.path('rules', state_name)
     
     def scan_and_process_logs(self):
         """Scan for new log files and process them"""
+        new_files = 0
+        for site, log_file in self.pending_logs():
+            print(f"Processing new log: {site} - {os.path.basename(log_file)}")
+            if self.process_log(site, log_file):
+                new_files += 1
+        
+        if new_files > 0:
+            print(f"Processed {new_files} new log files")
+    
+    def pending_logs(self) -> List[Tuple[str, str]]:
+        """(site, log_file) for every log not processed yet, oldest first per site"""
         if not os.path.exists(self.logs_dir):
-            return
+            return []
+        if self.shards:
+            return self.pending_owned_logs()
         
-        # Find all log files
+        # Find all log files; the site is the parent directory
         pattern = os.path.join(self.logs_dir, "*", "*.json")
-        log_files = glob.glob(pattern)
+        return [(os.path.basename(os.path.dirname(log_file)), log_file)
+                for log_file in sorted(glob.glob(pattern)) if log_file not in self.processed_files]
+    
+    def pending_owned_logs(self) -> List[Tuple[str, str]]:
+        """Rebalance site ownership, then list new logs of the sites this shard holds"""
+        sites = sorted(name for name in os.listdir(self.logs_dir)
+                       if not name.startswith('.') and os.path.isdir(os.path.join(self.logs_dir, name)))
+        acquired, released = self.shards.rebalance(sites)
+        if released:
+            print(f"🔀 Sites handed over to another shard: {', '.join(sorted(released))}")
+            self.forget_sites(released)
+        for site in sorted(acquired):
+            print(f"🔀 Shard {self.shards.shard_id} took over site {site}")
+            self.adopt_baselines(site)
         
-        new_files = 0
-        for log_file in log_files:
-            if log_file not in self.processed_files:
-                try:
-                    # Extract site from path
-                    site = os.path.basename(os.path.dirname(log_file))
-                    
-                    print(f"Processing new log: {site} - {os.path.basename(log_file)}")
-                    self.processor.process_log_file(site, log_file)
-                    self.processed_files.add(log_file)
-                    new_files += 1
-                    
-                except Exception as e:
-                    print(f"Error processing {log_file}: {e}")
+        pending = []
+        for site in sorted(self.shards.owned):
+            # Runner logs are named by run timestamp, so names sort chronologically
+            watermark = self.shards.watermark(site) or ''
+            pending.extend((site, log_file) for log_file in sorted(glob.glob(os.path.join(self.logs_dir, site, "*.json")))
+                           if os.path.basename(log_file) > watermark)
+        return pending
+    
+    def process_log(self, site, log_file, loaded=None, error=None, export=True) -> bool:
+        """Process one log, or publish one already parsed by load_run (loaded) or that
+        failed to parse (error), and record it as done. Returns whether it succeeded.
+        In sharded mode a failed log is retried at the next scans, up to max_attempts in all."""
+        if self.shards and not self.shards.holds(site):
+            print(f"⚠️ Lost the claim on {site}; another shard continues it")
+            return False
+        name = os.path.basename(log_file)
+        if self.shards and any(failed[0] == site and failed[1] < name for failed in self._failed_attempts):
+            # An earlier log of the site is being retried; this one waits so the watermark stays before it
+            return False
+        if error is None:
+            try:
+                if loaded is None:
+                    self.processor.process_log_file(site, log_file, export=export)
+                else:
+                    self.processor.apply_run(site, log_file, *loaded, export=export)
+            except Exception as e:
+                error = e
+        if error is not None:
+            print(f"Error processing {log_file}: {error}")
         
-        if new_files > 0:
-            print(f"Processed {new_files} new log files")
+        if self.shards:
+            if error is not None:
+                attempts = self._failed_attempts.get((site, name), 0) + 1
+                if attempts < self.max_attempts:
+                    self._failed_attempts[(site, name)] = attempts
+                    return False
+                print(f"⚠️ Giving up on {log_file} after {attempts} attempts")
+            self._failed_attempts.pop((site, name), None)
+            if not self.shards.advance(site, name):
+                print(f"⚠️ Lost the claim on {site}; another shard continues it")
+        elif error is None:
+            self.processed_files.add(log_file)
+        return error is None
+    
+    def anomaly_detector(self):
+        return self.processor.alert_mgr.anomaly_detector
+    
+    def forget_sites(self, sites):
+        """Stop exporting the sites' series and drop their baselines and rule streaks from this shard's state"""
+        for site in sites:
+            self.processor.drop_site(site)
+        self._failed_attempts = {key: attempts for key, attempts in self._failed_attempts.items() if key[0] not in sites}
+        rule_engine = self.processor.alert_mgr.rule_engine
+        rule_engine.save()
+        rule_engine.import_state({}, replace_sites=sites)
+        detector = self.anomaly_detector()
+        if detector:
+            # Saved once more with the sites' baselines for the new owners to adopt;
+            # the next periodic save leaves them out
+            detector.save()
+            detector.import_state({}, replace_sites=sites)
     
+    def adopt_baselines(self, site):
+        """Continue a site's anomaly baselines (and rule streaks) from the shard that last saved them
+        (or, for a site no shard has held, from the unsharded state file)"""
+        self.adopt_rule_state(site)
+        detector = self.anomaly_detector()
+        if not detector:
+            return
+        others = [path for path in glob.glob(self.shards.path('anomaly', '*.json'))
+                  if os.path.abspath(path) != os.path.abspath(detector.state_path)]
+        unsharded = os.getenv('APILENS_ANOMALY_STATE', DEFAULT_STATE_FILE)
+        for path in sorted(others, key=os.path.getmtime, reverse=True) + [unsharded]:
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r') as f:
+                    series = json.load(f).get('series', {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable anomaly state {path}: {e}")
+                continue
+            site_series = {key: values for key, values in series.items() if key.split('\t', 1)[0] == site}
+            if site_series:
+                detector.import_state(site_series, replace_sites=[site])
+                return
+
+    def adopt_rule_state(self, site):
+        """Continue a site's rule streaks and notification times like its baselines (adopt_baselines)"""
+        rule_engine = self.processor.alert_mgr.rule_engine
+        others = [path for path in glob.glob(self.shards.path('rules', '*.json'))
+                  if os.path.abspath(path) != os.path.abspath(rule_engine.state_path)]
+        unsharded = os.getenv('APILENS_RULE_STATE', RULE_STATE_FILE)
+        for path in sorted(others, key=os.path.getmtime, reverse=True) + [unsharded]:
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r') as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable rule state {path}: {e}")
+                continue
+            site_state = {name: {key: value for key, value in state.get(name, {}).items()
+                                 if key.split('\t')[1:2] == [site]}
+                          for name in ('streaks', 'notified')}
+            if any(site_state.values()):
+                rule_engine.import_state(site_state, replace_sites=[site])
+                return
+
     def start_server(self):
         """Start Prometheus metrics server"""
         start_http_server(self.port)
         print(f"Multi-site metrics server started on http://localhost:{self.port}/metrics")
+        if self.shards:
+            print(f"Sharded mode: {self.shards.shard_id} (leases in {self.shards.lease_dir})")
         
         # Initial scan
         self.scan_and_process_logs()
@@ -56,7 +204,22 @@ class MultiSiteMetricsServer:
                 self.scan_and_process_logs()
         except KeyboardInterrupt:
             print("\nMulti-site metrics server stopped")
+        finally:
+            self.close()
+    
+    def close(self):
+        self.processor.close()
+        if self.shards:
+            # Hand the sites over now rather than after the lease ttl
+            self.shards.close()
 
 if __name__ == "__main__":
-    server = MultiSiteMetricsServer()
-    server.start_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Serve metrics for new runner logs')
+    parser.add_argument('--port', type=int, default=9879, help='Metrics port')
+    parser.add_argument('--shard-dir', help='Shared lease directory; enables sharding (default APILENS_SHARD_DIR)')
+    parser.add_argument('--shard-id', help='Name of this shard (default APILENS_SHARD_ID or host:port)')
+    # Takes --profile-sampling out of sys.argv before argparse sees it
+    start_sampling_if_requested('multi_site_metrics_server')
+    args = parser.parse_args()
+    server = MultiSiteMetricsServer(port=args.port, shard_dir=args.shard_dir, shard_id=args.shard_id)
+    server.start_server()
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 
+import glob
 import json
 import sys
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from itertools import islice
 from prometheus_client import Gauge, start_http_server, write_to_textfile
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from database_manager import DatabaseManager
+from storage_backends import StorageBackend, create_backend
 from alert_manager import AlertManager
+from write_behind import WriteBehindQueue
+from endpoint_stats import aggregate_results, score_endpoint_stats
+from pipeline_metrics import ingest_lag, observe_stage, record_ingest_lag, timed_stage
+from profiling import profile_if_requested
 
 class MultiSiteProcessor:
     def __init__(self):
@@ -17,74 +27,106 @@ class MultiSiteProcessor:
         self.health_score = Gauge('apilens_health_score', 'API health score 0-100', ['site', 'endpoint'])
         self.empty_responses = Gauge('apilens_empty_responses', 'Empty API responses', ['site', 'endpoint'])
         self.avg_latency = Gauge('apilens_avg_latency_ms', 'Average latency in ms', ['site', 'endpoint'])
+        self.anomaly_zscore = Gauge('apilens_anomaly_zscore', 'Deviation from the EWMA baseline in standard deviations', ['site', 'endpoint', 'metric'])
+        self.query_cache = Gauge('apilens_query_cache', 'Database query cache counters (hits, misses, evictions, invalidations, entries)', ['stat'])
+        # (site, endpoint) -> labelled children of the five endpoint gauges; labels() is
+        # a locked dict lookup per call, which adds up over a batch of thousands of runs
+        self._endpoint_gauges = {}
+        # (site, endpoint) -> metrics with a published z-score, so a site's series can be removed
+        self._anomaly_labels = {}
         
-        # Database and alerting
-        self.db = DatabaseManager()
-        self.alert_mgr = AlertManager()
+        # Database, alerting and the write-behind queue are created on first use,
+        # so a run connects (and runs schema DDL) only once it has parsed its input
+        self._backend = None
+        self._db = None
+        # The write-behind thread may be the first to connect
+        self._db_lock = threading.Lock()
+        self._alert_mgr = None
+        self._db_writer = None
+        # Database writes go through a background write-behind queue unless disabled,
+        # so a slow or unreachable database does not stall metric updates
+        self.write_behind = os.getenv('APILENS_DB_WRITE_BEHIND', '1') != '0'
+        # Anomaly baseline file (None: APILENS_ANOMALY_STATE); shards keep one each
+        self.anomaly_state = None
+        # Rule streak/notification file (None: APILENS_RULE_STATE); likewise one per shard
+        self.rule_state = None
+        
+        # Optional columnar history of every call, for long-range stability analysis
+        self.history = None
+        if os.getenv('APILENS_HISTORY_STORE'):
+            from history_store import HistoryStore
+            self.history = HistoryStore(os.getenv('APILENS_HISTORY_STORE'))
+    
+    @property
+    def backend(self) -> StorageBackend:
+        # Building the backend does not connect
+        if self._backend is None:
+            self._backend = create_backend()
+        return self._backend
+    
+    @property
+    def db(self) -> DatabaseManager:
+        with self._db_lock:
+            if self._db is None:
+                self._db = DatabaseManager(backend=self.backend)
+        return self._db
+    
+    @property
+    def alert_mgr(self) -> AlertManager:
+        if self._alert_mgr is None:
+            # One DatabaseManager (and connection) shared with the processor, opened on first DB use
+            self._alert_mgr = AlertManager(db=lambda: self.db, anomaly_state=self.anomaly_state,
+                                           rule_state=self.rule_state)
+        return self._alert_mgr
+    
+    @property
+    def db_writer(self) -> WriteBehindQueue:
+        if self._db_writer is None and self.write_behind:
+            # Connects from the writer thread, so runs are journaled even if the database is down at startup
+            self._db_writer = WriteBehindQueue(lambda: self.db, transient_errors=self.backend.transient_errors,
+                                               on_commit=self.check_alerts).start()
+        return self._db_writer
     
-    def process_log_file(self, site: str, log_file: str):
+    def process_log_file(self, site: str, log_file: str, export: bool = True):
         """Process a single log file and update metrics"""
         print(f"Processing {site} log: {log_file}")
+        return self.apply_run(site, log_file, *load_run(site, log_file), export=export)
+    
+    def apply_run(self, site: str, log_file: Optional[str], data: Dict, endpoint_stats: Dict[str, Dict],
+                  timings: Dict[str, Tuple[float, int]], export: bool = True, received: float = None):
+        """Publish a run prepared by load_run (possibly in a worker process): metrics, alerts,
+        history, the textfile export (unless export=False) and the database save.
         
-        with open(log_file, 'r') as f:
-            data = json.load(f)
-        
-        # Group results by endpoint
-        endpoint_stats = {}
-        for result in data['results']:
-            endpoint = result['endpoint']
-            if endpoint not in endpoint_stats:
-                endpoint_stats[endpoint] = {
-                    'calls': 0,
-                    'failures': 0,
-                    'empty': 0,
-                    'latencies': [],
-                    'success_rate': 0,
-                    'health_score': 0
-                }
-            
-            stats = endpoint_stats[endpoint]
-            stats['calls'] += 1
-            stats['latencies'].append(result['latency'])
-            
-            if not result['success']:
-                stats['failures'] += 1
-            
-            if result['isEmpty']:
-                stats['empty'] += 1
-        
-        # Calculate health scores and update metrics
-        for endpoint, stats in endpoint_stats.items():
-            # Calculate health score (0-100)
-            success_rate = (stats['calls'] - stats['failures']) / stats['calls']
-            empty_rate = stats['empty'] / stats['calls']
-            avg_latency = sum(stats['latencies']) / len(stats['latencies'])
-            
-            # Health score formula
-            health_score = 100
-            health_score -= (1 - success_rate) * 60  # Failures penalty
-            health_score -= empty_rate * 30          # Empty responses penalty
-            health_score -= min(avg_latency / 1000 * 10, 10)  # Latency penalty (max 10 points)
-            health_score = max(0, int(health_score))
-            
-            stats['health_score'] = health_score
-            stats['success_rate'] = success_rate
-            stats['avg_latency'] = avg_latency
-            
-            # Update Prometheus metrics
-            self.calls_total.labels(site=site, endpoint=endpoint).set(stats['calls'])
-            self.fails_total.labels(site=site, endpoint=endpoint).set(stats['failures'])
-            self.health_score.labels(site=site, endpoint=endpoint).set(health_score)
-            self.empty_responses.labels(site=site, endpoint=endpoint).set(stats['empty'])
-            self.avg_latency.labels(site=site, endpoint=endpoint).set(stats['avg_latency'])
+        Runs pushed over HTTP have no log_file; `received` (epoch seconds) then
+        stands in for the file's mtime in the ingest lag, and export must be False."""
+        for stage, (seconds, stage_records) in timings.items():
+            observe_stage(stage, seconds, stage_records)
+        run_start = time.perf_counter() - sum(seconds for seconds, _ in timings.values())
+        records = len(data['results'])
+        self.publish_endpoint_stats(site, endpoint_stats)
         
-        # Generate HTML report
-        self.generate_html_report(site, data, endpoint_stats, log_file)
+        # Append the raw calls to the history store (once per run, even if re-processed)
+        history_source = f"{site}:{data.get('runId', log_file)}"
+        if self.history and not self.history.has_source(history_source):
+            try:
+                with timed_stage('history', records):
+                    self.history.append(site, ({
+                        'endpoint': result['endpoint'],
+                        'timestamp': result.get('timestamp') or data.get('timestamp'),
+                        'status_code': result.get('statusCode', 200 if result['success'] else 500),
+                        'response_size': result.get('responseSize', 0),
+                        'latency': result['latency'],
+                        'is_empty': result['isEmpty']
+                    } for result in data['results']), source=history_source)
+            except Exception as e:
+                print(f"Failed to append to history store: {e}")
         
         # Export metrics to file for Prometheus scraping
-        metrics_file = log_file.replace('.json', '.prom')
-        from prometheus_client import REGISTRY
-        write_to_textfile(metrics_file, REGISTRY)
+        record_ingest_lag(site, log_file, since=received)
+        observe_stage('process', time.perf_counter() - run_start, records)
+        if export:
+            with timed_stage('textfile'):
+                self.export_metrics(log_file.replace('.json', '.prom'))
         
         # Save to database
         try:
@@ -95,26 +137,196 @@ class MultiSiteProcessor:
             
             # Make sure data has the required structure
             if isinstance(data, dict) and 'runId' in data and 'timestamp' in data and 'results' in data:
-                self.db.save_test_run(site, data)
-                print(f"Saved test run to database for {site}")
+                if self.db_writer:
+                    # Alerts are checked once the run has been committed
+                    self.db_writer.submit(site, data, endpoint_stats)
+                    print(f"Queued test run for database for {site}")
+                else:
+                    with timed_stage('db_save', records):
+                        self.db.save_test_run(site, data, endpoint_stats)
+                    print(f"Saved test run to database for {site}")
+                    self.check_alerts([site])
             else:
                 print(f"Cannot save to database: Invalid data format")
         except Exception as e:
             print(f"Failed to save to database: {e}")
         
-        # Check for alerts
+        print(f"Processed {len(endpoint_stats)} endpoints for {site}")
+        return endpoint_stats
+    
+    def publish_endpoint_stats(self, site: str, endpoint_stats: Dict[str, Dict]):
+        """Update gauges, evaluate alert rules and run anomaly detection for scored aggregates"""
+        with timed_stage('gauges', len(endpoint_stats)):
+            self.update_endpoint_gauges(site, endpoint_stats)
+        
+        # Streaming alert rules run on the aggregates above, without a DB query
         try:
-            self.alert_mgr.check_health_alerts(site, 70)
+            with timed_stage('alert_rules', len(endpoint_stats)):
+                self.alert_mgr.evaluate_rules(site, endpoint_stats)
         except Exception as e:
-            print(f"Failed to check alerts: {e}")
+            print(f"Failed to evaluate alert rules: {e}")
+        
+        # Online anomaly detection catches regressions before fixed thresholds do
+        try:
+            with timed_stage('anomaly_detection', len(endpoint_stats)):
+                anomalies = self.alert_mgr.detect_anomalies(site, endpoint_stats)
+            for endpoint, metric, zscore in anomalies['scores']:
+                self.anomaly_zscore.labels(site=site, endpoint=endpoint, metric=metric).set(zscore)
+                self._anomaly_labels.setdefault((site, endpoint), set()).add(metric)
+        except Exception as e:
+            print(f"Failed to run anomaly detection: {e}")
+    
+    def update_endpoint_gauges(self, site: str, endpoint_stats: Dict[str, Dict]):
+        """Set the per-endpoint gauges from scored aggregates"""
+        for endpoint, stats in endpoint_stats.items():
+            gauges = self._endpoint_gauges.get((site, endpoint))
+            if gauges is None:
+                gauges = self._endpoint_gauges[(site, endpoint)] = tuple(
+                    gauge.labels(site=site, endpoint=endpoint)
+                    for gauge in (self.calls_total, self.fails_total, self.health_score,
+                                  self.empty_responses, self.avg_latency))
+            calls, fails, health, empty, latency = gauges
+            calls.set(stats['calls'])
+            fails.set(stats['failures'])
+            health.set(stats['health_score'])
+            empty.set(stats['empty'])
+            latency.set(stats['avg_latency'])
+    
+    def drop_site(self, site: str):
+        """Remove every series published for a site (e.g. once another shard owns it)"""
+        for key in [key for key in self._endpoint_gauges if key[0] == site]:
+            del self._endpoint_gauges[key]
+            for gauge in (self.calls_total, self.fails_total, self.health_score,
+                          self.empty_responses, self.avg_latency):
+                gauge.remove(*key)
+        for key in [key for key in self._anomaly_labels if key[0] == site]:
+            for metric in self._anomaly_labels.pop(key):
+                self.anomaly_zscore.remove(*key, metric)
+        ingest_lag.remove(site)
+    
+    def export_metrics(self, metrics_file: str):
+        """Write all metrics to a textfile for Prometheus scraping"""
+        # No query cache to report if this run never touched the database
+        if self._db is not None:
+            for stat, value in self._db.cache_stats().items():
+                self.query_cache.labels(stat=stat).set(value)
+        from prometheus_client import REGISTRY
+        write_to_textfile(metrics_file, REGISTRY)
+    
+    def process_csv_file(self, site: str, csv_file: str, workers: int = None, export: bool = True):
+        """Process a captured-traffic CSV (URL, Method, StatusCode, ResponseTime, IsEmpty, Timestamp).
         
+        The file is streamed in chunks (across a process pool when workers > 1)
+        and grouped by URL pattern. Captures are not test runs, so nothing is
+        saved to the test_runs tables and no HTML report is written; metrics,
+        alert rules, anomaly detection and the history store are updated."""
+        from csv_ingest import aggregate_csv, iter_csv_records, to_tracker_log
+        print(f"Processing {site} CSV: {csv_file}")
+        
+        run_start = time.perf_counter()
+        with timed_stage('aggregate') as stage:
+            endpoint_stats = score_endpoint_stats(aggregate_csv(csv_file, workers=workers))
+            stage.records = sum(stats['calls'] for stats in endpoint_stats.values())
+        records = stage.records
+        self.publish_endpoint_stats(site, endpoint_stats)
+        
+        history_source = f"{site}:{os.path.basename(csv_file)}"
+        if self.history and not self.history.has_source(history_source):
+            try:
+                with timed_stage('history', records):
+                    self.history.append(site, (to_tracker_log(record) for record in iter_csv_records(csv_file)),
+                                        source=history_source)
+            except Exception as e:
+                print(f"Failed to append to history store: {e}")
+        
+        record_ingest_lag(site, csv_file)
+        observe_stage('process', time.perf_counter() - run_start, records)
+        if export:
+            with timed_stage('textfile'):
+                self.export_metrics(os.path.splitext(csv_file)[0] + '.prom')
         print(f"Processed {len(endpoint_stats)} endpoints for {site}")
         return endpoint_stats
     
-    def generate_html_report(self, site: str, data: Dict, stats: Dict, log_file: str):
+    def process_batch(self, runs: List[Tuple[str, str]], metrics_file: str, workers: int = None) -> Dict[str, int]:
+        """Process many (site, file) pairs in this process and export metrics once at the end.
+        
+        Parsing, aggregation and HTML rendering of run logs are spread over a
+        process pool when workers > 1 (default APILENS_BATCH_WORKERS, else 1);
+        results are applied here in input order, so per-site baselines see runs
+        in sequence. The database connection, write-behind queue and alert
+        state are shared by every run. CSV captures are processed after the run
+        logs. A file that fails is reported and skipped."""
+        workers = workers or int(os.getenv('APILENS_BATCH_WORKERS', '1'))
+        batch_start = time.perf_counter()
+        totals = {'runs': 0, 'failed': 0, 'records': 0}
+        
+        logs = [(site, path) for site, path in runs if not path.endswith('.csv')]
+        for (site, path), (prepared, error) in zip(logs, iter_loaded_runs(logs, workers)):
+            if error is not None:
+                print(f"❌ Failed to process {site} log {path}: {error}")
+                totals['failed'] += 1
+                continue
+            try:
+                self.apply_run(site, path, *prepared, export=False)
+                totals['runs'] += 1
+                totals['records'] += len(prepared[0]['results'])
+            except Exception as e:
+                print(f"❌ Failed to process {site} log {path}: {e}")
+                totals['failed'] += 1
+        
+        for site, path in runs:
+            if path.endswith('.csv'):
+                try:
+                    endpoint_stats = self.process_csv_file(site, path, export=False)
+                    totals['runs'] += 1
+                    totals['records'] += sum(stats['calls'] for stats in endpoint_stats.values())
+                except Exception as e:
+                    print(f"❌ Failed to process {site} CSV {path}: {e}")
+                    totals['failed'] += 1
+        
+        # One export with the latest state of every site
+        os.makedirs(os.path.dirname(os.path.abspath(metrics_file)), exist_ok=True)
+        with timed_stage('textfile'):
+            self.export_metrics(metrics_file)
+        
+        elapsed = time.perf_counter() - batch_start
+        sites = len({site for site, _ in runs})
+        print(f"✅ Batch processed {totals['runs']} files ({totals['failed']} failed) for {sites} sites, "
+              f"{totals['records']:,} records in {elapsed:.1f}s; metrics written to {metrics_file}")
+        return totals
+    
+    def check_alerts(self, sites: List[str]):
+        """Check health alerts for sites whose runs have reached the database"""
+        for site in sites:
+            try:
+                with timed_stage('alert_check'):
+                    self.alert_mgr.check_health_alerts(site, 70)
+            except Exception as e:
+                print(f"Failed to check alerts: {e}")
+    
+    def close(self):
+        """Flush pending database writes and alert notifications"""
+        if self._db_writer:
+            self._db_writer.stop()
+        if self.history:
+            self.history.close()
+        if self._alert_mgr:
+            self._alert_mgr.close()
+    
+    @classmethod
+    def generate_html_report(cls, site: str, data: Dict, stats: Dict, log_file: str):
         """Generate static HTML dashboard"""
         html_file = log_file.replace('.json', '.html')
+        html_content = cls.render_html_report(site, data, stats)
+        
+        with open(html_file, 'w', encoding='utf-8') as f:
+            f.write(html_content)
         
+        print(f"HTML report generated: {html_file}")
+    
+    @staticmethod
+    def render_html_report(site: str, data: Dict, stats: Dict) -> str:
+        """HTML dashboard for one run"""
         total_apis = len(data['results'])
         total_failures = sum(s['failures'] for s in stats.values())
         total_empty = sum(s['empty'] for s in stats.values())
@@ -220,15 +432,134 @@ class MultiSiteProcessor:
     </div>
 </body>
 </html>"""
-        
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        print(f"HTML report generated: {html_file}")
+        return html_content
+
+def load_run(site: str, log_file: str) -> Tuple[Dict, Dict[str, Dict], Dict[str, Tuple[float, int]]]:
+    """Parse, aggregate and write the HTML report for one run log.
+    
+    Module-level so batch mode can run it in worker processes. Stage timings
+    are returned as {stage: (seconds, records)} rather than observed, because
+    a worker's metrics never reach the parent's registry."""
+    timings = {}
+    start = time.perf_counter()
+    with open(log_file, 'r') as f:
+        data = json.load(f)
+    records = len(data.get('results', []))
+    timings['parse'] = (time.perf_counter() - start, records)
+    
+    # Group results by endpoint and calculate health scores
+    start = time.perf_counter()
+    endpoint_stats = score_endpoint_stats(aggregate_results(data['results']))
+    timings['aggregate'] = (time.perf_counter() - start, records)
+    
+    start = time.perf_counter()
+    MultiSiteProcessor.generate_html_report(site, data, endpoint_stats, log_file)
+    timings['html'] = (time.perf_counter() - start, records)
+    return data, endpoint_stats, timings
+
+def iter_loaded_runs(runs: List[Tuple[str, str]], workers: int = 1) -> Iterator[Tuple[Any, Optional[Exception]]]:
+    """(load_run result, None) or (None, error) for each (site, log_file), in input order.
+    
+    At most 2 x workers runs are in flight, so memory stays bounded however
+    many files a backfill covers."""
+    if workers <= 1:
+        for site, log_file in runs:
+            try:
+                yield load_run(site, log_file), None
+            except Exception as e:
+                yield None, e
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor
+    pending = deque()
+    remaining = iter(runs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for site, log_file in islice(remaining, workers * 2):
+            pending.append(pool.submit(load_run, site, log_file))
+        while pending:
+            future = pending.popleft()
+            for site, log_file in islice(remaining, 1):
+                pending.append(pool.submit(load_run, site, log_file))
+            try:
+                yield future.result(), None
+            except Exception as e:
+                yield None, e
+
+def resolve_batch_inputs(patterns: List[str] = (), manifest: str = None) -> List[Tuple[str, str]]:
+    """(site, file) pairs from SITE=GLOB / GLOB arguments and an optional manifest.
+    
+    A bare GLOB takes the site from each file's parent directory, matching the
+    runner's logs/<site>/<runId>.json layout. The manifest is JSON, either
+    {"site": "glob" or ["glob", ...]} or [{"site": ..., "file": ...}, ...];
+    its relative paths are resolved against the manifest's directory. Matches
+    are sorted per pattern, so each site's runs are applied oldest first."""
+    entries = []
+    for pattern in patterns:
+        site, sep, path = pattern.partition('=')
+        entries.append((site, path) if sep else (None, pattern))
+    
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r') as f:
+            spec = json.load(f)
+        if isinstance(spec, dict):
+            spec = [{'site': site, 'file': path} for site, paths in spec.items()
+                    for path in ([paths] if isinstance(paths, str) else paths)]
+        for entry in spec:
+            entries.append((entry.get('site'), os.path.join(base, entry['file'])))
+    
+    runs, seen = [], set()
+    for site, pattern in entries:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            print(f"⚠️ No files match {pattern}")
+        for path in matches:
+            pair = (site or os.path.basename(os.path.dirname(os.path.abspath(path))), path)
+            if pair not in seen:
+                seen.add(pair)
+                runs.append(pair)
+    return runs
+
+def default_batch_metrics_file() -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'multi_site.prom')
+
+def run_batch(argv: List[str]):
+    import argparse
+    parser = argparse.ArgumentParser(prog='multi_site_processor.py batch',
+                                     description='Process many run logs / CSV captures in one process')
+    parser.add_argument('inputs', nargs='*', metavar='SITE=GLOB|GLOB',
+                        help='Files to process; a bare GLOB takes the site from the parent directory')
+    parser.add_argument('--manifest', help='JSON manifest of site/file pairs')
+    parser.add_argument('--workers', type=int, help='Worker processes for parsing (default APILENS_BATCH_WORKERS or 1)')
+    parser.add_argument('--metrics-file', default=default_batch_metrics_file(),
+                        help='Combined Prometheus textfile (default logs/multi_site.prom)')
+    args = parser.parse_args(argv)
+    
+    runs = resolve_batch_inputs(args.inputs, args.manifest)
+    if not runs:
+        parser.error('no input files')
+    
+    processor = MultiSiteProcessor()
+    try:
+        totals = processor.process_batch(runs, args.metrics_file, workers=args.workers)
+    finally:
+        processor.close()
+    if totals['failed']:
+        sys.exit(1)
 
 def main():
+    with profile_if_requested('multi_site_processor'):
+        run_command()
+
+def run_command():
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        run_batch(sys.argv[2:])
+        return
+    
     if len(sys.argv) != 3:
-        print("Usage: python multi_site_processor.py <site> <log_file>")
+        print("Usage: python multi_site_processor.py <site> <log_file|capture.csv> [--profile[=DIR]]")
+        print("       python multi_site_processor.py batch [--manifest FILE] [--workers N] "
+              "[--metrics-file FILE] [SITE=GLOB | GLOB ...]")
         sys.exit(1)
     
     site = sys.argv[1]
@@ -239,7 +570,13 @@ def main():
         sys.exit(1)
     
     processor = MultiSiteProcessor()
-    processor.process_log_file(site, log_file)
+    try:
+        if log_file.endswith('.csv'):
+            processor.process_csv_file(site, log_file)
+        else:
+            processor.process_log_file(site, log_file)
+    finally:
+        processor.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
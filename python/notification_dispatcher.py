@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Background notification dispatcher for alerts.
+
+Alert messages are queued without blocking the processing loop, coalesced
+per site over a short window into one digest, rate limited per channel and
+delivered over long-lived connections (one SMTP session, one pooled HTTP
+session with timeouts).
+"""
+
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Dict, List, Optional
+
+class RateLimiter:
+    """Token bucket: `rate` sends per `per` seconds, bursting up to `burst`"""
+    def __init__(self, rate: float, per: float = 60.0, burst: int = None):
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.refill_per_second = rate / per if per > 0 else float('inf')
+        self.updated = time.monotonic()
+
+    def available(self) -> bool:
+        """Whether a send is allowed right now, without consuming a token"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+        return self.tokens >= 1
+
+    def try_acquire(self) -> bool:
+        if self.available():
+            self.tokens -= 1
+            return True
+        return False
+
+class EmailChannel:
+    """SMTP delivery over a single connection that is reused between alerts"""
+    name = 'email'
+
+    def __init__(self, host: str, port: int, username: str, password: str, recipient: str,
+                 starttls: bool = True, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.recipient = recipient
+        self.starttls = starttls
+        self.timeout = timeout
+        self._server = None
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.connections_opened += 1
+        return server
+
+    def _connection(self):
+        if self._server is not None:
+            try:
+                # Cheap liveness check; servers drop idle sessions
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._server = None
+        self._server = self._connect()
+        return self._server
+
+    def send(self, site: str, message: str):
+        msg = MIMEMultipart()
+        msg['From'] = self.username or 'apilens@localhost'
+        msg['To'] = self.recipient
+        msg['Subject'] = f'API Lens Alert - {site}'
+        msg.attach(MIMEText(message, 'plain'))
+
+        with self._lock:
+            try:
+                self._connection().send_message(msg)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                # Connection went stale between the check and the send: retry once
+                self._server = None
+                self._connection().send_message(msg)
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._server = None
+
+class SlackChannel:
+    """Slack webhook delivery through a pooled session with timeouts"""
+    name = 'slack'
+
+    def __init__(self, webhook_url: str, timeout: float = 5.0, session=None):
+        # requests is only imported when a Slack webhook is configured
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.webhook_url = webhook_url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=1))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=1))
+
+    def send(self, site: str, message: str):
+        payload = {
+            'text': f'API Lens Alert',
+            'attachments': [{
+                'color': 'danger',
+                'fields': [{
+                    'title': f'Site: {site}',
+                    'value': message,
+                    'short': False
+                }]
+            }]
+        }
+        response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"Slack webhook returned {response.status_code}")
+
+    def close(self):
+        self.session.close()
+
+class NotificationDispatcher:
+    def __init__(self, channels: List, coalesce_window: float = 60.0, rate_per_minute: float = 10,
+                 max_queue: int = 10000, max_digest_lines: int = 50):
+        self.channels = channels
+        self.coalesce_window = coalesce_window
+        self.max_digest_lines = max_digest_lines
+        self.limiters = {channel.name: RateLimiter(rate_per_minute) for channel in channels}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}  # site -> {'first': monotonic time, 'messages': [...]}
+        self._stop = threading.Event()
+        self._flush_now = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.stats = {'queued': 0, 'dropped': 0, 'sent': 0, 'failed': 0, 'rate_limited': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='apilens-notify', daemon=True)
+                self._thread.start()
+        return self
+
+    def notify(self, site: str, message: str) -> bool:
+        """Queue a message; never blocks. Returns False if the queue is full."""
+        if not self.channels:
+            return False
+        self.start()
+        try:
+            self._queue.put_nowait((site, message))
+            self.stats['queued'] += 1
+            return True
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+
+    def flush(self, timeout: float = 10.0):
+        """Deliver everything queued or pending now, ignoring the coalescing window"""
+        if self._thread is None:
+            return
+        self._flush_now.set()
+        deadline = time.monotonic() + timeout
+        while (self._queue.unfinished_tasks or self._pending) and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def close(self, timeout: float = 10.0):
+        """Flush and release channel connections"""
+        self.flush(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        for channel in self.channels:
+            try:
+                channel.close()
+            except Exception as e:
+                print(f"Failed to close {channel.name} channel: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._collect(timeout=0.2)
+            force = self._flush_now.is_set() and self._queue.empty()
+            self._deliver_due(force)
+            if force and not self._pending:
+                self._flush_now.clear()
+
+    def _collect(self, timeout: float, limit: int = 1000):
+        """Move queued messages into per-site pending digests"""
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        for collected in range(1, limit + 1):
+            site, message = item
+            self._pending.setdefault(site, {'first': time.monotonic(), 'messages': []})['messages'].append(message)
+            self._queue.task_done()
+            if collected == limit:
+                # Alert storm: go deliver what is due before reading more
+                return
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _deliver_due(self, force: bool = False):
+        now = time.monotonic()
+        for site in list(self._pending):
+            entry = self._pending[site]
+            if not force and now - entry['first'] < self.coalesce_window:
+                continue
+            digest = self._digest(site, entry['messages'])
+            if self._deliver(site, digest, force):
+                del self._pending[site]
+
+    def _digest(self, site: str, messages: List[str]) -> str:
+        if len(messages) == 1:
+            return messages[0]
+        lines = messages[:self.max_digest_lines]
+        if len(messages) > self.max_digest_lines:
+            lines.append(f"... and {len(messages) - self.max_digest_lines} more")
+        return f"{len(messages)} alert notifications for {site}:\n\n" + "\n\n".join(lines)
+
+    def _deliver(self, site: str, digest: str, force: bool) -> bool:
+        """Send to every channel; returns False to keep the digest pending (rate limited)"""
+        limited = [c for c in self.channels if not self.limiters[c.name].available()]
+        if limited and not force:
+            # Keep coalescing until the channel has budget again
+            self.stats['rate_limited'] += 1
+            return False
+        for channel in self.channels:
+            if channel not in limited:
+                self.limiters[channel.name].try_acquire()
+
+        for channel in self.channels:
+            if channel in limited:
+                print(f"Dropping {channel.name} alert for {site}: rate limit exceeded")
+                continue
+            try:
+                channel.send(site, digest)
+                self.stats['sent'] += 1
+                print(f"{channel.name.capitalize()} alert sent for {site}")
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"Failed to send {channel.name} alert: {e}")
+        return True
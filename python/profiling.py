@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Built-in profiling for the command-line entry points and servers.
+
+--profile[=DIR]
+    Run the command under cProfile and tracemalloc. On exit a .pstats file
+    (for snakeviz, `python -m pstats`, ...) and a text report with wall/CPU
+    time, peak traced memory, the slowest functions and the top allocation
+    sites are written to DIR (default APILENS_PROFILE_DIR or logs/profiles).
+
+--profile-sampling (or APILENS_PROFILE_SAMPLING=1)
+    For long-running servers: a background thread samples every thread's
+    stack (APILENS_PROFILE_INTERVAL, default 10ms). Sending SIGUSR1 dumps
+    the samples collected since the previous dump as collapsed stacks
+    (flamegraph.pl / speedscope input) plus a text summary:
+
+        kill -USR1 <pid>
+"""
+
+import io
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from typing import List, Optional
+
+PROFILE_FLAG = '--profile'
+SAMPLING_FLAG = '--profile-sampling'
+
+def default_profile_dir() -> str:
+    path = os.getenv('APILENS_PROFILE_DIR', os.path.join('logs', 'profiles'))
+    if not os.path.isabs(path):
+        # Relative paths are resolved against the project root, like the .env file
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return path
+
+def pop_flag(flag: str, argv: List[str] = None) -> Optional[str]:
+    """Remove `flag` / `flag=VALUE` from argv; returns VALUE, '' for a bare flag, or None"""
+    argv = sys.argv if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg == flag:
+            del argv[i]
+            return ''
+        if arg.startswith(flag + '='):
+            del argv[i]
+            return arg[len(flag) + 1:]
+    return None
+
+def _output_path(output_dir: str, label: str, suffix: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(output_dir, f"{label}-{stamp}-{os.getpid()}{suffix}")
+
+class RunProfiler:
+    """cProfile + tracemalloc for the duration of a `with` block"""
+
+    def __init__(self, label: str, output_dir: str = None, top: int = 30, trace_frames: int = 10):
+        self.label = label
+        self.output_dir = output_dir or default_profile_dir()
+        self.top = top
+        self.trace_frames = trace_frames
+        self.stats_path = None
+        self.report_path = None
+
+    def __enter__(self):
+        # Profiler modules are imported here: every entry point imports this module at startup
+        import cProfile
+        import tracemalloc
+        self._tracing = not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start(self.trace_frames)
+        self._profile = cProfile.Profile()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        import tracemalloc
+        self._profile.disable()
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._tracing:
+            tracemalloc.stop()
+
+        self.stats_path = _output_path(self.output_dir, self.label, '.pstats')
+        self._profile.dump_stats(self.stats_path)
+        self.report_path = self.stats_path[:-len('.pstats')] + '.txt'
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            f.write(self._report(wall, cpu, current, peak, snapshot))
+        print(f"🔬 Profile written to {self.report_path} (pstats: {self.stats_path})")
+        return False
+
+    def _report(self, wall: float, cpu: float, current: int, peak: int, snapshot) -> str:
+        import pstats
+        import tracemalloc
+        out = io.StringIO()
+        out.write(f"Profile: {self.label} ({' '.join(sys.argv)})\n")
+        out.write(f"Wall time: {wall:.3f}s  CPU time: {cpu:.3f}s\n")
+        out.write(f"Traced memory: {current / 1e6:.1f} MB at exit, {peak / 1e6:.1f} MB peak\n\n")
+
+        out.write(f"Top {self.top} functions by cumulative time\n")
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(self.top)
+
+        out.write(f"Top {self.top} allocation sites\n")
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        for stat in snapshot.statistics('lineno')[:self.top]:
+            frame = stat.traceback[0]
+            out.write(f"  {stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
+
+def profile_if_requested(label: str, argv: List[str] = None):
+    """RunProfiler if --profile[=DIR] was passed (the flag is removed from argv), else a no-op"""
+    output_dir = pop_flag(PROFILE_FLAG, argv)
+    if output_dir is None:
+        return nullcontext()
+    return RunProfiler(label, output_dir or None)
+
+class SamplingProfiler:
+    """Periodically records the stack of every thread; cheap enough to leave running"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._stacks = Counter()
+        self._samples = 0
+        self._since = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='apilens-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+
+    def take(self):
+        """(stack counts, samples, seconds) since the previous take"""
+        with self._lock:
+            stacks, samples, since = self._stacks, self._samples, self._since
+            self._stacks, self._samples, self._since = Counter(), 0, time.time()
+        return stacks, samples, time.time() - since
+
+    def dump(self, label: str, output_dir: str = None, top: int = 30) -> str:
+        """Write collapsed stacks and a summary; returns the summary path"""
+        stacks, samples, seconds = self.take()
+        output_dir = output_dir or default_profile_dir()
+        collapsed_path = _output_path(output_dir, label, '.collapsed')
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        own_time, total_time = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own_time[frames[-1]] += count
+            for frame in set(frames):
+                total_time[frame] += count
+        total = sum(stacks.values()) or 1
+
+        summary_path = collapsed_path[:-len('.collapsed')] + '-sampling.txt'
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(f"Sampling profile: {label}, {samples} samples over {seconds:.1f}s "
+                    f"every {self.interval * 1000:.0f}ms\n\n")
+            f.write(f"Top {top} frames by own samples\n")
+            for frame, count in own_time.most_common(top):
+                f.write(f"  {count / total:6.1%}  {frame}\n")
+            f.write(f"\nTop {top} frames by inclusive samples\n")
+            for frame, count in total_time.most_common(top):
+                f.write(f"  {count / total:6.1%}  {frame}\n")
+        print(f"🔬 Sampling profile written to {summary_path} (stacks: {collapsed_path})")
+        return summary_path
+
+def start_sampling_if_requested(label: str, argv: List[str] = None) -> Optional[SamplingProfiler]:
+    """Start the sampler and install the SIGUSR1 dump handler when requested"""
+    requested = pop_flag(SAMPLING_FLAG, argv) is not None
+    if not requested and os.getenv('APILENS_PROFILE_SAMPLING', '0') != '1':
+        return None
+    if not hasattr(signal, 'SIGUSR1'):
+        print("⚠️ Sampling profiler needs SIGUSR1, which this platform does not support")
+        return None
+
+    profiler = SamplingProfiler(float(os.getenv('APILENS_PROFILE_INTERVAL', '0.01'))).start()
+
+    def dump(signum, frame):
+        try:
+            profiler.dump(label)
+        except OSError as e:
+            print(f"⚠️ Failed to write sampling profile: {e}")
+
+    signal.signal(signal.SIGUSR1, dump)
+    print(f"🔬 Sampling profiler running; send SIGUSR1 to dump (kill -USR1 {os.getpid()})")
+    return profiler
@@ -46,6 +46,21 @@ class PrometheusServer:
         
         print(f"📊 Updated metrics for {len(grouped_apis)} endpoint groups")
     
+    def update_from_summary(self, summary: Dict[str, Any]):
+        """Update Prometheus metrics from a run summary (ComparisonEngine.summarize)"""
+        for group, stats in summary['groups'].items():
+            avg_latency = stats['latency_sum'] / stats['count'] if stats['count'] else 0
+            self.api_failures.labels(endpoint_group=group).set(stats['failures'])
+            self.api_empty_responses.labels(endpoint_group=group).set(stats['empty'])
+            self.api_latency.labels(endpoint_group=group).set(avg_latency / 1000)  # Convert to seconds
+            self.api_requests.labels(endpoint_group=group).set(stats['count'])
+        
+        self.total_apis.set(summary['total'])
+        self.total_failures.set(summary['failures'])
+        self.last_update.set(time.time())
+        
+        print(f"📊 Updated metrics for {len(summary['groups'])} endpoint groups")
+    
     def start_server(self):
         """Start the Prometheus metrics server"""
         start_http_server(self.port)
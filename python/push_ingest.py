@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Push-based ingest of runner results over HTTP.
+
+Runners that can POST send a run straight to the metrics daemon instead of
+writing logs/<site>/<runId>.json and waiting for the next scan:
+
+    POST /ingest/<site>
+    Content-Type: application/json      {"runId", "timestamp", "results": [...]}
+    Content-Type: application/x-ndjson  one result per line (runId/timestamp as query parameters)
+    Content-Encoding: gzip              optional
+
+Results use the runner's shape ({endpoint, method, statusCode, latency,
+responseSize, isEmpty, success, timestamp}); endpoint, latency and success
+are required and the rest default as the runner would. Responses are JSON:
+202 once the run is queued, 400/413/415 for bad payloads and 429 (with
+Retry-After) while the daemon's queue is full. GET /healthz reports the
+queue depth.
+
+The HTTP/1.1 server is a small asyncio implementation (keep-alive, chunked
+bodies, Expect: 100-continue), so a full queue is refused before the body
+is sent.
+"""
+
+import asyncio
+import json
+import math
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+from endpoint_stats import aggregate_results, score_endpoint_stats
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+JSON_TYPES = {'', 'application/json', 'text/json'}
+NDJSON_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines'}
+MAX_REPORTED_ERRORS = 5
+REASONS = {100: 'Continue', 200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+           415: 'Unsupported Media Type', 421: 'Misdirected Request', 429: 'Too Many Requests',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+class IngestError(ValueError):
+    """A rejected payload, with the HTTP status to answer"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+def valid_site(site: str) -> bool:
+    """Site names become directory and file names, so keep them to one plain path segment"""
+    return bool(site) and not site.startswith('.') and all(c.isalnum() or c in '-_.' for c in site)
+
+def default_run_id() -> str:
+    """A run id like the runner's (ISO timestamp with ':' and '.' replaced by '-')"""
+    now = datetime.now(timezone.utc)
+    return now.strftime('%Y-%m-%dT%H-%M-%S-') + f"{now.microsecond // 1000:03d}Z"
+
+def decode_body(body: bytes, content_encoding: str = '', max_bytes: int = DEFAULT_MAX_BYTES) -> bytes:
+    """Undo Content-Encoding; gzip output is capped at max_bytes"""
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return body
+    if encoding not in ('gzip', 'x-gzip'):
+        raise IngestError(415, f"Unsupported Content-Encoding {content_encoding!r} (expected gzip)")
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_bytes + 1)
+    except zlib.error as e:
+        raise IngestError(400, f"Invalid gzip body: {e}")
+    if len(data) > max_bytes or decompressor.unconsumed_tail:
+        raise IngestError(413, f"Decompressed body exceeds {max_bytes} bytes")
+    if not decompressor.eof:
+        raise IngestError(400, "Truncated gzip body")
+    return data
+
+def parse_run(body: bytes, content_type: str = '', params: Dict[str, str] = None) -> Dict:
+    """A run dict from a JSON run object or NDJSON results"""
+    params = params or {}
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    ndjson = media_type in NDJSON_TYPES
+    if not ndjson and media_type not in JSON_TYPES:
+        raise IngestError(415, f"Unsupported Content-Type {content_type!r} (expected application/json or application/x-ndjson)")
+    try:
+        text = body.decode('utf-8-sig')
+        if ndjson:
+            run = {'results': [json.loads(line) for line in text.splitlines() if line.strip()]}
+        else:
+            run = json.loads(text)
+    except ValueError as e:
+        raise IngestError(400, f"Invalid {'NDJSON' if ndjson else 'JSON'} body: {e}")
+    if not isinstance(run, dict):
+        raise IngestError(400, "Expected a JSON object with a results list")
+    for field in ('runId', 'timestamp'):
+        if field not in run and params.get(field):
+            run[field] = params[field]
+    return run
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_run(run: Dict) -> Dict:
+    """Check a run and fill in what the runner would have set. Raises IngestError(400)."""
+    results = run.get('results')
+    if not isinstance(results, list) or not results:
+        raise IngestError(400, "results must be a non-empty list")
+    run_id = run.get('runId') or default_run_id()
+    timestamp = run.get('timestamp') or datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    if not isinstance(run_id, str) or not isinstance(timestamp, str):
+        raise IngestError(400, "runId and timestamp must be strings")
+    try:
+        datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        raise IngestError(400, f"timestamp {timestamp!r} is not an ISO 8601 time")
+
+    errors = []
+    normalized = []
+    for i, result in enumerate(results):
+        if not isinstance(result, dict):
+            errors.append(f"results[{i}]: expected an object")
+            continue
+        problems = []
+        if not isinstance(result.get('endpoint'), str) or not result.get('endpoint'):
+            problems.append('endpoint must be a non-empty string')
+        if not _is_number(result.get('latency')) or not math.isfinite(result['latency']) or result['latency'] < 0:
+            problems.append('latency must be a non-negative number')
+        if not isinstance(result.get('success'), bool):
+            problems.append('success must be true or false')
+        for field in ('statusCode', 'responseSize'):
+            if field in result and not _is_number(result[field]):
+                problems.append(f'{field} must be a number')
+        if 'isEmpty' in result and not isinstance(result['isEmpty'], bool):
+            problems.append('isEmpty must be true or false')
+        if problems:
+            errors.append(f"results[{i}]: {'; '.join(problems)}")
+            continue
+        normalized.append({
+            **result,
+            'method': result.get('method') or 'GET',
+            'statusCode': int(result.get('statusCode', 200 if result['success'] else 500)),
+            'responseSize': result.get('responseSize', 0),
+            'isEmpty': result.get('isEmpty', False),
+            'timestamp': result.get('timestamp') or timestamp,
+        })
+    if errors:
+        more = f" (and {len(errors) - MAX_REPORTED_ERRORS} more)" if len(errors) > MAX_REPORTED_ERRORS else ''
+        raise IngestError(400, "Invalid results: " + ', '.join(errors[:MAX_REPORTED_ERRORS]) + more)
+    return {**run, 'runId': run_id, 'timestamp': timestamp, 'results': normalized}
+
+def prepare_pushed_run(site: str, body: bytes, content_type: str = '', content_encoding: str = '',
+                       params: Dict[str, str] = None, max_bytes: int = DEFAULT_MAX_BYTES
+                       ) -> Tuple[Dict, Dict[str, Dict], Dict[str, Tuple[float, int]]]:
+    """Decode, validate and aggregate a pushed run: load_run's result, from memory.
+
+    Module-level so the daemon can run it in its parse worker processes."""
+    timings = {}
+    start = time.perf_counter()
+    data = validate_run(parse_run(decode_body(body, content_encoding, max_bytes), content_type, params))
+    records = len(data['results'])
+    timings['parse'] = (time.perf_counter() - start, records)
+
+    start = time.perf_counter()
+    endpoint_stats = score_endpoint_stats(aggregate_results(data['results']))
+    timings['aggregate'] = (time.perf_counter() - start, records)
+    return data, endpoint_stats, timings
+
+# handler(site, body, headers, params) -> (status, response dict)
+IngestHandler = Callable[[str, bytes, Dict[str, str], Dict[str, str]], Awaitable[Tuple[int, Dict]]]
+# admit(site) -> None, or (status, response dict) to refuse before the body is read
+AdmitCheck = Callable[[str], Optional[Tuple[int, Dict]]]
+
+class IngestServer:
+    """Minimal asyncio HTTP/1.1 front end for /ingest/<site> and /healthz"""
+
+    def __init__(self, handler: IngestHandler, admit: AdmitCheck = None, health: Callable[[], Dict] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, idle_timeout: float = 60.0):
+        self.handler = handler
+        self.admit = admit
+        self.health = health
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self._server = None
+
+    async def start(self, host: str = '0.0.0.0', port: int = 9878):
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        return self
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                keep_alive = await self._serve_request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_request(self, request_line: bytes, reader, writer) -> bool:
+        """Answer one request; returns whether the connection can be reused"""
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            self._respond(writer, 400, {'error': 'Malformed request line'}, keep_alive=False)
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = (headers.get('connection', '').lower() != 'close'
+                      and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        if parts == ['healthz']:
+            self._respond(writer, 200, self.health() if self.health else {'status': 'ok'}, keep_alive)
+            return keep_alive
+        if parts[0] != 'ingest' or len(parts) > 2:
+            return self._refuse(writer, headers, 404, {'error': f"No route for {url.path}"}, keep_alive)
+        if method != 'POST':
+            return self._refuse(writer, headers, 405, {'error': 'Use POST'}, keep_alive)
+        site = parts[1] if len(parts) == 2 else params.get('site')
+        if not site or not valid_site(site):
+            return self._refuse(writer, headers, 400, {'error': f"Invalid or missing site {site!r}"}, keep_alive)
+
+        chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        if not chunked and 'content-length' not in headers:
+            return self._refuse(writer, headers, 411, {'error': 'Content-Length or chunked body required'}, keep_alive)
+        length = int(headers.get('content-length') or 0)
+        if length > self.max_bytes:
+            self._respond(writer, 413, {'error': f"Body exceeds {self.max_bytes} bytes"}, keep_alive=False)
+            return False
+        refusal = self.admit(site) if self.admit else None
+        if refusal:
+            return self._refuse(writer, headers, *refusal, keep_alive)
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+        body = await (self._read_chunked(reader) if chunked else reader.readexactly(length))
+        if body is None:
+            self._respond(writer, 413, {'error': f"Body exceeds {self.max_bytes} bytes"}, keep_alive=False)
+            return False
+        status, response = await self.handler(site, body, headers, params)
+        self._respond(writer, status, response, keep_alive)
+        return keep_alive
+
+    def _refuse(self, writer, headers: Dict[str, str], status: int, response: Dict, keep_alive: bool) -> bool:
+        """Answer without reading the body; the connection is only reusable if none was announced"""
+        has_body = int(headers.get('content-length') or 0) > 0 or 'transfer-encoding' in headers
+        keep_alive = keep_alive and not has_body
+        self._respond(writer, status, response, keep_alive)
+        return keep_alive
+
+    async def _read_chunked(self, reader) -> Optional[bytes]:
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+            if size == 0:
+                # Trailers, up to the blank line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return bytes(body)
+            if len(body) + size > self.max_bytes:
+                return None
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    def _respond(self, writer, status: int, response: Dict, keep_alive: bool):
+        payload = json.dumps(response).encode('utf-8')
+        headers = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+                   'Content-Type: application/json',
+                   f"Content-Length: {len(payload)}",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status in (429, 503) and 'retry_after' in response:
+            headers.append(f"Retry-After: {int(response['retry_after'])}")
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload)
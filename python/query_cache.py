@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Read-through cache for dashboard/history queries.
+
+Entries are keyed by a tuple whose first element is the site name, expire
+after a TTL, and are evicted least-recently-used once the cache is full.
+Writers call invalidate(site) after committing so readers never see data
+older than the last saved run for that site.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class QueryCache:
+    def __init__(self, ttl: float = 60.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}         # site -> write generation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key: Tuple[Hashable, ...], loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, calling loader on a miss"""
+        site = key[0]
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            generation = self._generations.get(site, 0)
+
+        value = loader()
+
+        with self._lock:
+            # A write committed while we were querying: the result may already be stale
+            if self._generations.get(site, 0) == generation and self.ttl > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, site: str):
+        """Drop every entry for a site; call after its writes commit"""
+        with self._lock:
+            self._generations[site] = self._generations.get(site, 0) + 1
+            stale = [key for key in self._entries if key[0] == site]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries)
+            }
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Replay archived run logs to rebuild derived state.
+
+Every site's runs under logs/<site>/ are streamed oldest first (runner log
+names are the ISO run timestamp) through the same stages as live processing:
+aggregation and health scoring, alert rule evaluation, anomaly baselines and
+the 7/14-day stability windows. Notifications are never sent; alert changes
+are only counted. Sites are independent, so they are replayed in parallel
+worker processes.
+
+Each site checkpoints its state (baselines, rule streaks, stability counts,
+last replayed file) every --checkpoint-every runs; --resume continues from
+there instead of starting over. At the end the anomaly state file, a
+stability summary and a metrics textfile are written, and with --rescore-db
+the stored health scores of every replayed run are rewritten (e.g. after a
+scoring formula change).
+
+Usage:
+    python replay.py [--logs-dir ../logs] [--sites a,b] [--workers N] [--resume] [--rescore-db]
+                     [--checkpoint-dir DIR] [--checkpoint-every 500] [--as-of ISO]
+                     [--anomaly-state FILE] [--stability-file FILE] [--metrics-file FILE]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from anomaly_detector import AnomalyDetector
+from endpoint_stats import aggregate_results, score_endpoint_stats
+from history_store import to_epoch_ms
+from rule_engine import RuleEngine
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DAY_MS = 86400 * 1000
+
+DEFAULT_CHECKPOINT_EVERY = 500
+
+# Endpoint aggregates kept from each site's latest run, for the exported gauges
+GAUGE_FIELDS = ('calls', 'failures', 'empty', 'health_score', 'avg_latency')
+
+ALERT_EVENTS = ('opened', 'repeated', 'resolved')
+
+def _project_path(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+def discover_runs(logs_dir: str, sites: List[str] = None) -> Dict[str, List[str]]:
+    """site -> run log paths, oldest first"""
+    runs = {}
+    for site in sorted(os.listdir(logs_dir)):
+        site_dir = os.path.join(logs_dir, site)
+        if site.startswith('.') or not os.path.isdir(site_dir) or (sites and site not in sites):
+            continue
+        paths = sorted(glob.glob(os.path.join(site_dir, '*.json')))
+        if paths:
+            runs[site] = paths
+    return runs
+
+class SiteReplay:
+    """Replay state of one site; round-trips through a JSON checkpoint"""
+
+    def __init__(self, site: str, as_of_ms: int):
+        self.site = site
+        self.as_of_ms = as_of_ms
+        self.current_start = as_of_ms - 7 * DAY_MS
+        self.previous_start = as_of_ms - 14 * DAY_MS
+        # No state file: baselines live in the checkpoint until the replay is merged
+        self.detector = AnomalyDetector(
+            alpha=float(os.getenv('ANOMALY_EWMA_ALPHA', '0.2')),
+            z_threshold=float(os.getenv('ANOMALY_Z_THRESHOLD', '3.0')),
+            state_path='', save_every=0)
+        self.rules = RuleEngine(renotify_seconds=int(os.getenv('ALERT_COOLDOWN_MINUTES', '30')) * 60)
+        # endpoint -> [total, failures, empty, prev_total, prev_failures, prev_empty]
+        self.counts = {}
+        self.alerts = dict.fromkeys(ALERT_EVENTS, 0)
+        self.latest = {}
+        self.scores = []
+        self.last_file = None
+        self.runs = 0
+        self.records = 0
+        self.failed = 0
+
+    def apply(self, data: Dict[str, Any], endpoint_stats: Dict[str, Dict]):
+        """Feed one scored run through the rule, anomaly and stability stages"""
+        run_ms = to_epoch_ms(data['timestamp'])
+        # Renotify intervals follow the archived timeline, not the replay's wall clock
+        events = self.rules.evaluate(self.site, endpoint_stats, now=run_ms / 1000)
+        anomalies = self.detector.observe_run(self.site, endpoint_stats)
+        for kind in ALERT_EVENTS:
+            self.alerts[kind] += len(events[kind]) + len(anomalies[kind])
+        self.scores = anomalies['scores']
+        self.latest = {endpoint: {field: stats[field] for field in GAUGE_FIELDS}
+                       for endpoint, stats in endpoint_stats.items()}
+
+        # Runs well before the stability windows cannot reach them; skip parsing their call timestamps
+        if run_ms >= self.previous_start - DAY_MS:
+            for result in data['results']:
+                ts = to_epoch_ms(result.get('timestamp') or data['timestamp'])
+                if ts < self.previous_start:
+                    continue
+                counts = self.counts.get(result['endpoint'])
+                if counts is None:
+                    counts = self.counts[result['endpoint']] = [0, 0, 0, 0, 0, 0]
+                offset = 0 if ts >= self.current_start else 3
+                counts[offset] += 1
+                if result.get('statusCode', 200 if result['success'] else 500) >= 500:
+                    counts[offset + 1] += 1
+                if result.get('responseSize', 0) == 0:
+                    counts[offset + 2] += 1
+
+        self.runs += 1
+        self.records += len(data['results'])
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        return {
+            'version': 1, 'site': self.site, 'as_of_ms': self.as_of_ms, 'last_file': self.last_file,
+            'runs': self.runs, 'records': self.records, 'failed': self.failed, 'alerts': self.alerts,
+            'anomaly': self.detector.export_state(), 'rules': self.rules.export_state(),
+            'stability': self.counts, 'latest': self.latest, 'scores': self.scores,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, state: Dict[str, Any]) -> 'SiteReplay':
+        replay = cls(state['site'], state['as_of_ms'])
+        replay.detector.import_state(state['anomaly'])
+        replay.rules.import_state(state['rules'])
+        replay.counts = state['stability']
+        replay.alerts = state['alerts']
+        replay.latest = state['latest']
+        replay.scores = [tuple(score) for score in state['scores']]
+        replay.last_file = state['last_file']
+        replay.runs, replay.records, replay.failed = state['runs'], state['records'], state['failed']
+        return replay
+
+    def firing(self) -> int:
+        """Rule and anomaly alerts still open at the end of the replay"""
+        return (len(self.rules.export_state()['notified'])
+                + sum(1 for values in self.detector.export_state().values() if values[4]))
+
+def _write_json(path: str, value: Any):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+def replay_site(site: str, paths: List[str], as_of_ms: int, checkpoint_dir: str,
+                checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY, resume: bool = False,
+                rescore_db: bool = False) -> Dict[str, Any]:
+    """Replay one site's runs (oldest first); returns the final checkpoint state.
+
+    Module-level so sites can run in worker processes. With rescore_db, health
+    scores are written back before each checkpoint, so a resumed replay never
+    skips a run whose scores were not stored."""
+    checkpoint_path = os.path.join(checkpoint_dir, f"{site}.json")
+    replay = None
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r') as f:
+            replay = SiteReplay.from_checkpoint(json.load(f))
+        print(f"↪️ {site}: resuming after {replay.last_file} ({replay.runs} runs replayed)")
+    if replay is None:
+        replay = SiteReplay(site, as_of_ms)
+
+    db = None
+    if rescore_db:
+        from database_manager import DatabaseManager
+        db = DatabaseManager()
+    pending_scores = []
+
+    def checkpoint():
+        if pending_scores:
+            db.update_health_scores(site, pending_scores)
+            pending_scores.clear()
+        _write_json(checkpoint_path, replay.to_checkpoint())
+
+    since_checkpoint = 0
+    for path in paths:
+        name = os.path.basename(path)
+        if replay.last_file is not None and name <= replay.last_file:
+            continue
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            endpoint_stats = score_endpoint_stats(aggregate_results(data['results']))
+            replay.apply(data, endpoint_stats)
+        except (OSError, ValueError, KeyError, TypeError, ZeroDivisionError) as e:
+            print(f"⚠️ {site}: skipping {name}: {e}")
+            replay.failed += 1
+        else:
+            if db is not None and 'runId' in data:
+                pending_scores.append((data['runId'], endpoint_stats))
+        replay.last_file = name
+        since_checkpoint += 1
+        if since_checkpoint >= checkpoint_every:
+            checkpoint()
+            since_checkpoint = 0
+
+    checkpoint()
+    return replay.to_checkpoint()
+
+def replay(logs_dir: str, sites: List[str] = None, workers: int = None, resume: bool = False,
+           checkpoint_dir: str = None, checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+           rescore_db: bool = False, as_of: datetime = None, anomaly_state: str = None,
+           stability_file: str = None, metrics_file: str = None) -> Dict[str, Dict]:
+    """Replay every site under logs_dir and write the rebuilt state; returns per-site results"""
+    start = time.perf_counter()
+    checkpoint_dir = checkpoint_dir or os.path.join(logs_dir, '.replay')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    workers = workers or int(os.getenv('APILENS_REPLAY_WORKERS', '0')) or os.cpu_count() or 1
+
+    runs = discover_runs(logs_dir, sites)
+    if not runs:
+        print(f"❌ No run logs found under {logs_dir}")
+        return {}
+
+    # Stability windows are anchored once per replay, so a resumed replay keeps its anchor
+    manifest_path = os.path.join(checkpoint_dir, 'replay.json')
+    if resume and os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            as_of_ms = json.load(f)['as_of_ms']
+    else:
+        as_of_ms = to_epoch_ms(as_of or datetime.now(timezone.utc))
+        for site in runs:
+            stale = os.path.join(checkpoint_dir, f"{site}.json")
+            if os.path.exists(stale):
+                os.remove(stale)
+        _write_json(manifest_path, {'as_of_ms': as_of_ms, 'logs_dir': os.path.abspath(logs_dir)})
+
+    total_files = sum(len(paths) for paths in runs.values())
+    print(f"⏪ Replaying {total_files:,} runs for {len(runs)} sites with {min(workers, len(runs))} workers")
+
+    # Biggest sites first, so the longest replay is not started last
+    jobs = sorted(runs.items(), key=lambda item: -len(item[1]))
+    args = (as_of_ms, checkpoint_dir, checkpoint_every, resume, rescore_db)
+    results = {}
+    if workers <= 1 or len(runs) == 1:
+        for site, paths in jobs:
+            results[site] = replay_site(site, paths, *args)
+            print(f"✅ {site}: {results[site]['runs']:,} runs")
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(runs))) as pool:
+            futures = {pool.submit(replay_site, site, paths, *args): site for site, paths in jobs}
+            for future in as_completed(futures):
+                site = futures[future]
+                try:
+                    results[site] = future.result()
+                    print(f"✅ {site}: {results[site]['runs']:,} runs")
+                except Exception as e:
+                    print(f"❌ {site}: replay failed ({e}); rerun with --resume to continue from its checkpoint")
+
+    write_outputs(results, anomaly_state, stability_file, metrics_file)
+
+    elapsed = time.perf_counter() - start
+    replayed = sum(result['runs'] for result in results.values())
+    records = sum(result['records'] for result in results.values())
+    alerts = {kind: sum(result['alerts'][kind] for result in results.values()) for kind in ALERT_EVENTS}
+    firing = sum(SiteReplay.from_checkpoint(result).firing() for result in results.values())
+    print(f"⏪ Replayed {replayed:,} runs ({records:,} calls) in {elapsed:.1f}s "
+          f"({replayed / elapsed if elapsed else 0:,.0f} runs/s)")
+    print(f"🔔 Alerts (not notified): {alerts['opened']} opened, {alerts['repeated']} repeated, "
+          f"{alerts['resolved']} resolved, {firing} firing at the end")
+    return results
+
+def write_outputs(results: Dict[str, Dict], anomaly_state: str = None, stability_file: str = None,
+                  metrics_file: str = None):
+    """Merge per-site results into the anomaly state file, a stability summary and a metrics textfile"""
+    if not results:
+        return
+
+    # Replayed sites replace their baselines; other sites' baselines are kept
+    detector = AnomalyDetector(state_path=anomaly_state, save_every=0)
+    detector.import_state({key: values for result in results.values() for key, values in result['anomaly'].items()},
+                          replace_sites=results)
+    detector.save()
+    print(f"💾 Anomaly baselines written to {detector.state_path}")
+
+    from api_stability_tracker import ApiStabilityTracker
+    counts = {}
+    for result in results.values():
+        for endpoint, endpoint_counts in result['stability'].items():
+            merged = counts.setdefault(endpoint, [0] * 6)
+            for i, value in enumerate(endpoint_counts):
+                merged[i] += value
+    stability_file = stability_file or _project_path(os.path.join('logs', 'replay_stability.json'))
+    ApiStabilityTracker().export_summary(stability_file, ApiStabilityTracker().compute_stability_scores_from_counts(counts))
+    print(f"💾 Stability summary for {len(counts)} endpoints written to {stability_file}")
+
+    from multi_site_processor import MultiSiteProcessor
+    metrics_file = metrics_file or _project_path(os.path.join('logs', 'replay.prom'))
+    processor = MultiSiteProcessor()
+    try:
+        for site, result in results.items():
+            processor.update_endpoint_gauges(site, result['latest'])
+            for endpoint, metric, zscore in result['scores']:
+                processor.anomaly_zscore.labels(site=site, endpoint=endpoint, metric=metric).set(zscore)
+        processor.export_metrics(metrics_file)
+    finally:
+        processor.close()
+    print(f"📈 Metrics written to {metrics_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay archived run logs to rebuild metrics, baselines and stability')
+    parser.add_argument('--logs-dir', default=_project_path('logs'), help='Directory of <site>/<runId>.json logs')
+    parser.add_argument('--sites', help='Comma-separated sites (default: all)')
+    parser.add_argument('--workers', type=int, help='Sites replayed in parallel (default APILENS_REPLAY_WORKERS or CPUs)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the last checkpoints')
+    parser.add_argument('--checkpoint-dir', help='Checkpoint directory (default <logs-dir>/.replay)')
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY, help='Runs between checkpoints')
+    parser.add_argument('--rescore-db', action='store_true', help='Rewrite stored health scores of replayed runs')
+    parser.add_argument('--as-of', help='ISO time the stability windows end at (default: now)')
+    parser.add_argument('--anomaly-state', help='Anomaly state file (default APILENS_ANOMALY_STATE)')
+    parser.add_argument('--stability-file', help='Stability summary (default logs/replay_stability.json)')
+    parser.add_argument('--metrics-file', help='Prometheus textfile (default logs/replay.prom)')
+    args = parser.parse_args()
+
+    as_of = datetime.fromisoformat(args.as_of.replace('Z', '+00:00')) if args.as_of else None
+    results = replay(args.logs_dir, args.sites.split(',') if args.sites else None, args.workers, args.resume,
+                     args.checkpoint_dir, args.checkpoint_every, args.rescore_db, as_of,
+                     args.anomaly_state, args.stability_file, args.metrics_file)
+    if not results:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
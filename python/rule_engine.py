@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Streaming alert rules evaluated on per-endpoint aggregates.
+
+Rules are declared in a JSON file (alert_rules.json by default) and checked
+against the endpoint_stats that MultiSiteProcessor computes for each run, so
+no database query is needed. Each rule compares one metric against a
+threshold and can require the breach to hold for N consecutive runs.
+Streaks and notification times can be saved to a JSON file, so runs processed
+by separate processes (one per log file) still add up to a streak.
+"""
+
+import fnmatch
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alert_rules.json')
+DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'rule_state.json')
+
+# Used when no rules file exists; mirrors the old check_* defaults
+DEFAULT_RULES = [
+    {'name': 'latency', 'metric': 'avg_latency', 'op': '>', 'threshold': 5000},
+    {'name': 'failure_rate', 'metric': 'failure_rate', 'op': '>', 'threshold': 0.1},
+]
+
+OPERATORS = {
+    '>': lambda value, threshold: value > threshold,
+    '>=': lambda value, threshold: value >= threshold,
+    '<': lambda value, threshold: value < threshold,
+    '<=': lambda value, threshold: value <= threshold,
+}
+
+METRICS = ('calls', 'failures', 'empty', 'avg_latency', 'max_latency',
+           'failure_rate', 'empty_rate', 'success_rate', 'health_score')
+
+def endpoint_metrics(stats: Dict) -> Dict[str, float]:
+    """Metrics a rule can refer to, derived from one endpoint's aggregate"""
+    calls = stats.get('calls', 0)
+    latencies = stats.get('latencies') or []
+    avg_latency = stats.get('avg_latency')
+    if avg_latency is None:
+        avg_latency = sum(latencies) / len(latencies) if latencies else 0
+    return {
+        'calls': calls,
+        'failures': stats.get('failures', 0),
+        'empty': stats.get('empty', 0),
+        'avg_latency': avg_latency,
+        'max_latency': max(latencies) if latencies else avg_latency,
+        'failure_rate': stats.get('failures', 0) / calls if calls else 0,
+        'empty_rate': stats.get('empty', 0) / calls if calls else 0,
+        'success_rate': (calls - stats.get('failures', 0)) / calls if calls else 0,
+        'health_score': stats.get('health_score', 100),
+    }
+
+class AlertRule:
+    def __init__(self, name: str, metric: str, op: str, threshold: float, for_runs: int = 1,
+                 min_calls: int = 1, sites: List[str] = None, endpoints: List[str] = None,
+                 message: str = None):
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {name}: unknown operator {op!r}")
+        if metric not in METRICS:
+            raise ValueError(f"Rule {name}: unknown metric {metric!r} (expected one of {', '.join(METRICS)})")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+        self.for_runs = max(1, int(for_runs))
+        self.min_calls = min_calls
+        self.sites = sites or ['*']
+        self.endpoints = endpoints or ['*']
+        self.message = message or "{metric} {value:.4g} {op} {threshold} on {endpoint} ({site})"
+        self._compare = OPERATORS[op]
+        # Most rules cover every endpoint; skip pattern matching for them
+        self._all_endpoints = '*' in self.endpoints
+
+    @classmethod
+    def from_dict(cls, config: Dict) -> 'AlertRule':
+        return cls(**config)
+
+    def applies_to_site(self, site: str) -> bool:
+        return any(fnmatch.fnmatchcase(site, pattern) for pattern in self.sites)
+
+    def applies_to_endpoint(self, endpoint: str) -> bool:
+        if self._all_endpoints:
+            return True
+        return any(fnmatch.fnmatchcase(endpoint, pattern) for pattern in self.endpoints)
+
+    def breached(self, metrics: Dict[str, float]) -> bool:
+        if metrics['calls'] < self.min_calls:
+            return False
+        return self._compare(metrics[self.metric], self.threshold)
+
+    def format(self, site: str, endpoint: str, value: float) -> str:
+        return self.message.format(metric=self.metric, value=value, op=self.op, threshold=self.threshold,
+                                   endpoint=endpoint, site=site, for_runs=self.for_runs)
+
+def load_rules(path: str = None) -> List[AlertRule]:
+    """Load rules from a JSON file ({"rules": [...]}), falling back to the defaults"""
+    path = path or os.getenv('ALERT_RULES_FILE', DEFAULT_RULES_FILE)
+    if not os.path.isabs(path):
+        # Relative paths are resolved against the project root, like the .env file
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            config = json.load(f)
+        return [AlertRule.from_dict(rule) for rule in config.get('rules', [])]
+    return [AlertRule.from_dict(rule) for rule in DEFAULT_RULES]
+
+class RuleEngine:
+    def __init__(self, rules: List[AlertRule] = None, renotify_seconds: float = 1800,
+                 state_path: str = None, save_interval: float = 30.0):
+        self.rules = rules if rules is not None else load_rules()
+        self.renotify_seconds = renotify_seconds
+        # (rule, site, endpoint) -> consecutive breaching runs
+        self._streaks = {}
+        # (rule, site, endpoint) -> time of last notification while firing
+        self._notified = {}
+        # No state_path: state lives in memory only (replays, tests)
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self._last_save = time.monotonic()
+        self.load()
+
+    def check(self, rule: AlertRule, site: str, endpoint_stats: Dict[str, Dict]) -> Dict[str, float]:
+        """Stateless check of one rule: breaching endpoints and their metric values"""
+        breaches = {}
+        if not rule.applies_to_site(site):
+            return breaches
+        for endpoint, stats in endpoint_stats.items():
+            if not rule.applies_to_endpoint(endpoint):
+                continue
+            metrics = endpoint_metrics(stats)
+            if rule.breached(metrics):
+                breaches[endpoint] = metrics[rule.metric]
+        return breaches
+
+    def evaluate(self, site: str, endpoint_stats: Dict[str, Dict], now: float = None) -> Dict[str, List[Dict]]:
+        """Update rule state with one run's aggregates.
+
+        Only endpoints present in endpoint_stats are touched, so the cost is
+        O(rules x endpoints in the run). Returns alerts that 'opened' (reached
+        for_runs), are 'repeated' (still firing after renotify_seconds) or were
+        'resolved' (firing, now back within the threshold)."""
+        now = time.time() if now is None else now
+        events = {'opened': [], 'repeated': [], 'resolved': []}
+        metrics_cache = {}
+
+        for rule in self.rules:
+            if not rule.applies_to_site(site):
+                continue
+            for endpoint, stats in endpoint_stats.items():
+                if not rule.applies_to_endpoint(endpoint):
+                    continue
+                metrics = metrics_cache.get(endpoint)
+                if metrics is None:
+                    metrics = metrics_cache[endpoint] = endpoint_metrics(stats)
+
+                key = (rule.name, site, endpoint)
+                streak = self._streaks.get(key, 0)
+                value = metrics[rule.metric]
+
+                if rule.breached(metrics):
+                    streak += 1
+                    self._streaks[key] = streak
+                    if streak < rule.for_runs:
+                        continue
+                    alert = {'site': site, 'endpoint': endpoint, 'alert_type': rule.name,
+                             'threshold': rule.threshold, 'current': value,
+                             'message': rule.format(site, endpoint, value)}
+                    last = self._notified.get(key)
+                    if last is None:
+                        events['opened'].append(alert)
+                        self._notified[key] = now
+                    elif now - last >= self.renotify_seconds:
+                        events['repeated'].append(alert)
+                        self._notified[key] = now
+                elif streak:
+                    del self._streaks[key]
+                    if self._notified.pop(key, None) is not None:
+                        events['resolved'].append({'site': site, 'endpoint': endpoint, 'alert_type': rule.name})
+
+        # Long-running processes also save periodically, not only on close
+        if self.state_path and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+        return events
+
+    def load(self):
+        """Restore streaks and notification times saved by a previous process"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                self.import_state(json.load(f))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Ignoring unreadable rule state {self.state_path}: {e}")
+
+    def save(self):
+        """Write streaks and notification times atomically"""
+        if not self.state_path:
+            return
+        self._last_save = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, **self.export_state()}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def export_state(self, site: str = None) -> Dict[str, Dict]:
+        """Breach streaks and notification times ({"rule\tsite\tendpoint": ...}), optionally for one site"""
+        return {name: {'\t'.join(key): value for key, value in state.items() if site is None or key[1] == site}
+                for name, state in (('streaks', self._streaks), ('notified', self._notified))}
+
+    def import_state(self, state: Dict[str, Dict], replace_sites: Iterable[str] = ()):
+        """Restore state from export_state(); existing state of replace_sites is dropped first"""
+        replace_sites = set(replace_sites)
+        for name, target in (('streaks', self._streaks), ('notified', self._notified)):
+            for key in [key for key in target if key[1] in replace_sites]:
+                del target[key]
+            for key, value in state.get(name, {}).items():
+                target[tuple(key.split('\t'))] = value
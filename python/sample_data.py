@@ -3,16 +3,12 @@
 Generate sample snapshot data for testing
 """
 
-import json
-import os
 from datetime import datetime, timedelta
+from snapshot_loader import SnapshotLoader
 
 def generate_sample_snapshots():
     """Generate two sample snapshots for testing"""
     
-    # Ensure snapshots directory exists
-    os.makedirs("../snapshots", exist_ok=True)
-    
     # Sample API data for first run
     snapshot1 = [
         {"api": "/api/products/123", "status": "pass", "latency_ms": 240, "empty_response": False, "response_size": 1345, "timestamp": "2024-06-25T14:30:00Z"},
@@ -41,12 +37,10 @@ def generate_sample_snapshots():
     timestamp1 = time1.strftime("%Y-%m-%dT%H-%M-%S-000Z")
     timestamp2 = time2.strftime("%Y-%m-%dT%H-%M-%S-000Z")
     
-    # Save snapshots
-    with open(f"../snapshots/{timestamp1}.json", 'w') as f:
-        json.dump(snapshot1, f, indent=2)
-    
-    with open(f"../snapshots/{timestamp2}.json", 'w') as f:
-        json.dump(snapshot2, f, indent=2)
+    # Save snapshots (registered in the snapshot catalog)
+    loader = SnapshotLoader("../snapshots")
+    loader.write_snapshot(timestamp1, snapshot1)
+    loader.write_snapshot(timestamp2, snapshot2)
     
     print(f"📸 Generated sample snapshots:")
     print(f"   {timestamp1}.json")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Site sharding for running several metrics servers side by side.
+
+Each instance heartbeats a member lease in a shared lease directory
+(APILENS_SHARD_DIR). Sites (logs/<site> directories) are assigned to live
+members with a consistent-hash ring, so a member joining or leaving only
+moves the sites it gains or loses.
+
+A site is processed only by the holder of its claim file. A claim is taken
+when it is free (released, never held) or its holder stopped renewing it for
+`ttl` seconds, i.e. the holder died. A member releases sites the ring moved
+away at its next rebalance, and the new owner picks them up at its own next
+rebalance. The claim also carries the site's watermark (last processed log
+file), so a new owner continues where the previous one stopped instead of
+reprocessing the site's history.
+
+Claims are only read, checked and rewritten under an exclusive flock on the
+site's lock file: of two members racing for a free claim exactly one wins,
+and a member that lost its claim cannot overwrite the new holder's.
+
+Leases compare wall-clock expiry times, so members on different hosts need
+synchronized clocks; the lease directory must be shared by all members, on a
+filesystem whose locks they all honour (a local disk, or NFS with locking).
+
+    lease_dir/members/<shard>.json   {"shard", "host", "pid", "expires"}
+    lease_dir/sites/<site>.json      {"shard", "expires", "last_file"}
+    lease_dir/sites/<site>.lock      flock held while a claim is updated
+"""
+
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Consistent hashing with virtual nodes"""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 256):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+def _safe_name(value: str) -> str:
+    return value.replace(os.sep, '_')
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path: str, value: Dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+class ShardCoordinator:
+    """Membership and per-site claims through lease files"""
+
+    def __init__(self, lease_dir: str, shard_id: str = None, ttl: float = 90.0, vnodes: int = 256):
+        self.lease_dir = lease_dir
+        self.shard_id = shard_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.vnodes = vnodes
+        self.owned: Set[str] = set()
+        self._last_heartbeat = 0.0
+        for sub in ('members', 'sites'):
+            os.makedirs(os.path.join(lease_dir, sub), exist_ok=True)
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.lease_dir, *parts)
+
+    def _member_path(self, shard: str) -> str:
+        return self.path('members', f"{_safe_name(shard)}.json")
+
+    def _claim_path(self, site: str) -> str:
+        return self.path('sites', f"{_safe_name(site)}.json")
+
+    def heartbeat(self, force: bool = True):
+        """Renew this member's lease (when force=False, only once a third of the ttl has passed)"""
+        now = time.time()
+        if not force and now - self._last_heartbeat < self.ttl / 3:
+            return
+        _write_json(self._member_path(self.shard_id), {
+            'shard': self.shard_id, 'host': socket.gethostname(), 'pid': os.getpid(), 'expires': now + self.ttl})
+        self._last_heartbeat = now
+
+    def members(self) -> List[str]:
+        """Shards with an unexpired lease, this one included"""
+        now = time.time()
+        members = {self.shard_id}
+        for name in os.listdir(self.path('members')):
+            if name.endswith('.json'):
+                lease = _read_json(self.path('members', name))
+                if lease and lease.get('expires', 0) > now:
+                    members.add(lease['shard'])
+        return sorted(members)
+
+    def assigned(self, sites: Iterable[str]) -> Set[str]:
+        """Sites the ring gives to this shard"""
+        ring = HashRing(self.members(), self.vnodes)
+        return {site for site in sites if ring.owner(site) == self.shard_id}
+
+    def _claim(self, site: str) -> Dict:
+        return _read_json(self._claim_path(site)) or {'shard': None, 'expires': 0, 'last_file': None}
+
+    def _write_claim(self, site: str, shard: Optional[str], last_file: Optional[str]):
+        _write_json(self._claim_path(site), {
+            'shard': shard, 'expires': time.time() + self.ttl if shard else 0, 'last_file': last_file})
+
+    @contextmanager
+    def _locked(self, site: str):
+        """Hold the site's claim lock, so its claim can be read and rewritten without a race"""
+        with open(self.path('sites', f"{_safe_name(site)}.lock"), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def try_claim(self, site: str) -> bool:
+        with self._locked(site):
+            claim = self._claim(site)
+            if claim['shard'] not in (None, self.shard_id) and claim['expires'] > time.time():
+                return False
+            self._write_claim(site, self.shard_id, claim['last_file'])
+            return True
+
+    def renew(self, site: str, last_file: str = None) -> bool:
+        """Extend this shard's claim on a site (recording last_file when given).
+
+        Fails, and drops the site from owned, if another shard holds the claim now."""
+        with self._locked(site):
+            claim = self._claim(site)
+            if claim['shard'] != self.shard_id:
+                self.owned.discard(site)
+                return False
+            self._write_claim(site, self.shard_id, last_file or claim['last_file'])
+            return True
+
+    def holds(self, site: str) -> bool:
+        claim = self._claim(site)
+        return claim['shard'] == self.shard_id and claim['expires'] > time.time()
+
+    def release(self, site: str):
+        with self._locked(site):
+            claim = self._claim(site)
+            if claim['shard'] == self.shard_id:
+                self._write_claim(site, None, claim['last_file'])
+        self.owned.discard(site)
+
+    def rebalance(self, sites: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+        """Heartbeat, release sites that moved away and claim newly assigned ones.
+
+        Returns (acquired, released). A site still held by a live member is
+        acquired on a later rebalance, once that member has released it."""
+        self.heartbeat()
+        desired = self.assigned(sites)
+        released = set()
+        for site in sorted(self.owned):
+            # An expired claim nobody else took is simply renewed below
+            if site not in desired or self._claim(site)['shard'] != self.shard_id:
+                self.release(site)
+                released.add(site)
+        acquired = set()
+        for site in sorted(desired):
+            if site in self.owned:
+                if not self.renew(site):
+                    released.add(site)
+            elif self.try_claim(site):
+                self.owned.add(site)
+                acquired.add(site)
+        return acquired, released
+
+    def watermark(self, site: str) -> Optional[str]:
+        """Name of the last log file processed for a site, by any shard"""
+        return self._claim(site)['last_file']
+
+    def advance(self, site: str, last_file: str) -> bool:
+        """Record progress on a site (renewing its claim and, when due, the member lease).
+
+        Returns False, recording nothing, if another shard has taken the site over."""
+        advanced = self.renew(site, last_file)
+        self.heartbeat(force=False)
+        return advanced
+
+    def close(self):
+        """Release every claim and leave the ring, so other members take over at once"""
+        for site in list(self.owned):
+            self.release(site)
+        try:
+            os.remove(self._member_path(self.shard_id))
+        except OSError:
+            pass
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Persisted index of snapshot files.
+
+Snapshot ids, paths, sizes and record counts are kept in a small SQLite
+database inside the snapshots directory, so latest-N and time-range lookups
+are B-tree queries instead of listing and sorting the whole directory.
+New files are registered when written through SnapshotLoader; files written
+by other tools (the Node.js snapshot manager) are discovered by rescanning
+only directories whose mtime changed since the last scan.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from snapshot_formats import JSON_EXT, NDJSON_EXT, COLUMNAR_EXT
+
+CATALOG_FILE = '.catalog.db'
+
+# Snapshot extensions recognised by the catalog
+SNAPSHOT_EXTENSIONS = (COLUMNAR_EXT, NDJSON_EXT, JSON_EXT)
+
+SHARD_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    taken_at TEXT,
+    records INTEGER,
+    run_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_taken_at ON snapshots(taken_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_directory ON snapshots(directory);
+CREATE TABLE IF NOT EXISTS scanned_dirs (
+    directory TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+def shard_for(snapshot_id: str) -> Optional[str]:
+    """Date shard (YYYY/MM/DD) for a snapshot id containing a date, else None"""
+    match = SHARD_DATE.search(snapshot_id)
+    if not match:
+        return None
+    return os.path.join(*match.groups())
+
+def taken_at(snapshot_id: str) -> Optional[str]:
+    """Sortable time part of a snapshot id ('snapshot_2024-06-25T14-30-00' -> '2024-06-25T14-30-00')"""
+    match = SHARD_DATE.search(snapshot_id)
+    return snapshot_id[match.start():] if match else None
+
+def split_snapshot_name(filename: str):
+    """(snapshot_id, extension) for a snapshot file name, or None if it is not one"""
+    for extension in SNAPSHOT_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[:-len(extension)], extension
+    return None
+
+class SnapshotCatalog:
+    def __init__(self, snapshots_dir: str, catalog_path: str = None):
+        self.snapshots_dir = snapshots_dir
+        self.catalog_path = catalog_path or os.path.join(snapshots_dir, CATALOG_FILE)
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.catalog_path)), exist_ok=True)
+            conn = sqlite3.connect(self.catalog_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def add(self, path: str, records: int = None, run_time: str = None):
+        """Register (or refresh) one snapshot file"""
+        conn = self._connection()
+        with conn:
+            self._upsert(conn, path, os.stat(path), records, run_time)
+
+    def _upsert(self, conn, path: str, st, records: int = None, run_time: str = None):
+        parsed = split_snapshot_name(os.path.basename(path))
+        if parsed is None:
+            return
+        conn.execute(
+            """INSERT INTO snapshots (snapshot_id, path, directory, size, mtime_ns, taken_at, records, run_time)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(snapshot_id) DO UPDATE SET
+                   path = excluded.path, directory = excluded.directory, size = excluded.size,
+                   mtime_ns = excluded.mtime_ns,
+                   records = COALESCE(excluded.records, snapshots.records),
+                   run_time = COALESCE(excluded.run_time, snapshots.run_time)""",
+            (parsed[0], self._relative(path), self._relative(os.path.dirname(path)),
+             st.st_size, st.st_mtime_ns, taken_at(parsed[0]), records, run_time)
+        )
+
+    def update_details(self, snapshot_id: str, records: int = None, run_time: str = None):
+        """Fill in record count / run time once a snapshot has been parsed"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """UPDATE snapshots SET records = COALESCE(?, records), run_time = COALESCE(?, run_time)
+                   WHERE snapshot_id = ?""",
+                (records, run_time, snapshot_id)
+            )
+
+    def refresh(self) -> int:
+        """Pick up snapshots written by other tools; returns the number of directories rescanned.
+
+        Only directories whose mtime changed are listed again (a new shard
+        changes its parent's mtime), so an unchanged tree costs one stat per
+        directory."""
+        if not os.path.isdir(self.snapshots_dir):
+            return 0
+        conn = self._connection()
+        scanned = dict(conn.execute('SELECT directory, mtime_ns FROM scanned_dirs'))
+        rescanned = 0
+
+        pending = [self.snapshots_dir] + [os.path.join(self.snapshots_dir, d) for d in scanned if d != '.']
+        seen = set()
+        while pending:
+            directory = pending.pop()
+            relative = self._relative(directory)
+            if relative in seen:
+                continue
+            seen.add(relative)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                with conn:
+                    conn.execute('DELETE FROM snapshots WHERE directory = ?', (relative,))
+                    conn.execute('DELETE FROM scanned_dirs WHERE directory = ?', (relative,))
+                continue
+            if scanned.get(relative) == mtime_ns:
+                continue
+
+            entries = list(os.scandir(directory))
+            for entry in entries:
+                if entry.is_dir() and not entry.name.startswith('.'):
+                    pending.append(entry.path)
+            self._rescan(conn, relative, entries, mtime_ns)
+            rescanned += 1
+        return rescanned
+
+    def _rescan(self, conn, relative: str, entries, mtime_ns: int):
+        known = dict(conn.execute('SELECT path, mtime_ns FROM snapshots WHERE directory = ?', (relative,)))
+        present = set()
+        with conn:
+            for entry in entries:
+                if not entry.is_file() or split_snapshot_name(entry.name) is None:
+                    continue
+                path = self._relative(entry.path)
+                present.add(path)
+                st = entry.stat()
+                if known.get(path) != st.st_mtime_ns:
+                    self._upsert(conn, entry.path, st)
+            for path in set(known) - present:
+                conn.execute('DELETE FROM snapshots WHERE path = ?', (path,))
+            conn.execute(
+                """INSERT INTO scanned_dirs (directory, mtime_ns) VALUES (?, ?)
+                   ON CONFLICT(directory) DO UPDATE SET mtime_ns = excluded.mtime_ns""",
+                (relative, mtime_ns)
+            )
+
+    def latest(self, count: int = 2) -> List[str]:
+        """Latest N snapshot ids, newest first"""
+        rows = self._connection().execute(
+            'SELECT snapshot_id FROM snapshots ORDER BY snapshot_id DESC LIMIT ?', (count,))
+        return [row[0] for row in rows]
+
+    def between(self, start: str = None, end: str = None) -> List[str]:
+        """Snapshot ids taken between start and end (either bound optional), oldest first.
+
+        Bounds compare against the timestamp in the id, so '2024-06-01' or
+        '2024-06-01T12' work; end bounds are inclusive of the whole prefix."""
+        clauses, params = ['taken_at IS NOT NULL'], []
+        if start is not None:
+            clauses.append('taken_at >= ?')
+            params.append(start)
+        if end is not None:
+            # '2024-06-30' should include '2024-06-30T23-59-59'
+            clauses.append('taken_at < ?')
+            params.append(end + '\uffff')
+        rows = self._connection().execute(
+            f"SELECT snapshot_id FROM snapshots WHERE {' AND '.join(clauses)} ORDER BY taken_at", params)
+        return [row[0] for row in rows]
+
+    def get(self, snapshot_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            'SELECT path, size, mtime_ns, records, run_time FROM snapshots WHERE snapshot_id = ?',
+            (snapshot_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'snapshot_id': snapshot_id, 'path': os.path.join(self.snapshots_dir, row[0]),
+                'size': row[1], 'mtime_ns': row[2], 'records': row[3], 'run_time': row[4]}
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM snapshots').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.snapshots_dir)
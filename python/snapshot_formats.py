@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Compact on-disk snapshot formats.
+
+Besides plain JSON, snapshots can be stored as:
+
+- gzip NDJSON (.ndjson.gz): a header line with the snapshot metadata, then
+  one API record per line.
+- columnar binary (.cols): one typed array per field, zlib-compressed, with
+  all strings (URLs, statuses, ...) interned in a single string table.
+  Analyses can read the columns directly without building per-API dicts.
+
+Usage:
+    python snapshot_formats.py convert <snapshots_dir> [--format cols|ndjson|json] [--keep]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, List, Tuple
+
+JSON_EXT = '.json'
+NDJSON_EXT = '.ndjson.gz'
+COLUMNAR_EXT = '.cols'
+
+FORMAT_EXTENSIONS = {'json': JSON_EXT, 'ndjson': NDJSON_EXT, 'cols': COLUMNAR_EXT}
+
+COLUMNAR_MAGIC = b'APLCOL1\n'
+
+# Column types: int64, float64, bool, interned string, interned JSON (anything else)
+INT, FLOAT, BOOL, STRING, JSON = 'i', 'f', 'b', 's', 'j'
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+class _Missing:
+    """Marks a field that is absent from a record (distinct from null)"""
+    __slots__ = ()
+
+MISSING = _Missing()
+
+def detect_format(path: str) -> str:
+    """'json', 'ndjson' or 'cols' from the file name"""
+    if path.endswith(NDJSON_EXT):
+        return 'ndjson'
+    if path.endswith(COLUMNAR_EXT):
+        return 'cols'
+    return 'json'
+
+def split_snapshot(data: Any) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]]]:
+    """(shape, metadata, records) for a snapshot as written by either tool"""
+    if isinstance(data, dict) and 'apis' in data:
+        return 'dict', {k: v for k, v in data.items() if k != 'apis'}, data['apis']
+    if isinstance(data, dict):
+        return 'single', {}, [data]
+    return 'list', {}, data
+
+def join_snapshot(shape: str, meta: Dict[str, Any], records: List[Dict[str, Any]]) -> Any:
+    if shape == 'dict':
+        data = dict(meta)
+        data['apis'] = records
+        return data
+    if shape == 'single':
+        return records[0] if records else {}
+    return records
+
+def read_snapshot(path: str) -> Any:
+    """Load a snapshot in any supported format, returning the original JSON structure"""
+    fmt = detect_format(path)
+    if fmt == 'json':
+        with open(path, 'r') as f:
+            return json.load(f)
+    if fmt == 'ndjson':
+        shape, meta, records = _read_ndjson(path)
+        return join_snapshot(shape, meta, records)
+    shape, meta, names, columns = _read_columnar(path)
+    return join_snapshot(shape, meta, columns_to_records(names, columns))
+
+def read_columns(path: str) -> Tuple[Dict[str, Any], Dict[str, list]]:
+    """(metadata, {field: values}) for a snapshot; absent fields are MISSING.
+
+    For .cols files no per-record dicts are built and equal strings are the
+    same object, so per-URL work can be cached by identity."""
+    fmt = detect_format(path)
+    if fmt == 'cols':
+        _, meta, names, columns = _read_columnar(path)
+        return meta, dict(zip(names, columns))
+    _, meta, records = split_snapshot(read_snapshot(path))
+    names, columns = records_to_columns(records)
+    return meta, dict(zip(names, columns))
+
+def write_snapshot(path: str, data: Any, indent: int = 2):
+    """Write a snapshot in the format implied by the file extension (atomically)"""
+    fmt = detect_format(path)
+    tmp_path = path + '.tmp'
+    if fmt == 'json':
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=indent)
+    elif fmt == 'ndjson':
+        shape, meta, records = split_snapshot(data)
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'apilens_snapshot': 'ndjson', 'shape': shape, 'meta': meta}) + '\n')
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    else:
+        shape, meta, records = split_snapshot(data)
+        with open(tmp_path, 'wb') as f:
+            f.write(_encode_columnar(shape, meta, records))
+    os.replace(tmp_path, path)
+
+def records_to_columns(records: List[Dict[str, Any]]) -> Tuple[List[str], List[list]]:
+    names = []
+    seen = set()
+    for record in records:
+        for key in record:
+            if key not in seen:
+                seen.add(key)
+                names.append(key)
+    columns = [[record.get(name, MISSING) for record in records] for name in names]
+    return names, columns
+
+def columns_to_records(names: List[str], columns: List[list]) -> List[Dict[str, Any]]:
+    if not names:
+        return []
+    if not any(any(value is MISSING for value in column) for column in columns):
+        return [dict(zip(names, row)) for row in zip(*columns)]
+    return [{name: value for name, value in zip(names, row) if value is not MISSING} for row in zip(*columns)]
+
+def _column_type(values: list) -> str:
+    present = [v for v in values if v is not MISSING]
+    if present and all(type(v) is bool for v in present):
+        return BOOL
+    if present and all(type(v) is int and INT64_MIN <= v <= INT64_MAX for v in present):
+        return INT
+    if present and all(type(v) is float for v in present):
+        return FLOAT
+    if present and all(type(v) is str for v in present):
+        return STRING
+    return JSON
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_le_bytes(typecode: str, raw: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _encode_columnar(shape: str, meta: Dict[str, Any], records: List[Dict[str, Any]]) -> bytes:
+    if not all(isinstance(record, dict) for record in records):
+        raise ValueError("Columnar snapshots need a list of API objects")
+    names, columns = records_to_columns(records)
+    strings, string_index = [], {}
+
+    def intern(value: str) -> int:
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    specs, blobs = [], []
+    for name, values in zip(names, columns):
+        kind = _column_type(values)
+        present = [v for v in values if v is not MISSING]
+        has_missing = len(present) != len(values)
+        if kind == INT:
+            data = _le_bytes(array('q', present))
+        elif kind == FLOAT:
+            data = _le_bytes(array('d', present))
+        elif kind == BOOL:
+            data = bytes(present)
+        elif kind == STRING:
+            data = _le_bytes(array('I', [intern(v) for v in present]))
+        else:
+            data = _le_bytes(array('I', [intern(json.dumps(v)) for v in present]))
+        mask = bytes(v is not MISSING for v in values) if has_missing else b''
+        specs.append({'name': name, 'type': kind, 'mask': len(mask), 'size': len(data)})
+        blobs.extend((mask, data))
+
+    header = json.dumps({'shape': shape, 'meta': meta, 'count': len(records),
+                         'columns': specs, 'strings': strings}).encode('utf-8')
+    payload = struct.pack('<I', len(header)) + header + b''.join(blobs)
+    return COLUMNAR_MAGIC + zlib.compress(payload, 6)
+
+def _read_columnar(path: str):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if not raw.startswith(COLUMNAR_MAGIC):
+        raise ValueError(f"Not a columnar snapshot: {path}")
+    payload = zlib.decompress(raw[len(COLUMNAR_MAGIC):])
+    header_len = struct.unpack_from('<I', payload)[0]
+    header = json.loads(payload[4:4 + header_len])
+    strings = header['strings']
+    count = header['count']
+
+    offset = 4 + header_len
+    names, columns = [], []
+    for spec in header['columns']:
+        mask = payload[offset:offset + spec['mask']]
+        offset += spec['mask']
+        data = payload[offset:offset + spec['size']]
+        offset += spec['size']
+
+        kind = spec['type']
+        if kind == INT:
+            present = _from_le_bytes('q', data).tolist()
+        elif kind == FLOAT:
+            present = _from_le_bytes('d', data).tolist()
+        elif kind == BOOL:
+            present = [b == 1 for b in data]
+        elif kind == STRING:
+            present = [strings[i] for i in _from_le_bytes('I', data)]
+        else:
+            decoded = {}
+            present = []
+            for i in _from_le_bytes('I', data):
+                if i not in decoded:
+                    decoded[i] = json.loads(strings[i])
+                present.append(decoded[i])
+
+        if mask:
+            values = iter(present)
+            column = [next(values) if flag else MISSING for flag in mask]
+        else:
+            column = present
+        if len(column) != count:
+            raise ValueError(f"Corrupt column {spec['name']!r} in {path}")
+        names.append(spec['name'])
+        columns.append(column)
+    return header['shape'], header['meta'], names, columns
+
+def _read_ndjson(path: str):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        body = f.read()
+    # One decode call for all records is much faster than json.loads per line
+    records = json.loads('[' + ','.join(line for line in body.split('\n') if line.strip()) + ']')
+    return header.get('shape', 'list'), header.get('meta', {}), records
+
+def convert_file(path: str, fmt: str, keep: bool = False) -> str:
+    """Rewrite one snapshot in another format; returns the new path"""
+    source_fmt = detect_format(path)
+    base = path[:-len(FORMAT_EXTENSIONS[source_fmt])]
+    target = base + FORMAT_EXTENSIONS[fmt]
+    if target == path:
+        return path
+    write_snapshot(target, read_snapshot(path))
+    if not keep:
+        os.remove(path)
+        # The sidecar summary belongs to the old file name
+        if os.path.exists(path + '.summary'):
+            os.remove(path + '.summary')
+    return target
+
+def convert_directory(snapshots_dir: str, fmt: str, keep: bool = False) -> Dict[str, int]:
+    """Convert every snapshot under a directory (including date shards)"""
+    totals = {'files': 0, 'bytes_before': 0, 'bytes_after': 0}
+    extensions = tuple(ext for name, ext in FORMAT_EXTENSIONS.items() if name != fmt)
+    for root, dirs, files in os.walk(snapshots_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in sorted(files):
+            if not name.endswith(extensions):
+                continue
+            path = os.path.join(root, name)
+            before = os.path.getsize(path)
+            try:
+                target = convert_file(path, fmt, keep)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {path}: {e}")
+                continue
+            totals['files'] += 1
+            totals['bytes_before'] += before
+            totals['bytes_after'] += os.path.getsize(target)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert ApiLens snapshots between formats')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert = subparsers.add_parser('convert', help='Convert all snapshots in a directory')
+    convert.add_argument('snapshots_dir')
+    convert.add_argument('--format', choices=sorted(FORMAT_EXTENSIONS), default='cols')
+    convert.add_argument('--keep', action='store_true', help='Keep the original files')
+    args = parser.parse_args()
+
+    totals = convert_directory(args.snapshots_dir, args.format, args.keep)
+    ratio = totals['bytes_before'] / totals['bytes_after'] if totals['bytes_after'] else 0
+    print(f"📦 Converted {totals['files']} snapshots to {args.format}: "
+          f"{totals['bytes_before']:,} → {totals['bytes_after']:,} bytes ({ratio:.1f}x smaller)")
+
+if __name__ == "__main__":
+    main()
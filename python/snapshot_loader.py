@@ -1,31 +1,195 @@
 import json
 import os
 import re
-from typing import List, Dict, Any
+import sqlite3
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+from snapshot_catalog import SnapshotCatalog, SNAPSHOT_EXTENSIONS, shard_for, taken_at, split_snapshot_name
+from snapshot_formats import FORMAT_EXTENSIONS, detect_format, read_snapshot, read_columns, write_snapshot
+
+# Sidecar written next to each snapshot (snapshot_x.json -> snapshot_x.json.summary)
+SUMMARY_SUFFIX = '.summary'
+SUMMARY_VERSION = 1
+
+@lru_cache(maxsize=65536)
+def detect_pattern(url: str) -> str:
+    """Convert URL to pattern by replacing IDs with wildcards"""
+    # Remove query parameters
+    url = url.split('?')[0]
+    
+    # Replace numeric IDs
+    pattern = re.sub(r'/\d+', '/*', url)
+    
+    # Replace UUIDs
+    pattern = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/*', pattern, flags=re.IGNORECASE)
+    
+    # Replace long alphanumeric strings (likely IDs)
+    pattern = re.sub(r'/[a-zA-Z0-9_-]{20,}', '/*', pattern)
+    
+    return pattern
 
 class SnapshotLoader:
-    def __init__(self, snapshots_dir: str = "snapshots"):
+    def __init__(self, snapshots_dir: str = "snapshots", use_catalog: bool = None, shard_by_date: bool = None,
+                 snapshot_format: str = None):
         self.snapshots_dir = snapshots_dir
+        # Format for new snapshots: json (default), ndjson (gzip) or cols (columnar)
+        self.snapshot_format = snapshot_format or os.getenv('APILENS_SNAPSHOT_FORMAT', 'json')
+        if self.snapshot_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unknown snapshot format {self.snapshot_format!r}")
+        # timestamp -> ((mtime_ns, size), summary) for summaries read in this process
+        self._summaries = {}
+        
+        # Indexed catalog of snapshot files instead of listing the directory
+        if use_catalog is None:
+            use_catalog = os.getenv('APILENS_SNAPSHOT_CATALOG', '1') != '0'
+        self.catalog = SnapshotCatalog(snapshots_dir) if use_catalog else None
+        # New snapshots go to YYYY/MM/DD subdirectories when enabled
+        if shard_by_date is None:
+            shard_by_date = os.getenv('APILENS_SNAPSHOT_SHARDS', '0') == '1'
+        self.shard_by_date = shard_by_date
+    
+    def snapshot_path(self, timestamp: str) -> str:
+        """Path of a snapshot file in any format, whether flat or in a date shard"""
+        if self.catalog:
+            try:
+                entry = self.catalog.get(timestamp)
+                if entry is not None:
+                    return entry['path']
+            except sqlite3.Error as e:
+                self._disable_catalog(e)
+        
+        shard = shard_for(timestamp)
+        directories = [self.snapshots_dir] + ([os.path.join(self.snapshots_dir, shard)] if shard else [])
+        for directory in directories:
+            for extension in SNAPSHOT_EXTENSIONS:
+                filepath = os.path.join(directory, f"{timestamp}{extension}")
+                if os.path.exists(filepath):
+                    return filepath
+        return os.path.join(self.snapshots_dir, f"{timestamp}.json")
+    
+    def write_snapshot(self, timestamp: str, data: Any) -> str:
+        """Write a snapshot and register it in the catalog"""
+        directory = self.snapshots_dir
+        shard = shard_for(timestamp) if self.shard_by_date else None
+        if shard:
+            directory = os.path.join(directory, shard)
+        os.makedirs(directory, exist_ok=True)
+        
+        filepath = os.path.join(directory, f"{timestamp}{FORMAT_EXTENSIONS[self.snapshot_format]}")
+        write_snapshot(filepath, data)
+        
+        if self.catalog:
+            apis = data.get('apis', [data]) if isinstance(data, dict) else data
+            run_time = data.get('timestamp') if isinstance(data, dict) else None
+            try:
+                self.catalog.add(filepath, records=len(apis), run_time=run_time)
+            except sqlite3.Error as e:
+                self._disable_catalog(e)
+        return filepath
     
     def load_snapshot(self, timestamp: str) -> List[Dict[str, Any]]:
-        """Load a single snapshot by timestamp"""
-        filepath = os.path.join(self.snapshots_dir, f"{timestamp}.json")
+        """Load a single snapshot by timestamp (JSON, gzip NDJSON or columnar)"""
+        filepath = self.snapshot_path(timestamp)
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Snapshot not found: {filepath}")
         
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        return read_snapshot(filepath)
+    
+    def load_summary(self, timestamp: str, comparator) -> Dict[str, Any]:
+        """Grouped summary of a snapshot (see ComparisonEngine.summarize).
+        
+        Read from the sidecar file when its recorded mtime and size still match
+        the snapshot; otherwise the snapshot is parsed, summarized and the
+        sidecar rewritten."""
+        filepath = self.snapshot_path(timestamp)
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Snapshot not found: {filepath}")
+        signature = (st.st_mtime_ns, st.st_size)
+        
+        cached = self._summaries.get(timestamp)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        summary_path = filepath + SUMMARY_SUFFIX
+        summary = None
+        try:
+            with open(summary_path, 'r') as f:
+                sidecar = json.load(f)
+            if sidecar.get('version') == SUMMARY_VERSION and tuple(sidecar.get('source', ())) == signature:
+                summary = sidecar['summary']
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        if summary is None:
+            if detect_format(filepath) == 'cols':
+                # Summarize straight from the columns; patterns are computed once per distinct URL
+                meta, columns = read_columns(filepath)
+                run_time = meta.get('timestamp')
+                summary = comparator.summarize_columns(columns, self._detect_pattern, timestamp=run_time)
+            else:
+                data = self.load_snapshot(timestamp)
+                run_time = data.get('timestamp') if isinstance(data, dict) else None
+                summary = comparator.summarize(self.group_apis_by_pattern(data), timestamp=run_time)
+            self._write_summary(summary_path, signature, summary)
+            if self.catalog:
+                try:
+                    self.catalog.update_details(timestamp, records=summary['total'], run_time=run_time)
+                except sqlite3.Error as e:
+                    self._disable_catalog(e)
+        
+        self._summaries[timestamp] = (signature, summary)
+        return summary
+    
+    def _write_summary(self, summary_path: str, signature: tuple, summary: Dict[str, Any]):
+        tmp_path = summary_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': SUMMARY_VERSION, 'source': list(signature), 'summary': summary}, f)
+            os.replace(tmp_path, summary_path)
+        except OSError as e:
+            # Read-only snapshot directories still work, just without the cache
+            print(f"⚠️ Could not write summary cache {summary_path}: {e}")
     
     def get_latest_snapshots(self, count: int = 2) -> List[str]:
         """Get the latest N snapshot timestamps"""
         if not os.path.exists(self.snapshots_dir):
             return []
         
-        files = [f.replace('.json', '') for f in os.listdir(self.snapshots_dir) 
-                if f.endswith('.json')]
+        if self.catalog:
+            try:
+                self.catalog.refresh()
+                return self.catalog.latest(count)
+            except sqlite3.Error as e:
+                self._disable_catalog(e)
+        
+        files = [parsed[0] for parsed in map(split_snapshot_name, os.listdir(self.snapshots_dir)) if parsed]
         return sorted(files, reverse=True)[:count]
     
+    def get_snapshots_between(self, start: str = None, end: str = None) -> List[str]:
+        """Snapshot timestamps in a date range (e.g. '2024-06-01' to '2024-06-30'), oldest first"""
+        if not os.path.exists(self.snapshots_dir):
+            return []
+        
+        if self.catalog:
+            try:
+                self.catalog.refresh()
+                return self.catalog.between(start, end)
+            except sqlite3.Error as e:
+                self._disable_catalog(e)
+        
+        ids = [parsed[0] for parsed in map(split_snapshot_name, os.listdir(self.snapshots_dir)) if parsed]
+        dated = sorted((taken_at(snapshot), snapshot) for snapshot in ids if taken_at(snapshot))
+        return [snapshot for when, snapshot in dated
+                if (start is None or when >= start) and (end is None or when[:len(end)] <= end)]
+    
+    def _disable_catalog(self, error: Exception):
+        # e.g. a read-only snapshots directory: fall back to listing files
+        print(f"⚠️ Snapshot catalog unavailable, listing files instead: {error}")
+        self.catalog = None
+    
     def group_apis_by_pattern(self, data: Any) -> Dict[str, List[Dict[str, Any]]]:
         """Group APIs by endpoint pattern"""
         groups = {}
@@ -59,16 +223,4 @@ class SnapshotLoader:
     
     def _detect_pattern(self, url: str) -> str:
         """Convert URL to pattern by replacing IDs with wildcards"""
-        # Remove query parameters
-        url = url.split('?')[0]
-        
-        # Replace numeric IDs
-        pattern = re.sub(r'/\d+', '/*', url)
-        
-        # Replace UUIDs
-        pattern = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/*', pattern, flags=re.IGNORECASE)
-        
-        # Replace long alphanumeric strings (likely IDs)
-        pattern = re.sub(r'/[a-zA-Z0-9_-]{20,}', '/*', pattern)
-        
-        return pattern
\ No newline at end of file
+        return detect_pattern(url)
\ No newline at end of file
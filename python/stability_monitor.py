@@ -4,13 +4,63 @@ API Stability Monitor - Real-time monitoring integration
 """
 
 from api_stability_tracker import ApiStabilityTracker
+from profiling import profile_if_requested
 from datetime import datetime
 import json
+import os
 import sys
 
 class StabilityMonitor:
-    def __init__(self):
+    def __init__(self, history_path: str = None):
         self.tracker = ApiStabilityTracker()
+        # Columnar history store (APILENS_HISTORY_STORE) for long-range analysis
+        self.history_path = history_path or os.getenv('APILENS_HISTORY_STORE', '')
+        self.history = None
+    
+    def open_history(self):
+        if self.history is None:
+            from history_store import HistoryStore
+            self.history = HistoryStore(self.history_path or os.path.join('database', 'history'))
+        return self.history
+    
+    def import_snapshots_to_history(self, snapshot_dir: str = "../snapshots", site: str = "snapshots") -> int:
+        """Append snapshots not yet in the history store; returns rows added"""
+        from snapshot_loader import SnapshotLoader
+        from snapshot_formats import MISSING, read_columns
+        
+        store = self.open_history()
+        loader = SnapshotLoader(snapshot_dir)
+        added = 0
+        for snapshot in reversed(loader.get_latest_snapshots(sys.maxsize)):
+            if store.has_source(snapshot):
+                continue
+            try:
+                meta, columns = read_columns(loader.snapshot_path(snapshot))
+            except Exception as e:
+                print(f"⚠️ Error loading {snapshot}: {e}")
+                continue
+            if 'url' not in columns:
+                store.append(site, [], source=snapshot)
+                continue
+            
+            snapshot_timestamp = meta.get('timestamp', datetime.now().isoformat())
+            value = lambda name, i, default: columns[name][i] if name in columns and columns[name][i] is not MISSING else default
+            records = [{
+                "endpoint": url if url is not MISSING else 'unknown',
+                "timestamp": snapshot_timestamp,
+                "status_code": value('statusCode', i, 200),
+                "response_size": value('size', i, 0),
+                "latency": value('latency', i, 0),
+                "is_empty": bool(value('isEmpty', i, False))
+            } for i, url in enumerate(columns['url'])]
+            added += store.append(site, records, source=snapshot)
+        
+        print(f"📦 History store: {added} new API calls, {store.row_count()} total")
+        return added
+    
+    def compute_from_history(self, site: str = None):
+        """Stability scores from the history store instead of in-memory logs"""
+        return self.tracker.compute_stability_scores_from_history(self.open_history(), site)
     
     def load_from_snapshots(self, snapshot_dir: str = "../snapshots"):
         """Load API logs from existing snapshots"""
@@ -49,9 +99,23 @@ class StabilityMonitor:
         
         return len(logs)
     
-    def generate_report(self):
+    def load_from_monitoring(self, monitoring_file: str = "../healthmug_api_monitoring.json"):
+        """Load API calls from monitoring-run output (httpFailures/emptyResponses/apiDetails)"""
+        from monitoring_ingest import load_tracker
+        
+        before = len(self.tracker.logs)
+        try:
+            load_tracker(monitoring_file, self.tracker)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error loading {monitoring_file}: {e}")
+        loaded = len(self.tracker.logs) - before
+        print(f"📊 Loaded {loaded} API calls from {monitoring_file}")
+        return loaded
+    
+    def generate_report(self, results=None):
         """Generate and display stability report"""
-        results = self.tracker.compute_stability_scores()
+        if results is None:
+            results = self.tracker.compute_stability_scores()
         
         if not results:
             print("❌ No data available for analysis")
@@ -92,14 +156,33 @@ class StabilityMonitor:
         
         # Export summary
         summary_file = f"stability_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        self.tracker.export_summary(summary_file)
+        self.tracker.export_summary(summary_file, results)
         print(f"\n💾 Detailed report saved to {summary_file}")
         
         return results
 
 def main():
+    with profile_if_requested('stability_monitor'):
+        run_command()
+
+def run_command():
     monitor = StabilityMonitor()
     
+    if len(sys.argv) > 1 and sys.argv[1] == "history":
+        # Long-range analysis from the memory-mapped history store
+        print("📦 Updating history store from snapshots...")
+        monitor.import_snapshots_to_history()
+        monitor.generate_report(monitor.compute_from_history())
+        return
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "monitoring":
+        # Monitoring-run output, streamed call by call
+        print("📂 Loading from monitoring output...")
+        if monitor.load_from_monitoring(*sys.argv[2:3]) == 0:
+            return
+        monitor.generate_report()
+        return
+    
     if len(sys.argv) > 1 and sys.argv[1] == "test":
         # Run with test data
         print("🧪 Running with test data...")
@@ -1,3 +1,4 @@
+from profiling import start_sampling_if_requested
 from prometheus_client import Gauge, start_http_server
 from api_stability_tracker import ApiStabilityTracker
 import time
@@ -64,5 +65,6 @@ class StabilityPrometheusExporter:
             print("\n🛑 Stability metrics server stopped")
 
 if __name__ == "__main__":
+    start_sampling_if_requested('stability_prometheus')
     exporter = StabilityPrometheusExporter()
     exporter.run_with_snapshots()
\ No newline at end of file
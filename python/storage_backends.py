@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Storage backends for DatabaseManager.
+
+DatabaseManager writes its SQL once, in PostgreSQL form with %s placeholders.
+A backend supplies the connection, the schema, and the handful of dialect
+differences (placeholders, id retrieval, bulk inserts, time windows).
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, List, Sequence
+
+# Health score below which an endpoint is considered unhealthy. The partial
+# index idx_endpoint_results_low_health only covers rows under this value, so
+# alert queries with a threshold at or below it can be answered from the index.
+LOW_HEALTH_THRESHOLD = 70
+
+# At most one active alert per (site, endpoint, type). Duplicates left over from
+# before de-duplication are resolved first so the unique index can be built.
+ACTIVE_ALERT_KEY_SQL = """
+    UPDATE alerts SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP
+    WHERE status = 'active' AND id NOT IN (
+        SELECT MAX(id) FROM alerts WHERE status = 'active' GROUP BY site_id, endpoint, alert_type
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_active_key ON alerts(site_id, endpoint, alert_type)
+        WHERE status = 'active';
+"""
+
+class StorageBackend:
+    """Interface implemented by every storage backend"""
+    name = 'base'
+
+    # Errors worth retrying (database unreachable, locked, restarting)
+    transient_errors = ()
+
+    def initialize(self):
+        """Make sure the database exists and the schema is in place"""
+        raise NotImplementedError
+
+    def connect(self):
+        """Return a new DB-API connection"""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor; commit on success, roll back on error"""
+        raise NotImplementedError
+
+    def insert_returning_id(self, cur, query: str, params: Sequence) -> int:
+        """Run an INSERT and return the id of the new row"""
+        raise NotImplementedError
+
+    def bulk_insert(self, cur, table: str, columns: Sequence[str], rows: List[Sequence]):
+        """Insert many rows with as few round trips as the driver allows"""
+        raise NotImplementedError
+
+    def execute_many(self, cur, query: str, rows: List[Sequence]):
+        """Run one statement for many parameter rows"""
+        if rows:
+            cur.executemany(query, rows)
+
+    def since(self, column: str) -> str:
+        """SQL condition selecting rows whose column is within a recent window.
+        Takes one parameter, produced by ago()."""
+        raise NotImplementedError
+
+    def ago(self, delta: timedelta) -> Any:
+        """Parameter value for since()"""
+        raise NotImplementedError
+
+    def adapt_timestamp(self, value: Any) -> Any:
+        """Convert a run timestamp into the backend's stored representation"""
+        return value
+
+class PostgresBackend(StorageBackend):
+    name = 'postgres'
+
+    schema_sql = """
+    CREATE TABLE IF NOT EXISTS sites (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) UNIQUE NOT NULL,
+        base_url VARCHAR(500) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS test_runs (
+        id SERIAL PRIMARY KEY,
+        site_id INTEGER REFERENCES sites(id),
+        run_id VARCHAR(100) NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        total_endpoints INTEGER,
+        total_failures INTEGER,
+        total_empty_responses INTEGER,
+        avg_health_score DECIMAL(5,2),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS endpoint_results (
+        id SERIAL PRIMARY KEY,
+        test_run_id INTEGER REFERENCES test_runs(id),
+        endpoint VARCHAR(500) NOT NULL,
+        method VARCHAR(10) NOT NULL,
+        status_code INTEGER,
+        latency INTEGER,
+        response_size INTEGER,
+        is_empty BOOLEAN,
+        success BOOLEAN,
+        health_score INTEGER,
+        error_message TEXT,
+        timestamp TIMESTAMP NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS alerts (
+        id SERIAL PRIMARY KEY,
+        site_id INTEGER REFERENCES sites(id),
+        endpoint VARCHAR(500),
+        alert_type VARCHAR(50) NOT NULL,
+        threshold_value DECIMAL(10,2),
+        current_value DECIMAL(10,2),
+        message TEXT,
+        status VARCHAR(20) DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        resolved_at TIMESTAMP,
+        last_seen_at TIMESTAMP,
+        last_notified_at TIMESTAMP,
+        occurrences INTEGER DEFAULT 1
+    );
+
+    -- Columns added for alert de-duplication on databases created before them
+    ALTER TABLE alerts ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP;
+    ALTER TABLE alerts ADD COLUMN IF NOT EXISTS last_notified_at TIMESTAMP;
+    ALTER TABLE alerts ADD COLUMN IF NOT EXISTS occurrences INTEGER DEFAULT 1;
+
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        role VARCHAR(50) DEFAULT 'viewer',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS user_site_access (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id),
+        site_id INTEGER REFERENCES sites(id),
+        access_level VARCHAR(50) DEFAULT 'read',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, site_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_test_runs_site_timestamp ON test_runs(site_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_endpoint_results_test_run ON endpoint_results(test_run_id);
+    CREATE INDEX IF NOT EXISTS idx_alerts_site_status ON alerts(site_id, status);
+    CREATE INDEX IF NOT EXISTS idx_endpoint_results_low_health ON endpoint_results(timestamp, health_score)
+        INCLUDE (test_run_id, endpoint) WHERE health_score < {low_health};
+    {active_alert_key}
+    """.format(low_health=LOW_HEALTH_THRESHOLD, active_alert_key=ACTIVE_ALERT_KEY_SQL)
+
+    def __init__(self, db_config: dict):
+        import psycopg2
+        self._psycopg2 = psycopg2
+        self.db_config = db_config
+        self.transient_errors = (psycopg2.OperationalError,)
+
+    def initialize(self):
+        psycopg2 = self._psycopg2
+        try:
+            # First try to connect to the database
+            conn = psycopg2.connect(**self.db_config)
+            conn.close()
+        except psycopg2.OperationalError:
+            # Database doesn't exist, create it
+            temp_config = self.db_config.copy()
+            temp_config['database'] = 'postgres'  # Connect to default database
+
+            conn = psycopg2.connect(**temp_config)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE DATABASE {self.db_config['database']}")
+            conn.close()
+
+        # Now create tables if they don't exist
+        with self.transaction() as cur:
+            cur.execute(self.schema_sql)
+
+    def connect(self):
+        return self._psycopg2.connect(**self.db_config)
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    yield cur
+        finally:
+            conn.close()
+
+    def insert_returning_id(self, cur, query: str, params: Sequence) -> int:
+        cur.execute(query + " RETURNING id", params)
+        return cur.fetchone()[0]
+
+    def bulk_insert(self, cur, table: str, columns: Sequence[str], rows: List[Sequence]):
+        if not rows:
+            return
+        from psycopg2.extras import execute_values
+        execute_values(cur, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows, page_size=1000)
+
+    def execute_many(self, cur, query: str, rows: List[Sequence]):
+        if not rows:
+            return
+        from psycopg2.extras import execute_batch
+        execute_batch(cur, query, rows, page_size=1000)
+
+    def since(self, column: str) -> str:
+        return f"{column} >= NOW() - %s"
+
+    def ago(self, delta: timedelta) -> Any:
+        # psycopg2 adapts timedelta to an INTERVAL
+        return delta
+
+class _SqliteCursor:
+    """Cursor wrapper translating %s placeholders to sqlite's ?"""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query: str, params: Sequence = ()):
+        return self._cursor.execute(query.replace('%s', '?'), params)
+
+    def executemany(self, query: str, rows: Iterable[Sequence]):
+        return self._cursor.executemany(query.replace('%s', '?'), rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class SqliteBackend(StorageBackend):
+    name = 'sqlite'
+
+    # Timestamps are stored as naive UTC text so string comparison orders them
+    TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+    schema_sql = """
+    CREATE TABLE IF NOT EXISTS sites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        base_url TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS test_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        site_id INTEGER REFERENCES sites(id),
+        run_id TEXT NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        total_endpoints INTEGER,
+        total_failures INTEGER,
+        total_empty_responses INTEGER,
+        avg_health_score REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS endpoint_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        test_run_id INTEGER REFERENCES test_runs(id),
+        endpoint TEXT NOT NULL,
+        method TEXT NOT NULL,
+        status_code INTEGER,
+        latency INTEGER,
+        response_size INTEGER,
+        is_empty BOOLEAN,
+        success BOOLEAN,
+        health_score INTEGER,
+        error_message TEXT,
+        timestamp TIMESTAMP NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        site_id INTEGER REFERENCES sites(id),
+        endpoint TEXT,
+        alert_type TEXT NOT NULL,
+        threshold_value REAL,
+        current_value REAL,
+        message TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        resolved_at TIMESTAMP,
+        last_seen_at TIMESTAMP,
+        last_notified_at TIMESTAMP,
+        occurrences INTEGER DEFAULT 1
+    );
+
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        role TEXT DEFAULT 'viewer',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS user_site_access (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER REFERENCES users(id),
+        site_id INTEGER REFERENCES sites(id),
+        access_level TEXT DEFAULT 'read',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, site_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_test_runs_site_timestamp ON test_runs(site_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_endpoint_results_test_run ON endpoint_results(test_run_id);
+    CREATE INDEX IF NOT EXISTS idx_alerts_site_status ON alerts(site_id, status);
+    CREATE INDEX IF NOT EXISTS idx_endpoint_results_low_health
+        ON endpoint_results(timestamp, health_score, test_run_id, endpoint) WHERE health_score < {low_health};
+    """.format(low_health=LOW_HEALTH_THRESHOLD)
+
+    # Applied after the tables exist, so older database files pick up new columns first
+    post_schema_sql = ACTIVE_ALERT_KEY_SQL
+
+    added_columns = {
+        'alerts': [('last_seen_at', 'TIMESTAMP'), ('last_notified_at', 'TIMESTAMP'),
+                   ('occurrences', 'INTEGER DEFAULT 1')]
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        self.transient_errors = (sqlite3.OperationalError,)
+        self._local = threading.local()
+
+    def initialize(self):
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(self.schema_sql)
+        for table, columns in self.added_columns.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        conn.executescript(self.post_schema_sql)
+        conn.commit()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _connection(self):
+        # Connections are cheap to keep and sqlite ones are not shareable across
+        # threads, so each thread (processor, write-behind writer) reuses its own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._connection()
+        cur = conn.cursor()
+        try:
+            yield _SqliteCursor(cur)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def insert_returning_id(self, cur, query: str, params: Sequence) -> int:
+        cur.execute(query, params)
+        return cur.lastrowid
+
+    def bulk_insert(self, cur, table: str, columns: Sequence[str], rows: List[Sequence]):
+        if not rows:
+            return
+        placeholders = ', '.join(['%s'] * len(columns))
+        cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    def since(self, column: str) -> str:
+        return f"{column} >= %s"
+
+    def ago(self, delta: timedelta) -> Any:
+        return (datetime.now(timezone.utc).replace(tzinfo=None) - delta).strftime(self.TIMESTAMP_FORMAT)
+
+    def adapt_timestamp(self, value: Any) -> Any:
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return value
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.strftime(self.TIMESTAMP_FORMAT)
+        return value
+
+def create_backend(name: str = None, db_config: dict = None, sqlite_path: str = None) -> StorageBackend:
+    """Build the backend selected by name or the DB_BACKEND environment variable"""
+    name = (name or os.getenv('DB_BACKEND', 'postgres')).lower()
+
+    if name in ('postgres', 'postgresql'):
+        return PostgresBackend(db_config or {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'database': os.getenv('DB_NAME', 'apilens'),
+            'user': os.getenv('DB_USER', 'postgres'),
+            'password': os.getenv('DB_PASSWORD', 'password'),
+            'port': os.getenv('DB_PORT', '5432')
+        })
+
+    if name == 'sqlite':
+        # Relative paths are resolved against the project root, like the .env file
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = sqlite_path or os.getenv('SQLITE_PATH', os.path.join('database', 'apilens.db'))
+        if path != ':memory:' and not os.path.isabs(path):
+            path = os.path.join(project_root, path)
+        return SqliteBackend(path)
+
+    raise ValueError(f"Unknown storage backend: {name}")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+from anomaly_detector import AnomalyDetector
+
+def stats(calls=20, failures=0, latency=200):
+    return {'calls': calls, 'failures': failures, 'latencies': [latency] * calls, 'avg_latency': latency}
+
+def warm_up(detector, runs=10):
+    for i in range(runs):
+        detector.observe_run('shop', {'/cart': stats(latency=200 + (i % 3) * 10)})
+
+def test_latency_spike_opens_and_recovery_resolves():
+    detector = AnomalyDetector(state_path='')
+    warm_up(detector)
+
+    events = detector.observe_run('shop', {'/cart': stats(latency=2000)})
+    assert [(a['endpoint'], a['alert_type']) for a in events['opened']] == [('/cart', 'latency_anomaly')]
+
+    # Still anomalous: no second 'opened' event
+    assert detector.observe_run('shop', {'/cart': stats(latency=2100)})['opened'] == []
+
+    events = {'resolved': []}
+    for _ in range(5):
+        events = detector.observe_run('shop', {'/cart': stats(latency=210)})
+        if events['resolved']:
+            break
+    assert [a['alert_type'] for a in events['resolved']] == ['latency_anomaly']
+
+def test_small_sustained_error_rate_rise_is_caught_by_cusum():
+    detector = AnomalyDetector(state_path='')
+    warm_up(detector)
+
+    # 1 failure in 20 calls stays under a 3-sigma spike but persists
+    opened = []
+    for _ in range(10):
+        opened += detector.observe_run('shop', {'/cart': stats(failures=1)})['opened']
+    assert [a['alert_type'] for a in opened] == ['error_rate_anomaly']
+    assert 'sustained shift' in opened[0]['message']
+
+def test_baselines_persist_across_restarts(tmp_path):
+    path = str(tmp_path / 'state.json')
+    detector = AnomalyDetector(state_path=path)
+    warm_up(detector)
+    detector.save()
+
+    restarted = AnomalyDetector(state_path=path)
+    events = restarted.observe_run('shop', {'/cart': stats(latency=2000)})
+    assert len(events['opened']) == 1
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import asyncio
+import gzip
+import http.client
+import json
+import pytest
+import multi_site_metrics_server
+from async_metrics_server import AsyncMultiSiteMetricsServer
+
+class RecordingProcessor:
+    """Stands in for MultiSiteProcessor, whose gauges can only be registered once per process"""
+
+    def __init__(self):
+        self.anomaly_state = None
+        self.published = []
+        self.exports = []
+        self.closed = False
+
+    def apply_run(self, site, log_file, data, endpoint_stats, timings, export=True, received=None):
+        self.published.append((site, data['runId']))
+
+    def process_log_file(self, site, log_file, export=True):
+        with open(log_file) as f:
+            self.published.append((site, json.load(f)['runId']))
+
+    def export_metrics(self, metrics_file):
+        self.exports.append(metrics_file)
+
+    def close(self):
+        self.closed = True
+
+def write_run(path, run_id):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results = [{'endpoint': f'/api/item/{i % 3}', 'method': 'GET', 'statusCode': 200, 'latency': 100 + i,
+                'responseSize': 10, 'isEmpty': False, 'success': True} for i in range(6)]
+    path.write_text(json.dumps({'runId': run_id, 'timestamp': '2026-10-18T10:00:00Z', 'results': results}))
+
+async def run_until(server, done, timeout=30):
+    stop = asyncio.Event()
+    runner = asyncio.create_task(server.run(stop))
+    for _ in range(int(timeout / 0.05)):
+        if done() or runner.done():
+            break
+        await asyncio.sleep(0.05)
+    stop.set()
+    await runner
+
+def test_sites_are_processed_in_order_and_failures_not_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(multi_site_metrics_server, 'MultiSiteProcessor', RecordingProcessor)
+    logs = tmp_path / 'logs'
+    for site in ('site-a', 'site-b', 'site-c'):
+        for hour in range(10, 14):
+            write_run(logs / site / f'2026-10-18T{hour}-00-00-000Z.json', f'{site}@{hour}')
+    broken = logs / 'site-b' / '2026-10-18T15-00-00-000Z.json'
+    broken.write_text('{"runId": ')
+
+    server = AsyncMultiSiteMetricsServer(workers=1, scan_interval=0.05, metrics_file=str(tmp_path / 'multi_site.prom'))
+    server.logs_dir = str(logs)
+    asyncio.run(run_until(server, lambda: len(server.processor.published) == 12))
+
+    published = server.processor.published
+    assert len(published) == 12 and server.processor.closed
+    for site in ('site-a', 'site-b', 'site-c'):
+        assert [run for s, run in published if s == site] == [f'{site}@{hour}' for hour in range(10, 14)]
+    assert len(server.processed_files) == 12 and str(broken) not in server.processed_files
+    assert server.processor.exports and set(server.processor.exports) == {str(tmp_path / 'multi_site.prom')}
+    assert (logs / 'site-a' / '2026-10-18T10-00-00-000Z.html').exists()
+
+def test_failing_site_task_stops_the_daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(multi_site_metrics_server, 'MultiSiteProcessor', RecordingProcessor)
+    logs = tmp_path / 'logs'
+    for site in ('site-a', 'site-b'):
+        write_run(logs / site / '2026-10-18T10-00-00-000Z.json', f'{site}@10')
+    server = AsyncMultiSiteMetricsServer(workers=1, scan_interval=0.05, metrics_file=str(tmp_path / 'multi_site.prom'))
+    server.logs_dir = str(logs)
+    publish = server.process_log
+
+    def process_log(site, *args):
+        if site == 'site-b':
+            raise RuntimeError('publisher bug')
+        return publish(site, *args)
+    server.process_log = process_log
+
+    with pytest.raises(RuntimeError, match='publisher bug'):
+        asyncio.run(run_until(server, lambda: False))
+    assert server.processor.closed
+    assert all(task.done() for _, task in server._sites.values())
+
+def test_shard_retries_a_failed_log_before_moving_its_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(multi_site_metrics_server, 'MultiSiteProcessor', RecordingProcessor)
+    logs = tmp_path / 'logs' / 'site-a'
+    partial = logs / '2026-10-18T10-00-00-000Z.json'
+    write_run(partial, 'run@10')
+    complete = partial.read_text()
+    partial.write_text(complete[:40])
+    write_run(logs / '2026-10-18T11-00-00-000Z.json', 'run@11')
+
+    server = multi_site_metrics_server.MultiSiteMetricsServer(shard_dir=str(tmp_path / 'shards'), shard_id='a')
+    server.logs_dir = str(tmp_path / 'logs')
+    server.adopt_baselines = lambda site: None
+
+    # The runner is still writing run@10: neither it nor run@11 moves the watermark
+    server.scan_and_process_logs()
+    assert server.processor.published == [] and server.shards.watermark('site-a') is None
+    partial.write_text(complete)
+    server.scan_and_process_logs()
+    assert server.processor.published == [('site-a', 'run@10'), ('site-a', 'run@11')]
+    assert server.shards.watermark('site-a') == '2026-10-18T11-00-00-000Z.json'
+
+    # A log that never becomes readable is skipped after max_attempts scans
+    (logs / '2026-10-18T12-00-00-000Z.json').write_text('{"runId": ')
+    write_run(logs / '2026-10-18T13-00-00-000Z.json', 'run@13')
+    for _ in range(server.max_attempts):
+        server.scan_and_process_logs()
+    assert server.processor.published[-1] == ('site-a', 'run@13')
+    assert server.shards.watermark('site-a') == '2026-10-18T13-00-00-000Z.json'
+
+def post(port, path, body, headers):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('POST', path, body=body, headers=headers)
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read()), response.getheader('Retry-After')
+    connection.close()
+    return result
+
+def test_pushed_runs_are_published_and_backpressured(tmp_path, monkeypatch):
+    monkeypatch.setattr(multi_site_metrics_server, 'MultiSiteProcessor', RecordingProcessor)
+    results = [{'endpoint': '/api/items', 'latency': 120, 'success': True},
+               {'endpoint': '/api/items', 'latency': 300, 'success': False, 'statusCode': 503}]
+    server = AsyncMultiSiteMetricsServer(workers=1, scan_interval=0.05, metrics_file=str(tmp_path / 'multi_site.prom'),
+                                         ingest_port=0)
+    server.logs_dir = str(tmp_path / 'logs')
+    server.ingest_host = '127.0.0.1'
+    responses = []
+
+    async def scenario():
+        stop = asyncio.Event()
+        runner = asyncio.create_task(server.run(stop))
+        while server.ingest is None:
+            await asyncio.sleep(0.01)
+        port = server.ingest.port
+        run = {'runId': 'pushed-1', 'timestamp': '2026-10-18T10:00:00Z', 'results': results}
+        responses.append(await asyncio.to_thread(post, port, '/ingest/site-a', gzip.compress(json.dumps(run).encode()),
+                                                 {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}))
+        ndjson = '\n'.join(json.dumps(result) for result in results)
+        responses.append(await asyncio.to_thread(post, port, '/ingest/site-a?runId=pushed-2', ndjson,
+                                                 {'Content-Type': 'application/x-ndjson'}))
+        responses.append(await asyncio.to_thread(post, port, '/ingest/site-a', json.dumps({'results': [{'endpoint': '/x'}]}),
+                                                 {'Content-Type': 'application/json'}))
+        server.ingest_queue_size = 0
+        responses.append(await asyncio.to_thread(post, port, '/ingest/site-a', json.dumps(run), {'Content-Type': 'application/json'}))
+        stop.set()
+        await runner
+
+    asyncio.run(scenario())
+    accepted, ndjson, invalid, full = responses
+    assert accepted[0] == 202 and accepted[1]['runId'] == 'pushed-1' and accepted[1]['records'] == 2
+    assert ndjson[0] == 202 and ndjson[1]['runId'] == 'pushed-2'
+    assert invalid[0] == 400 and 'latency' in invalid[1]['error']
+    assert full[0] == 429 and full[2] == '1'
+    assert server.processor.published == [('site-a', 'pushed-1'), ('site-a', 'pushed-2')]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import json
+import os
+
+import pytest
+
+from comparison_engine import ComparisonEngine
+from snapshot_loader import SnapshotLoader
+
+def run(failing=(), latency=100):
+    apis = [{'url': f'/api/item/{i}', 'status': 'fail' if i in failing else 'pass',
+             'isEmpty': i == 0, 'latency': latency} for i in range(10)]
+    return {'/api/item/*': apis}
+
+def test_compare_runs_reuses_cached_summaries():
+    engine = ComparisonEngine()
+    comparison = engine.compare_runs(run(failing=(1, 2), latency=300), run(failing=(2,)), 'b', 'a')
+
+    assert comparison['summary']['current_failures'] == 2
+    assert comparison['summary']['previous_failures'] == 1
+    assert comparison['insights'] == ["1 APIs failed today that passed yesterday", "Latency ↑ 200% in /api/item/*"]
+    assert comparison['group_analysis']['/api/item/*']['avg_latency_current'] == 300
+
+    # Cached by snapshot id: the groups passed are not looked at again
+    assert engine.compare_runs({}, {}, 'b', 'a')['summary'] == comparison['summary']
+
+def test_trend_and_week_over_week():
+    engine = ComparisonEngine()
+    summaries = [engine.summarize(run(latency=100), f'day{day}', f'2026-10-{day:02d}T00:00:00Z') for day in range(1, 14)]
+    summaries.append(engine.summarize(run(failing=(3,), latency=400), 'day14', '2026-10-14T00:00:00Z'))
+
+    trend = engine.compare_trend([(s['timestamp'], s) for s in summaries])
+    assert trend['runs'] == 14
+    assert "/api/item/* failing for the first time in 14 runs" in trend['insights']
+
+    weekly = engine.compare_periods(summaries)
+    assert (weekly['current_runs'], weekly['previous_runs']) == (7, 7)
+    assert weekly['summary']['current_failures'] == 1
+
+def test_snapshot_summaries_are_cached_in_sidecar_files(tmp_path, monkeypatch):
+    snapshot = tmp_path / 'snapshot_1.json'
+    snapshot.write_text(json.dumps({'timestamp': '2026-10-01T00:00:00Z', 'apis': run(failing=(1,))['/api/item/*']}))
+    engine = ComparisonEngine()
+
+    summary = SnapshotLoader(str(tmp_path)).load_summary('snapshot_1', engine)
+    assert summary['failures'] == 1
+    assert os.path.exists(str(snapshot) + '.summary')
+
+    # A fresh loader reads the sidecar instead of re-parsing the snapshot
+    with monkeypatch.context() as patch:
+        patch.setattr(SnapshotLoader, 'load_snapshot', lambda self, timestamp: pytest.fail('snapshot re-parsed'))
+        assert SnapshotLoader(str(tmp_path)).load_summary('snapshot_1', engine) == summary
+
+    # Rewriting the snapshot (different size) makes the sidecar stale
+    snapshot.write_text(json.dumps({'apis': run(failing=(1, 2, 3))['/api/item/*']}))
+    assert SnapshotLoader(str(tmp_path)).load_summary('snapshot_1', engine)['failures'] == 3
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+from comparison_engine import ComparisonEngine
+from datetime import datetime, timezone
+from api_stability_tracker import ApiStabilityTracker
+from csv_ingest import aggregate_csv, iter_csv_records, load_tracker, split_ranges, summarize_csv, to_tracker_log
+from endpoint_stats import score_endpoint_stats
+from history_store import HistoryStore
+
+HEADER = 'URL,Method,StatusCode,ResponseTime,IsEmpty,Timestamp\n'
+
+def write_capture(tmp_path, rows=60):
+    lines = [HEADER]
+    for i in range(rows):
+        status = 500 if i % 10 == 0 else 200
+        lines.append(f'"https://shop.test/api/product/{i}?ref=x","GET",{status},{100 + i},'
+                     f'{"true" if i % 20 == 1 else "false"},"2026-10-18T10:{i % 60:02d}:00.000Z"\n')
+    lines.append('"https://shop.test/cart","POST",200,40,false,"2026-10-18T11:00:00.000Z"\n')
+    path = tmp_path / 'capture.csv'
+    path.write_text(''.join(lines))
+    return str(path)
+
+def test_rows_are_parsed_and_grouped_by_pattern(tmp_path):
+    path = write_capture(tmp_path)
+    records = list(iter_csv_records(path))
+    assert len(records) == 61
+    assert records[1] == {'url': 'https://shop.test/api/product/1?ref=x', 'method': 'GET', 'status_code': 200,
+                          'latency': 101, 'is_empty': True, 'timestamp': '2026-10-18T10:01:00.000Z'}
+
+    stats = score_endpoint_stats(aggregate_csv(path, workers=1))
+    assert set(stats) == {'https://shop.test/api/product/*', 'https://shop.test/cart'}
+    product = stats['https://shop.test/api/product/*']
+    assert (product['calls'], product['failures'], product['empty']) == (60, 6, 3)
+
+def test_byte_ranges_cover_every_row_once(tmp_path):
+    path = write_capture(tmp_path)
+    for parts in (2, 3, 7):
+        ranges = split_ranges(path, parts)
+        assert sum(sum(1 for _ in iter_csv_records(path, start, end)) for start, end in ranges) == 61
+    assert aggregate_csv(path, workers=3) == aggregate_csv(path, workers=1)
+
+def test_capture_feeds_tracker_and_summaries(tmp_path):
+    path = write_capture(tmp_path)
+    tracker = load_tracker(path, chunk_size=7)
+    assert len(tracker.logs) == 61
+    assert tracker.logs[0]['endpoint'] == 'https://shop.test/api/product/*'
+
+    summary = summarize_csv(path, ComparisonEngine(), chunk_size=7)
+    assert (summary['total'], summary['failures'], summary['empty']) == (61, 6, 3)
+    assert summary['groups']['https://shop.test/cart']['count'] == 1
+
+def test_capture_scored_from_history_counts_only_empty_rows(tmp_path):
+    path = write_capture(tmp_path)
+    store = HistoryStore(str(tmp_path / 'history'))
+    store.append('shop', (to_tracker_log(record) for record in iter_csv_records(path)))
+
+    scores = ApiStabilityTracker().compute_stability_scores_from_history(
+        store, site='shop', now=datetime(2026, 10, 19, tzinfo=timezone.utc))
+    product = scores['https://shop.test/api/product/*']
+    assert (product['total_calls'], product['failures'], product['empty_responses']) == (60, 6, 3)
+    assert scores['https://shop.test/cart']['empty_responses'] == 0
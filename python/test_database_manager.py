@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from database_manager import DatabaseManager
+from storage_backends import SqliteBackend
+
+def make_run(run_id, minutes_ago=0):
+    ts = (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat().replace('+00:00', 'Z')
+    return {
+        'runId': run_id,
+        'timestamp': ts,
+        'config': {'baseUrl': 'https://example.com'},
+        'results': [
+            {'endpoint': '/get', 'method': 'GET', 'statusCode': 200, 'latency': 120,
+             'responseSize': 512, 'isEmpty': False, 'success': True, 'timestamp': ts},
+            {'endpoint': '/status/500', 'method': 'GET', 'statusCode': 500, 'latency': 900,
+             'responseSize': 0, 'isEmpty': True, 'success': False, 'error': 'HTTP 500', 'timestamp': ts},
+        ]
+    }
+
+def make_db():
+    path = os.path.join(tempfile.mkdtemp(), 'apilens.db')
+    return DatabaseManager(backend=SqliteBackend(path))
+
+def test_sqlite_backend_persists_health_scores():
+    db = make_db()
+    stats = {'/get': {'health_score': 98}, '/status/500': {'health_score': 10}}
+    db.save_test_run('example', make_run('run-1'), stats)
+    
+    history = db.get_historical_data('example', days=1)
+    assert len(history) == 1
+    assert history[0]['run_id'] == 'run-1'
+    assert history[0]['total_failures'] == 1
+    assert history[0]['endpoint_count'] == 2
+    assert history[0]['avg_health_score'] == 54
+    
+    alerts = db.check_health_alerts('example', 70)
+    assert [a['endpoint'] for a in alerts] == ['/status/500']
+
+def test_recent_window_excludes_old_runs():
+    db = make_db()
+    db.save_test_runs([
+        ('example', make_run('old', minutes_ago=3 * 24 * 60), {'/status/500': {'health_score': 10}}),
+        ('example', make_run('new'), {}),
+        ('other', make_run('other'), {}),
+    ])
+    
+    assert [r['run_id'] for r in db.get_historical_data('example', days=1)] == ['new']
+    assert len(db.get_historical_data('example', days=7)) == 2
+    assert db.check_health_alerts('example', 70) == []
+
+def test_historical_reads_are_cached_until_next_save():
+    db = make_db()
+    db.save_test_run('example', make_run('run-1'), {})
+    
+    assert len(db.get_historical_data('example', days=1)) == 1
+    assert len(db.get_historical_data('example', days=1)) == 1
+    assert db.cache_stats()['hits'] == 1
+    assert db.cache_stats()['misses'] == 1
+    
+    # Saving another site leaves the cached entry alone
+    db.save_test_run('other', make_run('run-x'), {})
+    db.get_historical_data('example', days=1)
+    assert db.cache_stats()['hits'] == 2
+    
+    # Saving this site invalidates it
+    db.save_test_run('example', make_run('run-2'), {})
+    assert len(db.get_historical_data('example', days=1)) == 2
+    assert db.cache_stats()['misses'] == 2
+
+def test_health_alerts_are_deduplicated_and_auto_resolved():
+    db = make_db()
+    db.save_test_run('example', make_run('run-1'), {'/get': {'health_score': 50}, '/status/500': {'health_score': 10}})
+    
+    first = db.evaluate_health_alerts('example', 70, cooldown_minutes=30)
+    assert sorted(a['endpoint'] for a in first['opened']) == ['/get', '/status/500']
+    
+    # Same breach on the next scan: no new rows and no repeat notification inside the cooldown
+    second = db.evaluate_health_alerts('example', 70, cooldown_minutes=30)
+    assert second == {'opened': [], 'repeated': [], 'resolved': []}
+    
+    with db.backend.transaction() as cur:
+        cur.execute("SELECT endpoint, occurrences FROM alerts WHERE status = 'active' ORDER BY endpoint")
+        assert cur.fetchall() == [('/get', 2), ('/status/500', 2)]
+    
+    # Cooldown elapsed: still-active alerts are due again
+    assert len(db.evaluate_health_alerts('example', 70, cooldown_minutes=0)['repeated']) == 2
+    
+    # Only /status/500 still breaching: /get resolves
+    outcome = db.upsert_alerts('example', 'health_score', {'/status/500': 10}, 70)
+    assert [a['endpoint'] for a in outcome['resolved']] == ['/get']
+
+def test_health_alerts_follow_each_endpoints_latest_run():
+    db = make_db()
+    db.save_test_run('example', make_run('run-1', minutes_ago=10),
+                     {'/get': {'health_score': 50}, '/status/500': {'health_score': 10}})
+    assert len(db.evaluate_health_alerts('example', 70, cooldown_minutes=0)['opened']) == 2
+    
+    # /get recovered in the next run: it resolves and is not notified again
+    db.save_test_run('example', make_run('run-2'), {'/get': {'health_score': 98}, '/status/500': {'health_score': 10}})
+    outcome = db.evaluate_health_alerts('example', 70, cooldown_minutes=0)
+    assert [a['endpoint'] for a in outcome['resolved']] == ['/get']
+    assert [a['endpoint'] for a in outcome['repeated']] == ['/status/500']
+    assert outcome['opened'] == []
+
+if __name__ == "__main__":
+    test_sqlite_backend_persists_health_scores()
+    test_recent_window_excludes_old_runs()
+    test_historical_reads_are_cached_until_next_save()
+    test_health_alerts_are_deduplicated_and_auto_resolved()
+    test_health_alerts_follow_each_endpoints_latest_run()
+    print("✅ Database manager tests passed")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from api_stability_tracker import ApiStabilityTracker
+from comparison_engine import ComparisonEngine
+from history_store import HistoryStore
+from snapshot_loader import SnapshotLoader
+
+NOW = datetime(2026, 10, 15, tzinfo=timezone.utc)
+
+def calls(endpoint, days_ago, count, failures=0, empty=0):
+    return [{'endpoint': endpoint, 'timestamp': NOW - timedelta(days=days_ago, minutes=i),
+             'status_code': 500 if i < failures else 200,
+             'response_size': 0 if i < empty else 1000, 'latency': 100 + i}
+            for i in range(count)]
+
+def test_stability_scores_match_in_memory_tracker(tmp_path):
+    logs = calls('/api/cart', 2, 40, failures=6) + calls('/api/cart', 10, 80, failures=1) + calls('/api/home', 1, 50, empty=2)
+    store = HistoryStore(str(tmp_path))
+    store.append('shop', logs[:60], source='run-1')
+    store.append('shop', logs[60:], source='run-2')
+    store.append('blog', calls('/api/cart', 1, 10, failures=10))
+
+    # Same windows as compute_stability_scores, evaluated at NOW
+    tracker = ApiStabilityTracker()
+    expected = {endpoint: tracker._analyze_endpoint([log for log in logs if log['endpoint'] == endpoint],
+                                                    NOW - timedelta(days=7), NOW - timedelta(days=14))
+                for endpoint in ('/api/cart', '/api/home')}
+
+    # Reopen: everything is read back from the mapped files
+    reopened = HistoryStore(str(tmp_path))
+    assert reopened.has_source('run-2') and not reopened.has_source('run-3')
+    assert ApiStabilityTracker().compute_stability_scores_from_history(reopened, site='shop', now=NOW) == expected
+
+def test_comparison_summaries_from_history(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append('shop', calls('/api/products/1', 1, 10, failures=2) + calls('/api/products/2', 8, 10))
+
+    engine = ComparisonEngine()
+    pattern = SnapshotLoader(str(tmp_path / 'snapshots'), use_catalog=False)._detect_pattern
+    this_week = engine.summarize_history(store, NOW - timedelta(days=7), NOW, pattern)
+    last_week = engine.summarize_history(store, NOW - timedelta(days=14), NOW - timedelta(days=7), pattern)
+
+    assert this_week['groups']['/api/products/*']['count'] == 10
+    assert this_week['failed_apis'] == ['/api/products/1']
+    comparison = engine.compare_summaries(this_week, last_week)
+    assert comparison['insights'] == ["1 APIs failed today that passed yesterday"]
+
+def test_failed_append_leaves_the_string_dictionary_intact(tmp_path):
+    store = HistoryStore(str(tmp_path))
+
+    def broken():
+        yield from calls('/api/new', 1, 2)
+        raise KeyError('isEmpty')
+    try:
+        store.append('site0', broken())
+    except KeyError:
+        pass
+    store.append('site1', calls('/a', 1, 1) + calls('/b', 1, 1))
+
+    reopened = HistoryStore(str(tmp_path))
+    rows = reopened.columns()
+    assert [reopened.string(s) for s in rows['site']] == ['site1', 'site1']
+    assert [reopened.string(e) for e in rows['endpoint']] == ['/a', '/b']
+
+def test_source_imported_by_another_process_is_not_appended_twice(tmp_path):
+    first, second = HistoryStore(str(tmp_path)), HistoryStore(str(tmp_path))
+    assert first.append('shop', calls('/api/cart', 1, 5), source='run-1') == 5
+    # second's view of the sources is stale, but the check inside the lock is not
+    assert not second.has_source('run-1')
+    assert second.append('shop', calls('/api/cart', 1, 5), source='run-1') == 0
+    assert HistoryStore(str(tmp_path)).row_count() == 5
+
+def append_runs(path, site, runs):
+    store = HistoryStore(path)
+    for run in range(runs):
+        store.append(site, calls(f'/api/{site}/{run % 7}', 1, 20), source=f'{site}-{run}')
+    store.close()
+
+def test_concurrent_appenders_do_not_overwrite_each_other(tmp_path):
+    sites = [f'site-{i}' for i in range(4)]
+    with ProcessPoolExecutor(max_workers=len(sites)) as pool:
+        list(pool.map(append_runs, [str(tmp_path)] * len(sites), sites, [25] * len(sites)))
+
+    store = HistoryStore(str(tmp_path))
+    assert store.row_count() == len(sites) * 25 * 20
+    assert all(store.has_source(f'{site}-24') for site in sites)
+    rows = store.columns()
+    for site in sites:
+        site_id = store.string_id(site)
+        endpoints = {store.string(e) for s, e in zip(rows['site'], rows['endpoint']) if s == site_id}
+        assert endpoints == {f'/api/{site}/{n}' for n in range(7)}
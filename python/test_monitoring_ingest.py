@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import json
+
+from monitoring_ingest import iter_monitoring_logs, load_tracker
+
+def call(ts, url, call_type='SUCCESS', status=200, **extra):
+    item = {'timestamp': ts, 'url': url, 'method': 'GET', 'statusCode': status, 'page': 'Home', 'type': call_type}
+    if call_type != 'READ_ERROR':
+        item['isEmpty'] = call_type == 'EMPTY_RESPONSE'
+    item.update(extra)
+    return item
+
+def write_runs(tmp_path):
+    pixel = [call(f'2026-10-18T10:00:0{i}Z', f'https://www.facebook.com/tr/?id=1&ts={i}', 'EMPTY_RESPONSE')
+             for i in range(3)]
+    failure = call('2026-10-18T10:00:05Z', 'https://shop.test/api/cart/42', status=503)
+    read_error = call('2026-10-18T10:00:06Z', 'https://shop.test/collect?v=2', 'READ_ERROR', 204, error='Response read error')
+    ok = call('2026-10-18T10:00:07Z', 'https://shop.test/api/cart/7')
+    runs = [
+        {'timestamp': '2026-10-18T10:00:00Z', 'httpFailures': [failure], 'emptyResponses': pixel,
+         'successfulCalls': [ok], 'totalAPIs': 6, 'apiDetails': pixel + [failure, read_error, ok]},
+        {'timestamp': '2026-10-18T11:00:00Z', 'httpFailures': [], 'emptyResponses': [], 'totalAPIs': 0},
+    ]
+    path = tmp_path / 'monitoring.json'
+    path.write_text(json.dumps(runs, indent=2))
+    return str(path)
+
+def test_calls_are_flattened_once_per_run(tmp_path):
+    logs = list(iter_monitoring_logs(write_runs(tmp_path)))
+    assert len(logs) == 6
+    # httpFailures come first, then the pixel hits, all collapsed to one pattern
+    assert [log['endpoint'] for log in logs[1:4]] == ['https://www.facebook.com/tr/'] * 3
+    assert logs[1] == {'endpoint': 'https://www.facebook.com/tr/', 'timestamp': '2026-10-18T10:00:00Z',
+                       'status_code': 200, 'response_size': 0, 'latency': 0, 'is_empty': True}
+    # Read errors have no body to score
+    assert [log['is_empty'] for log in logs if log['endpoint'] == 'https://shop.test/collect'] == [True]
+
+def test_tracker_scores_patterns(tmp_path):
+    tracker = load_tracker(write_runs(tmp_path), chunk_size=2)
+    assert sorted({log['endpoint'] for log in tracker.logs}) == [
+        'https://shop.test/api/cart/*', 'https://shop.test/collect', 'https://www.facebook.com/tr/']
+    cart = [log for log in tracker.logs if log['endpoint'] == 'https://shop.test/api/cart/*']
+    assert [log['status_code'] for log in cart] == [503, 200]
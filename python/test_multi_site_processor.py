@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import json
+from multi_site_processor import iter_loaded_runs, load_run, resolve_batch_inputs
+
+def write_run(path, run_id, failures=1):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results = [{'endpoint': f'/api/item/{i % 3}', 'method': 'GET', 'statusCode': 500 if i < failures else 200,
+                'latency': 100 + i, 'responseSize': 10, 'isEmpty': False, 'success': i >= failures,
+                'timestamp': '2026-10-18T10:00:00Z'} for i in range(6)]
+    path.write_text(json.dumps({'runId': run_id, 'timestamp': '2026-10-18T10:00:00Z', 'results': results}))
+    return str(path)
+
+def test_batch_inputs_from_globs_and_manifest(tmp_path):
+    logs = tmp_path / 'logs'
+    a2 = write_run(logs / 'site-a' / '2026-10-18T11.json', 'a2')
+    a1 = write_run(logs / 'site-a' / '2026-10-18T10.json', 'a1')
+    b1 = write_run(logs / 'site-b' / '2026-10-18T10.json', 'b1')
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps({'renamed': 'logs/site-b/*.json'}))
+
+    runs = resolve_batch_inputs([str(logs / '*' / '*.json'), f"site-c={a1}"], str(manifest))
+    assert runs == [('site-a', a1), ('site-a', a2), ('site-b', b1), ('site-c', a1), ('renamed', b1)]
+
+def test_runs_load_in_order_and_errors_are_returned(tmp_path):
+    good = write_run(tmp_path / 'good.json', 'good', failures=2)
+    bad = tmp_path / 'bad.json'
+    bad.write_text('{"runId": ')
+
+    loaded = list(iter_loaded_runs([('site', good), ('site', str(bad))], workers=1))
+    (data, stats, timings), error = loaded[0]
+    assert error is None and data['runId'] == 'good'
+    assert sum(s['failures'] for s in stats.values()) == 2
+    assert set(timings) == {'parse', 'aggregate', 'html'}
+    assert (tmp_path / 'good.html').exists()
+    assert loaded[1][0] is None and isinstance(loaded[1][1], ValueError)
+    assert load_run('site', good)[0]['runId'] == 'good'
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from notification_dispatcher import NotificationDispatcher, EmailChannel, SlackChannel
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages (no TLS, no auth)"""
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b"220 stub ESMTP\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith(b"DATA"):
+                self.wfile.write(b"354 go ahead\r\n")
+                body = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    body.append(data_line)
+                self.server.messages.append(b"".join(body).decode())
+                self.wfile.write(b"250 queued\r\n")
+            elif command.startswith(b"QUIT"):
+                self.wfile.write(b"221 bye\r\n")
+                return
+            elif command.startswith(b"EHLO"):
+                self.wfile.write(b"250 stub\r\n")
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.server.payloads.append(json.loads(self.rfile.read(length)))
+        self.send_response(200)
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+def start_stubs():
+    smtp = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StubSMTPHandler)
+    smtp.daemon_threads = True
+    smtp.connections, smtp.messages = 0, []
+    http = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+    http.payloads = []
+    for server in (smtp, http):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return smtp, http
+
+def test_alerts_are_coalesced_per_site_over_reused_connections():
+    smtp, http = start_stubs()
+    email = EmailChannel('127.0.0.1', smtp.server_address[1], '', '', 'ops@example.com', starttls=False)
+    slack = SlackChannel(f"http://127.0.0.1:{http.server_address[1]}/hook", timeout=2)
+    dispatcher = NotificationDispatcher([email, slack], coalesce_window=30, rate_per_minute=100)
+    
+    for i in range(5):
+        assert dispatcher.notify('shop', f"endpoint /api/{i} unhealthy")
+    dispatcher.notify('blog', "endpoint /feed unhealthy")
+    dispatcher.close()
+    
+    assert len(http.payloads) == 2
+    assert len(smtp.messages) == 2
+    assert smtp.connections == 1
+    shop = next(p for p in http.payloads if p['attachments'][0]['fields'][0]['title'] == 'Site: shop')
+    assert "5 alert notifications for shop" in shop['attachments'][0]['fields'][0]['value']
+    
+    smtp.shutdown()
+    http.shutdown()
+
+def test_rate_limit_holds_digests_back():
+    class RecordingChannel:
+        name = 'recording'
+        def __init__(self):
+            self.sent = []
+        def send(self, site, message):
+            self.sent.append(site)
+        def close(self):
+            pass
+    
+    channel = RecordingChannel()
+    dispatcher = NotificationDispatcher([channel], coalesce_window=0, rate_per_minute=1)
+    for site in ('a', 'b', 'c'):
+        dispatcher.notify(site, 'down')
+    time.sleep(0.5)
+    
+    # One send per minute: the first digest goes out, the others wait for budget
+    assert len(channel.sent) == 1
+    assert dispatcher.stats['rate_limited'] > 0
+    dispatcher.close()
+    assert len(channel.sent) == 1
+
+if __name__ == "__main__":
+    test_alerts_are_coalesced_per_site_over_reused_connections()
+    test_rate_limit_holds_digests_back()
+    print("✅ Notification dispatcher tests passed")
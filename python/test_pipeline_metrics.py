@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from pipeline_metrics import record_ingest_lag, timed_stage
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_stage_timer_records_duration_and_throughput():
+    count_before = sample('apilens_pipeline_stage_seconds_count', stage='test_parse')
+    records_before = sample('apilens_pipeline_records_total', stage='test_parse')
+
+    with timed_stage('test_parse') as stage:
+        time.sleep(0.01)
+        stage.records = 500
+
+    assert sample('apilens_pipeline_stage_seconds_count', stage='test_parse') == count_before + 1
+    assert sample('apilens_pipeline_stage_seconds_sum', stage='test_parse') >= 0.01
+    assert sample('apilens_pipeline_records_total', stage='test_parse') == records_before + 500
+    assert 0 < sample('apilens_pipeline_records_per_second', stage='test_parse') <= 50000
+
+def test_failed_stage_counts_time_but_not_records():
+    with pytest.raises(RuntimeError):
+        with timed_stage('test_fail', 100):
+            raise RuntimeError('db down')
+    assert sample('apilens_pipeline_stage_seconds_count', stage='test_fail') == 1
+    assert sample('apilens_pipeline_records_total', stage='test_fail') == 0
+
+def test_ingest_lag_uses_file_mtime(tmp_path):
+    log_file = tmp_path / 'run.json'
+    log_file.write_text('{}')
+    os.utime(log_file, (time.time() - 120, time.time() - 120))
+    record_ingest_lag('lag-site', str(log_file))
+    assert 119 <= sample('apilens_ingest_lag_seconds', site='lag-site') < 130
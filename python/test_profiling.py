@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+from profiling import RunProfiler, SamplingProfiler, pop_flag, profile_if_requested
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    data = []
+    while time.perf_counter() < end:
+        data.append(sum(range(1000)))
+    return data
+
+def test_profile_flag_is_removed_from_argv():
+    argv = ['run_analysis.py', 'analyze', '--profile=/tmp/x', 'out.json']
+    assert pop_flag('--profile', argv) == '/tmp/x'
+    assert argv == ['run_analysis.py', 'analyze', 'out.json']
+    assert pop_flag('--profile', argv) is None
+
+    argv = ['stability_monitor.py', '--profile']
+    assert isinstance(profile_if_requested('test', argv), RunProfiler)
+    assert argv == ['stability_monitor.py']
+
+def test_run_profiler_writes_pstats_and_report(tmp_path):
+    with RunProfiler('unit', str(tmp_path)) as profiler:
+        busy(0.05)
+    report = open(profiler.report_path).read()
+    assert profiler.stats_path.endswith('.pstats')
+    assert 'busy' in report
+    assert 'allocation sites' in report
+
+def test_sampling_profiler_dumps_collapsed_stacks(tmp_path):
+    profiler = SamplingProfiler(interval=0.005).start()
+    worker = threading.Thread(target=busy, args=(0.2,))
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+    summary = open(profiler.dump('unit', str(tmp_path))).read()
+    assert 'busy (test_profiling.py' in summary
+    collapsed = next(tmp_path.glob('*.collapsed')).read_text()
+    assert collapsed.strip().splitlines()[0].rsplit(' ', 1)[1].isdigit()
+    # A dump starts a new window
+    assert profiler.take()[1] == 0
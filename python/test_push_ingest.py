@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import gzip
+import json
+import pytest
+from push_ingest import IngestError, prepare_pushed_run, valid_site
+
+def test_runs_are_normalized_and_aggregated():
+    ndjson = '\n'.join(json.dumps(r) for r in [{'endpoint': '/a', 'latency': 100, 'success': True},
+                                                {'endpoint': '/a', 'latency': 300, 'success': False, 'isEmpty': True}])
+    data, stats, timings = prepare_pushed_run('site', gzip.compress(ndjson.encode()), 'application/x-ndjson; charset=utf-8',
+                                              'gzip', {'runId': 'r1', 'timestamp': '2026-10-18T10:00:00Z'})
+    assert data['runId'] == 'r1'
+    assert data['results'][1] == {'endpoint': '/a', 'latency': 300, 'success': False, 'isEmpty': True, 'method': 'GET',
+                                  'statusCode': 500, 'responseSize': 0, 'timestamp': '2026-10-18T10:00:00Z'}
+    assert stats['/a']['calls'] == 2 and stats['/a']['failures'] == 1 and stats['/a']['empty'] == 1
+    assert set(timings) == {'parse', 'aggregate'}
+
+@pytest.mark.parametrize('body, content_type, encoding, status', [
+    (b'{"results": []}', 'application/json', '', 400),
+    (b'{"results": [{"endpoint": "/a", "latency": -1, "success": true}]}', 'application/json', '', 400),
+    (b'{"results": [{"endpoint": "/a", "latency": NaN, "success": true}]}', 'application/json', '', 400),
+    (b'{"results": ', 'application/json', '', 400),
+    (b'endpoint,latency', 'text/csv', '', 415),
+    (b'{}', 'application/json', 'br', 415),
+    (gzip.compress(b' ' * 2048), 'application/json', 'gzip', 413),
+    (gzip.compress(b'{"results": []}')[:-8], 'application/json', 'gzip', 400),
+])
+def test_bad_payloads_are_rejected(body, content_type, encoding, status):
+    with pytest.raises(IngestError) as error:
+        prepare_pushed_run('site', body, content_type, encoding, max_bytes=1024)
+    assert error.value.status == status
+
+def test_site_names_stay_in_one_path_segment():
+    assert valid_site('shop-eu_1.prod')
+    assert not any(valid_site(site) for site in ('', '.replay', '../etc', 'a/b'))
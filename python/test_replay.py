@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import json
+from datetime import datetime, timezone
+from replay import discover_runs, replay, replay_site
+from workload_generator import WorkloadGenerator
+
+AS_OF = datetime(2026, 1, 3, tzinfo=timezone.utc)
+
+def make_logs(tmp_path):
+    WorkloadGenerator(sites=2, templates=5, runs=30, calls_per_run=40, seed=7,
+                      start=datetime(2025, 12, 20, tzinfo=timezone.utc), interval_minutes=360
+                      ).write(str(tmp_path), formats=('logs',))
+    return str(tmp_path / 'logs')
+
+def test_resumed_replay_matches_a_full_replay(tmp_path):
+    runs = discover_runs(make_logs(tmp_path))
+    paths = runs['site-01']
+    as_of_ms = int(AS_OF.timestamp() * 1000)
+    (tmp_path / 'full').mkdir()
+    (tmp_path / 'resumed').mkdir()
+
+    full = replay_site('site-01', paths, as_of_ms, str(tmp_path / 'full'), checkpoint_every=7)
+    replay_site('site-01', paths[:13], as_of_ms, str(tmp_path / 'resumed'), checkpoint_every=7)
+    resumed = replay_site('site-01', paths, as_of_ms, str(tmp_path / 'resumed'), checkpoint_every=7, resume=True)
+
+    assert full['runs'] == 30 and full['last_file'] == paths[-1].rsplit('/', 1)[1]
+    assert resumed == full
+    assert full['anomaly'] and full['stability']
+    assert all(key.startswith('site-01\t') for key in full['anomaly'])
+
+def test_replay_writes_rebuilt_state(tmp_path):
+    logs_dir = make_logs(tmp_path)
+    state = tmp_path / 'anomaly.json'
+    state.write_text(json.dumps({'version': 1, 'series': {'other\t/api/x\tlatency': [9, 1.0, 0.0, 0.0, False],
+                                                          'site-02\t/stale\tlatency': [9, 1.0, 0.0, 0.0, False]}}))
+
+    results = replay(logs_dir, workers=1, as_of=AS_OF, anomaly_state=str(state),
+                     stability_file=str(tmp_path / 'stability.json'), metrics_file=str(tmp_path / 'replay.prom'))
+
+    assert sorted(results) == ['site-01', 'site-02']
+    series = json.loads(state.read_text())['series']
+    assert 'other\t/api/x\tlatency' in series and 'site-02\t/stale\tlatency' not in series
+    assert any(key.startswith('site-02\t') for key in series)
+    stability = json.loads((tmp_path / 'stability.json').read_text())
+    assert stability and all(0 <= s['score'] <= 100 for s in stability.values())
+    assert 'apilens_health_score{endpoint=' in (tmp_path / 'replay.prom').read_text()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import tempfile
+from pathlib import Path
+from rule_engine import AlertRule, RuleEngine, load_rules
+
+def stats(calls=10, failures=0, empty=0, latency=100):
+    return {'calls': calls, 'failures': failures, 'empty': empty,
+            'latencies': [latency] * calls, 'avg_latency': latency}
+
+def test_threshold_and_rate_rules_fire_on_first_breach():
+    engine = RuleEngine([
+        AlertRule('latency', 'avg_latency', '>', 5000),
+        AlertRule('failure_rate', 'failure_rate', '>', 0.1),
+    ])
+    events = engine.evaluate('shop', {
+        '/slow': stats(latency=8000),
+        '/flaky': stats(failures=5),
+        '/ok': stats(),
+    }, now=0)
+    
+    assert sorted((a['alert_type'], a['endpoint']) for a in events['opened']) == [
+        ('failure_rate', '/flaky'), ('latency', '/slow')]
+    assert events['resolved'] == []
+
+def test_duration_rule_needs_consecutive_runs():
+    engine = RuleEngine([AlertRule('empty', 'empty_rate', '>=', 0.5, for_runs=3)], renotify_seconds=60)
+    empty = {'/feed': stats(empty=10)}
+    
+    assert engine.evaluate('blog', empty, now=0)['opened'] == []
+    assert engine.evaluate('blog', empty, now=1)['opened'] == []
+    assert len(engine.evaluate('blog', empty, now=2)['opened']) == 1
+    
+    # Still firing: no repeat until renotify_seconds have passed
+    assert engine.evaluate('blog', empty, now=30)['repeated'] == []
+    assert len(engine.evaluate('blog', empty, now=90)['repeated']) == 1
+    
+    # Recovery resolves the alert and resets the streak
+    assert len(engine.evaluate('blog', {'/feed': stats()}, now=100)['resolved']) == 1
+    assert engine.evaluate('blog', empty, now=101)['opened'] == []
+
+def test_untouched_endpoints_keep_their_state():
+    engine = RuleEngine([AlertRule('latency', 'avg_latency', '>', 5000)])
+    engine.evaluate('shop', {'/slow': stats(latency=8000)}, now=0)
+    
+    events = engine.evaluate('shop', {'/other': stats()}, now=1)
+    assert events == {'opened': [], 'repeated': [], 'resolved': []}
+
+def test_default_rules_file_loads():
+    names = [rule.name for rule in load_rules()]
+    assert 'latency' in names and 'failure_rate' in names
+
+def test_state_file_carries_streaks_across_processes(tmp_path):
+    state_path = str(tmp_path / 'rule_state.json')
+    rules = [AlertRule('empty', 'empty_rate', '>=', 0.5, for_runs=3)]
+    empty = {'/feed': stats(empty=10)}
+    
+    # One engine per processed log file, as when each run starts a new process
+    def run(endpoint_stats, now):
+        engine = RuleEngine(rules, renotify_seconds=60, state_path=state_path)
+        events = engine.evaluate('blog', endpoint_stats, now=now)
+        engine.save()
+        return events
+    
+    assert run(empty, 0)['opened'] == []
+    assert run(empty, 1)['opened'] == []
+    assert len(run(empty, 2)['opened']) == 1
+    assert run(empty, 30) == {'opened': [], 'repeated': [], 'resolved': []}
+    assert len(run({'/feed': stats()}, 40)['resolved']) == 1
+    
+    # Without a state file every engine starts over
+    assert RuleEngine(rules).export_state() == {'streaks': {}, 'notified': {}}
+
+if __name__ == "__main__":
+    test_threshold_and_rate_rules_fire_on_first_breach()
+    test_duration_rule_needs_consecutive_runs()
+    test_untouched_endpoints_keep_their_state()
+    test_default_rules_file_loads()
+    test_state_file_carries_streaks_across_processes(Path(tempfile.mkdtemp()))
+    print("✅ Rule engine tests passed")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sharding import HashRing, ShardCoordinator
+
+SITES = [f"site-{i:02d}" for i in range(40)]
+
+def test_ring_spreads_sites_and_moves_few_on_join():
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b', 'c', 'd'])
+    owners = [before.owner(site) for site in SITES]
+    assert all(owners.count(node) >= 5 for node in 'abc')
+    moved = [site for site in SITES if before.owner(site) != after.owner(site)]
+    assert moved and all(after.owner(site) == 'd' for site in moved)
+
+def test_sites_are_handed_over_on_join_and_taken_over_on_death(tmp_path):
+    a = ShardCoordinator(str(tmp_path), 'a', ttl=0.5)
+    assert a.rebalance(SITES) == (set(SITES), set())
+
+    b = ShardCoordinator(str(tmp_path), 'b', ttl=0.5)
+    assert b.rebalance(SITES) == (set(), set())  # a still holds every claim
+    _, released = a.rebalance(SITES)
+    acquired, _ = b.rebalance(SITES)
+    assert released and acquired == released
+    assert a.owned.isdisjoint(b.owned) and a.owned | b.owned == set(SITES)
+
+    kept = sorted(a.owned)
+    a.advance(kept[0], '2026-10-18T10-00-00-000Z.json')
+
+    # a stops heartbeating: once its leases expire, b claims its sites and continues from the watermark
+    time.sleep(0.6)
+    acquired, _ = b.rebalance(SITES)
+    assert acquired == set(kept) and b.owned == set(SITES)
+    assert b.watermark(kept[0]) == '2026-10-18T10-00-00-000Z.json'
+    assert not a.holds(kept[0])
+
+def test_racing_claims_have_one_winner_and_lost_claims_are_not_overwritten(tmp_path):
+    shards = [ShardCoordinator(str(tmp_path), f"shard-{i}", ttl=0.5) for i in range(8)]
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        winners = list(pool.map(lambda shard: shard.try_claim('site-00'), shards))
+    assert winners.count(True) == 1
+
+    a, b = shards[winners.index(True)], shards[winners.index(False)]
+    a.owned.add('site-00')
+    assert a.advance('site-00', '2026-10-18T10-00-00-000Z.json')
+
+    # a stalls past its ttl and b takes over; a's late progress must not reclaim the site
+    time.sleep(0.6)
+    assert b.try_claim('site-00')
+    assert not a.advance('site-00', '2026-10-18T11-00-00-000Z.json')
+    assert 'site-00' not in a.owned
+    assert b.holds('site-00') and b.watermark('site-00') == '2026-10-18T10-00-00-000Z.json'
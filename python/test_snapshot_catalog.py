@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import json
+import os
+
+from snapshot_loader import SnapshotLoader
+
+def write_raw(directory, name, apis):
+    with open(os.path.join(directory, f"{name}.json"), 'w') as f:
+        json.dump(apis, f)
+
+def test_latest_and_range_lookups_use_the_catalog(tmp_path):
+    loader = SnapshotLoader(str(tmp_path), shard_by_date=True)
+    for day in range(1, 11):
+        loader.write_snapshot(f"2024-06-{day:02d}T10-00-00-000Z", [{'api': '/api/a', 'status': 'pass'}])
+
+    assert os.path.isdir(tmp_path / '2024' / '06' / '05')
+    assert loader.get_latest_snapshots(2) == ['2024-06-10T10-00-00-000Z', '2024-06-09T10-00-00-000Z']
+    assert loader.get_snapshots_between('2024-06-03', '2024-06-04') == [
+        '2024-06-03T10-00-00-000Z', '2024-06-04T10-00-00-000Z']
+    assert loader.catalog.get('2024-06-01T10-00-00-000Z')['records'] == 1
+    assert loader.load_snapshot('2024-06-05T10-00-00-000Z') == [{'api': '/api/a', 'status': 'pass'}]
+
+def test_files_written_by_other_tools_are_discovered(tmp_path):
+    loader = SnapshotLoader(str(tmp_path))
+    write_raw(str(tmp_path), 'snapshot_2024-06-01T10-00-00', [])
+    assert loader.get_latest_snapshots(5) == ['snapshot_2024-06-01T10-00-00']
+
+    # Unchanged directory: nothing is rescanned
+    assert loader.catalog.refresh() == 0
+
+    write_raw(str(tmp_path), 'snapshot_2024-06-02T10-00-00', [])
+    os.remove(tmp_path / 'snapshot_2024-06-01T10-00-00.json')
+    assert loader.get_latest_snapshots(5) == ['snapshot_2024-06-02T10-00-00']
+
+    # A fresh loader reuses the persisted catalog
+    assert SnapshotLoader(str(tmp_path)).catalog.count() == 1
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import os
+
+import pytest
+
+from comparison_engine import ComparisonEngine
+from snapshot_formats import convert_directory, read_snapshot, write_snapshot
+from snapshot_loader import SnapshotLoader
+
+SNAPSHOT = {
+    'timestamp': '2024-06-25T14:30:00Z',
+    'runId': '2024-06-25T14-30-00-000Z',
+    'apis': [
+        {'url': '/api/products/123', 'status': 'pass', 'statusCode': 200, 'isEmpty': False, 'latency': 240, 'size': 1345},
+        {'url': '/api/products/456', 'status': 'fail', 'statusCode': 500, 'isEmpty': True, 'latency': 1200.5, 'size': 0},
+        {'url': '/api/cart/add', 'status': 'pass', 'statusCode': 200, 'latency': 300, 'size': None},
+    ]
+}
+
+@pytest.mark.parametrize('extension', ['.json', '.ndjson.gz', '.cols'])
+def test_formats_round_trip(tmp_path, extension):
+    path = str(tmp_path / f"snapshot{extension}")
+    write_snapshot(path, SNAPSHOT)
+    assert read_snapshot(path) == SNAPSHOT
+
+def test_loader_detects_converted_snapshots_transparently(tmp_path):
+    SnapshotLoader(str(tmp_path)).write_snapshot('2024-06-25T14-30-00-000Z', SNAPSHOT)
+    expected = ComparisonEngine().summarize(SnapshotLoader(str(tmp_path)).group_apis_by_pattern(SNAPSHOT),
+                                            timestamp=SNAPSHOT['timestamp'])
+
+    totals = convert_directory(str(tmp_path), 'cols')
+    assert totals['files'] == 1 and totals['bytes_after'] < totals['bytes_before']
+    assert not os.path.exists(tmp_path / '2024-06-25T14-30-00-000Z.json')
+
+    loader = SnapshotLoader(str(tmp_path))
+    assert loader.get_latest_snapshots(1) == ['2024-06-25T14-30-00-000Z']
+    assert loader.load_snapshot('2024-06-25T14-30-00-000Z') == SNAPSHOT
+    # Columnar snapshots are summarized without building per-API dicts
+    assert loader.load_summary('2024-06-25T14-30-00-000Z', ComparisonEngine()) == expected
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import json
+from datetime import datetime, timezone
+
+from csv_ingest import iter_csv_records
+from history_store import HistoryStore
+from monitoring_ingest import iter_monitoring_calls
+from snapshot_loader import SnapshotLoader
+from workload_generator import WorkloadGenerator
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+def generator(**overrides):
+    options = dict(sites=2, templates=8, runs=4, calls_per_run=50, regressions=2, seed=7, start=START)
+    options.update(overrides)
+    return WorkloadGenerator(**options)
+
+def test_every_format_is_readable(tmp_path):
+    manifest = generator().write(str(tmp_path), snapshot_format='cols')
+    assert manifest['calls'] == 2 * 4 * 50
+
+    assert sum(1 for _ in iter_csv_records(str(tmp_path / 'capture.csv'))) == 400
+    assert sum(1 for _ in iter_monitoring_calls(str(tmp_path / 'monitoring.json'))) == 400
+    assert HistoryStore(str(tmp_path / 'history')).row_count() == 400
+
+    log_files = sorted((tmp_path / 'logs' / 'site-01').iterdir())
+    assert len(log_files) == 4
+    assert len(json.loads(log_files[0].read_text())['results']) == 50
+
+    loader = SnapshotLoader(str(tmp_path / 'snapshots' / 'site-02'))
+    latest = loader.get_latest_snapshots(10)
+    assert len(latest) == 4
+    assert len(loader.load_snapshot(latest[0])['apis']) == 50
+
+def test_same_seed_same_data_and_regressions_apply():
+    a, b = generator(), generator()
+    assert list(a.iter_run('site-01', 3)) == list(b.iter_run('site-01', 3))
+    assert list(a.iter_run('site-01', 3)) != list(generator(seed=8).iter_run('site-01', 3))
+
+    gen = generator(templates=3, runs=10, calls_per_run=2000, regressions=1, regression_factor=5.0)
+    regression = gen.regressions[0]
+    assert regression['kind'] == 'errors'
+
+    def failure_rate(run):
+        calls = [r for r in gen.iter_run(regression['site'], run)
+                 if r['endpoint'].startswith(regression['template'].split('{')[0])]
+        return sum(not r['success'] for r in calls) / len(calls)
+
+    assert failure_rate(regression['from_run']) > 3 * failure_rate(0)
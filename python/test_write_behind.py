@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+from sqlite3 import OperationalError
+from types import SimpleNamespace
+from write_behind import WriteBehindQueue
+
+class FlakyDatabase:
+    """Stand-in for DatabaseManager that can be switched offline"""
+    backend = SimpleNamespace(transient_errors=(OperationalError,))
+    
+    def __init__(self):
+        self.online = True
+        self.batches = []
+    
+    def save_test_runs(self, runs):
+        if not self.online:
+            raise OperationalError("could not connect to server")
+        self.batches.append(list(runs))
+        return list(range(len(runs)))
+
+def make_run(i):
+    return {'runId': f'run-{i}', 'timestamp': '2025-06-25T10:00:00Z', 'results': []}
+
+def test_runs_are_batched_into_one_transaction():
+    db = FlakyDatabase()
+    committed_sites = []
+    writer = WriteBehindQueue(db, batch_size=10, flush_interval=0.2,
+                              journal_path=os.path.join(tempfile.mkdtemp(), 'journal.jsonl'),
+                              on_commit=committed_sites.extend).start()
+    for i in range(5):
+        writer.submit('site-a' if i % 2 else 'site-b', make_run(i), {})
+    writer.stop()
+    
+    assert sum(len(b) for b in db.batches) == 5
+    assert len(db.batches) < 5
+    assert sorted(set(committed_sites)) == ['site-a', 'site-b']
+
+def test_outage_spills_to_journal_and_replays():
+    db = FlakyDatabase()
+    journal = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    writer = WriteBehindQueue(db, max_retries=2, backoff_base=0.01, journal_path=journal)
+    
+    db.online = False
+    writer.submit('site-a', make_run(1), {'/get': {'health_score': 90}})
+    writer.flush()
+    assert os.path.exists(journal)
+    assert writer.stats['retries'] == 2
+    assert writer.stats['spilled'] == 1
+    
+    db.online = True
+    writer.submit('site-a', make_run(2), {})
+    writer.flush()
+    assert not os.path.exists(journal)
+    assert writer.stats['replayed'] == 1
+    saved = [run['runId'] for batch in db.batches for _, run, _ in batch]
+    assert saved == ['run-2', 'run-1']
+
+def test_stop_does_not_wait_out_the_batch_window():
+    db = FlakyDatabase()
+    writer = WriteBehindQueue(db, flush_interval=5.0,
+                              journal_path=os.path.join(tempfile.mkdtemp(), 'journal.jsonl')).start()
+    writer.submit('site-a', make_run(1), {})
+    start = time.time()
+    writer.stop()
+    
+    assert time.time() - start < 2.0
+    assert [run['runId'] for batch in db.batches for _, run, _ in batch] == ['run-1']
+
+def test_torn_journal_lines_are_skipped_and_leftover_replays_resumed():
+    db = FlakyDatabase()
+    journal = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    # Leftover of an interrupted replay, and a journal whose last line was torn by a crash
+    with open(journal + '.replay', 'w') as f:
+        f.write('{"site": "site-a", "run": {"runId": "run-0", "timestamp": "2025-06-25T10:00:00Z", "results": []}}\n')
+    with open(journal, 'w') as f:
+        f.write('{"site": "site-a", "run": {"runId": "run-1", "timestamp": "2025-06-25T10:00:00Z", "results": []}}\n')
+        f.write('{"site": "site-a", "run": {"runId": "ru')
+    writer = WriteBehindQueue(db, flush_interval=0.05, journal_path=journal).start()
+    
+    writer.submit('site-a', make_run(2), {})
+    writer.flush(timeout=5)
+    assert writer._thread.is_alive()
+    writer.submit('site-a', make_run(3), {})
+    writer.stop()
+    
+    saved = sorted(run['runId'] for batch in db.batches for _, run, _ in batch)
+    assert saved == ['run-0', 'run-1', 'run-2', 'run-3']
+    assert writer.stats['corrupt'] == 1
+    assert not os.path.exists(journal) and not os.path.exists(journal + '.replay')
+
+def test_database_down_at_startup_is_journaled():
+    db = FlakyDatabase()
+    journal = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    connects = []
+    
+    def connect():
+        connects.append(db.online)
+        if not db.online:
+            raise OperationalError("connection refused")
+        return db
+    
+    db.online = False
+    writer = WriteBehindQueue(connect, max_retries=1, backoff_base=0.01, journal_path=journal,
+                              transient_errors=(OperationalError,))
+    assert writer.submit('site-a', make_run(1), {})
+    writer.flush()
+    assert os.path.exists(journal) and writer.stats['spilled'] == 1
+    
+    db.online = True
+    writer.submit('site-a', make_run(2), {})
+    writer.flush()
+    assert [run['runId'] for batch in db.batches for _, run, _ in batch] == ['run-2', 'run-1']
+    assert connects[-1] is True
+
+if __name__ == "__main__":
+    test_runs_are_batched_into_one_transaction()
+    test_outage_spills_to_journal_and_replays()
+    test_stop_does_not_wait_out_the_batch_window()
+    test_torn_journal_lines_are_skipped_and_leftover_replays_resumed()
+    test_database_down_at_startup_is_journaled()
+    print("✅ Write-behind queue tests passed")
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Synthetic workload generator for load-testing ingestion and scoring.
+
+Generates N sites x M endpoint templates over a series of runs, with
+realistic URL variation (numeric IDs, slugs, UUIDs, session tokens),
+per-template error/empty/latency distributions and injected regressions
+(error spikes, latency shifts, empty responses) that start part-way
+through the series. Every call is derived from (seed, site, run), so the
+same arguments always produce the same data, whichever formats are written.
+
+Output is written run by run, so memory is bounded by one run's calls and
+datasets of any size can be streamed to disk in the formats ApiLens reads:
+
+    logs        logs/<site>/<runId>.json (multi-site runner output)
+    snapshots   snapshots/<site>/snapshot_<runId> (json, ndjson or cols)
+    csv         capture.csv (captured-traffic CSV)
+    monitoring  monitoring.json (monitoring runs with httpFailures/emptyResponses)
+    history     history/ (memory-mapped HistoryStore)
+
+A workload.json manifest records the configuration, templates and injected
+regressions.
+
+Usage:
+    python workload_generator.py --out ../workload --sites 3 --templates 20 --runs 48 --calls 1000
+                                 [--formats logs,snapshots,csv,monitoring,history] [--snapshot-format cols]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator
+
+FORMATS = ('logs', 'snapshots', 'csv', 'monitoring', 'history')
+
+RESOURCES = ['products', 'categories', 'cart', 'orders', 'users', 'reviews', 'brands', 'offers',
+             'wishlist', 'prescriptions', 'addresses', 'payments', 'search', 'lab-tests', 'articles']
+SLUGS = ['vitamins', 'diabetes-care', 'skin-care', 'ayurveda', 'baby-care', 'homeopathy',
+         'fitness', 'personal-care', 'covid-essentials', 'heart-care']
+SHAPES = ['/api/{resource}', '/api/{resource}/{id}', '/api/{resource}/{slug}',
+          '/api/{resource}/{uuid}', '/api/{resource}/{id}/details', '/api/v2/{resource}/{token}']
+REGRESSION_KINDS = ('errors', 'latency', 'empty')
+
+def _uuid(rng: random.Random) -> str:
+    return '%08x-%04x-%04x-%04x-%012x' % (rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                                          rng.getrandbits(16), rng.getrandbits(48))
+
+def _token(rng: random.Random) -> str:
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(24))
+
+class WorkloadGenerator:
+    def __init__(self, sites: int = 3, templates: int = 20, runs: int = 24, calls_per_run: int = 500,
+                 error_rate: float = 0.02, empty_rate: float = 0.03, latency_median: float = 150.0,
+                 latency_sigma: float = 0.6, regressions: int = 2, regression_factor: float = 4.0,
+                 id_pool: int = 50, seed: int = 42, start: datetime = None, interval_minutes: int = 60):
+        self.sites = [f"site-{i + 1:02d}" for i in range(sites)]
+        self.runs = runs
+        self.calls_per_run = calls_per_run
+        self.latency_sigma = latency_sigma
+        self.regression_factor = regression_factor
+        self.id_pool = id_pool
+        self.seed = seed
+        self.interval = timedelta(minutes=interval_minutes)
+        if start is None:
+            now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            start = now - self.interval * runs
+        elif start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        self.start = start
+
+        rng = random.Random(f"{seed}:templates")
+        self.templates = []
+        for i in range(templates):
+            shape = SHAPES[i % len(SHAPES)] if i < len(SHAPES) else rng.choice(SHAPES)
+            self.templates.append({
+                'path': shape.replace('{resource}', RESOURCES[i % len(RESOURCES)] + ('' if i < len(RESOURCES) else f"-{i}")),
+                'method': 'POST' if rng.random() < 0.15 else 'GET',
+                # Per-template spread around the global rates
+                'error_rate': min(error_rate * rng.lognormvariate(0, 0.5), 1.0),
+                'empty_rate': min(empty_rate * rng.lognormvariate(0, 0.5), 1.0),
+                'latency_median': latency_median * rng.lognormvariate(0, 0.4),
+                # Zipf-like traffic: a few templates get most calls
+                'weight': 1 / (i + 1),
+            })
+        self._weights = [t['weight'] for t in self.templates]
+
+        rng = random.Random(f"{seed}:regressions")
+        pairs = [(site, t) for site in self.sites for t in range(templates)]
+        self.regressions = [{
+            'site': site,
+            'template': self.templates[t]['path'],
+            'kind': REGRESSION_KINDS[i % len(REGRESSION_KINDS)],
+            'from_run': rng.randint(runs // 2, max(runs // 2, runs - 1)),
+        } for i, (site, t) in enumerate(rng.sample(pairs, min(regressions, len(pairs))))]
+        self._regressions = {(r['site'], r['template']): r for r in self.regressions}
+        self._filled = {}
+
+    # -- calls ----------------------------------------------------------------
+
+    def run_id(self, run: int) -> str:
+        # Same shape as the Node.js runner: ISO time with ':' and '.' replaced
+        return self.run_time(run).isoformat(timespec='milliseconds').replace('+00:00', 'Z').replace(':', '-').replace('.', '-')
+
+    def run_time(self, run: int) -> datetime:
+        return self.start + self.interval * run
+
+    def _fill(self, path: str, rng: random.Random) -> str:
+        # IDs come from a bounded pool so the same URLs recur across runs
+        key = (path, rng.randrange(self.id_pool))
+        filled = self._filled.get(key)
+        if filled is None:
+            pool = random.Random(f"{self.seed}:{path}:{key[1]}")
+            filled = self._filled[key] = path.format(id=pool.randint(1, 10 ** 6), slug=pool.choice(SLUGS),
+                                                     uuid=_uuid(pool), token=_token(pool))
+        return filled
+
+    def iter_run(self, site: str, run: int) -> Iterator[Dict[str, Any]]:
+        """Calls for one run of one site, as multi-site runner results"""
+        rng = random.Random(f"{self.seed}:{site}:{run}")
+        base_url = f"https://{site}.example"
+        run_start = self.run_time(run)
+        run_id = self.run_id(run)
+        for i, template in enumerate(rng.choices(self.templates, weights=self._weights, k=self.calls_per_run)):
+            error_rate, empty_rate = template['error_rate'], template['empty_rate']
+            latency_median = template['latency_median']
+            regression = self._regressions.get((site, template['path']))
+            if regression and run >= regression['from_run']:
+                if regression['kind'] == 'errors':
+                    error_rate = min(max(error_rate, 0.01) * self.regression_factor * 5, 1.0)
+                elif regression['kind'] == 'latency':
+                    latency_median *= self.regression_factor
+                else:
+                    empty_rate = min(max(empty_rate, 0.01) * self.regression_factor * 5, 1.0)
+
+            path = self._fill(template['path'], rng)
+            latency = int(rng.lognormvariate(math.log(latency_median), self.latency_sigma))
+            failed = rng.random() < error_rate
+            status = (0 if rng.random() < 0.1 else rng.choice((500, 502, 503, 504))) if failed else 200
+            empty = not failed and rng.random() < empty_rate
+            result = {
+                'endpoint': path,
+                'method': template['method'],
+                'url': base_url + path,
+                'statusCode': status,
+                'latency': latency,
+                'responseSize': 0 if failed or empty else rng.randint(200, 20000),
+                'isEmpty': failed or empty,
+                'success': not failed,
+                'timestamp': (run_start + timedelta(milliseconds=i * 50)).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+                'attempt': 1,
+                'site': site,
+                'runId': run_id,
+            }
+            if status == 0:
+                result['error'] = 'timeout of 10000ms exceeded'
+            yield result
+
+    def iter_runs(self) -> Iterator[tuple]:
+        """(site, run index, results) in time order"""
+        for run in range(self.runs):
+            for site in self.sites:
+                yield site, run, list(self.iter_run(site, run))
+
+    # -- writers --------------------------------------------------------------
+
+    def write(self, out_dir: str, formats=FORMATS, snapshot_format: str = 'json') -> Dict[str, Any]:
+        """Write the workload in the given formats in one pass; returns the manifest"""
+        os.makedirs(out_dir, exist_ok=True)
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown formats: {', '.join(sorted(unknown))}")
+
+        writers = []
+        try:
+            if 'logs' in formats:
+                writers.append(self._log_writer(os.path.join(out_dir, 'logs')))
+            if 'snapshots' in formats:
+                writers.append(self._snapshot_writer(os.path.join(out_dir, 'snapshots'), snapshot_format))
+            if 'csv' in formats:
+                writers.append(self._csv_writer(os.path.join(out_dir, 'capture.csv')))
+            if 'monitoring' in formats:
+                writers.append(self._monitoring_writer(os.path.join(out_dir, 'monitoring.json')))
+            if 'history' in formats:
+                writers.append(self._history_writer(os.path.join(out_dir, 'history')))
+            for writer in writers:
+                next(writer)
+
+            calls = 0
+            for site, run, results in self.iter_runs():
+                calls += len(results)
+                for writer in writers:
+                    writer.send((site, run, results))
+        finally:
+            for writer in writers:
+                writer.close()
+
+        manifest = {
+            'seed': self.seed, 'sites': self.sites, 'runs': self.runs, 'calls_per_run': self.calls_per_run,
+            'calls': calls, 'start': self.start.isoformat(), 'interval_minutes': self.interval.total_seconds() / 60,
+            'formats': list(formats), 'snapshot_format': snapshot_format,
+            'templates': self.templates, 'regressions': self.regressions,
+        }
+        with open(os.path.join(out_dir, 'workload.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _log_writer(self, logs_dir: str):
+        while True:
+            site, run, results = yield
+            site_dir = os.path.join(logs_dir, site)
+            os.makedirs(site_dir, exist_ok=True)
+            with open(os.path.join(site_dir, f"{self.run_id(run)}.json"), 'w') as f:
+                header = {'site': site, 'runId': self.run_id(run),
+                          'timestamp': self.run_time(run).isoformat().replace('+00:00', 'Z'),
+                          'config': {'name': site, 'baseUrl': f"https://{site}.example"}}
+                f.write(json.dumps(header)[:-1] + ', "results": [\n')
+                f.write(',\n'.join(json.dumps(result) for result in results))
+                f.write('\n]}\n')
+
+    def _snapshot_writer(self, snapshots_dir: str, snapshot_format: str):
+        from snapshot_loader import SnapshotLoader
+        loaders = {}
+        try:
+            while True:
+                site, run, results = yield
+                if site not in loaders:
+                    loaders[site] = SnapshotLoader(os.path.join(snapshots_dir, site), snapshot_format=snapshot_format)
+                apis = [{
+                    'id': f"{r['method']}_{''.join(c if c.isalnum() else '_' for c in r['url'])}"[:100],
+                    'url': r['url'], 'method': r['method'],
+                    'status': 'fail' if not r['success'] else 'pass',
+                    'statusCode': r['statusCode'], 'isEmpty': r['isEmpty'],
+                    'latency': r['latency'], 'size': r['responseSize'],
+                } for r in results]
+                timestamp = self.run_time(run).isoformat().replace('+00:00', 'Z')
+                loaders[site].write_snapshot(f"snapshot_{self.run_id(run)}", {
+                    'timestamp': timestamp, 'runId': self.run_id(run),
+                    'summary': {
+                        'totalAPIs': len(apis),
+                        'failures': sum(1 for a in apis if a['status'] == 'fail'),
+                        'emptyResponses': sum(1 for a in apis if a['isEmpty']),
+                        'avgLatency': sum(a['latency'] for a in apis) / len(apis) if apis else 0,
+                    },
+                    'apis': apis,
+                })
+        finally:
+            for loader in loaders.values():
+                if loader.catalog:
+                    loader.catalog.close()
+
+    def _csv_writer(self, path: str):
+        # Same layout as the browser captures: quoted strings, bare numbers and true/false
+        with open(path, 'w', newline='') as f:
+            f.write('URL,Method,StatusCode,ResponseTime,IsEmpty,Timestamp\n')
+            while True:
+                _, _, results = yield
+                f.write(''.join(
+                    f"{_quote(r['url'])},{_quote(r['method'])},{r['statusCode']},{r['latency']},"
+                    f"{'true' if r['isEmpty'] else 'false'},{_quote(r['timestamp'])}\n"
+                    for r in results))
+
+    def _monitoring_writer(self, path: str):
+        with open(path, 'w') as f:
+            f.write('[')
+            first = True
+            try:
+                while True:
+                    site, run, results = yield
+                    details = [{
+                        'timestamp': r['timestamp'], 'url': r['url'], 'method': r['method'],
+                        'statusCode': r['statusCode'], 'page': site, 'isEmpty': r['isEmpty'],
+                        'type': 'HTTP_ERROR' if not r['success'] else ('EMPTY_RESPONSE' if r['isEmpty'] else 'SUCCESS'),
+                    } for r in results]
+                    monitoring_run = {
+                        'timestamp': self.run_time(run).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+                        'httpFailures': [d for d in details if d['type'] == 'HTTP_ERROR'],
+                        'emptyResponses': [d for d in details if d['type'] == 'EMPTY_RESPONSE'],
+                        'successfulCalls': [d for d in details if d['type'] == 'SUCCESS'],
+                        'totalAPIs': len(details),
+                        'apiDetails': details,
+                    }
+                    f.write(('\n' if first else ',\n') + json.dumps(monitoring_run))
+                    first = False
+            finally:
+                f.write('\n]\n')
+
+    def _history_writer(self, history_dir: str):
+        from history_store import HistoryStore
+        store = HistoryStore(os.path.abspath(history_dir))
+        try:
+            while True:
+                site, run, results = yield
+                store.append(site, ({
+                    'endpoint': r['endpoint'], 'timestamp': r['timestamp'], 'status_code': r['statusCode'],
+                    'response_size': r['responseSize'], 'latency': r['latency'], 'is_empty': r['isEmpty'],
+                } for r in results), source=f"{site}:{self.run_id(run)}")
+        finally:
+            store.close()
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic ApiLens workload')
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--sites', type=int, default=3)
+    parser.add_argument('--templates', type=int, default=20, help='Endpoint templates per site')
+    parser.add_argument('--runs', type=int, default=24)
+    parser.add_argument('--calls', type=int, default=500, help='Calls per run per site')
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--empty-rate', type=float, default=0.03)
+    parser.add_argument('--latency-median', type=float, default=150.0, help='Median latency in ms')
+    parser.add_argument('--latency-sigma', type=float, default=0.6, help='Log-normal spread')
+    parser.add_argument('--regressions', type=int, default=2, help='Injected (site, template) regressions')
+    parser.add_argument('--regression-factor', type=float, default=4.0)
+    parser.add_argument('--id-pool', type=int, default=50, help='Distinct IDs per template')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start', help='ISO start time (default: --runs intervals before now)')
+    parser.add_argument('--interval-minutes', type=int, default=60)
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--snapshot-format', choices=['json', 'ndjson', 'cols'], default='json')
+    args = parser.parse_args()
+
+    generator = WorkloadGenerator(
+        sites=args.sites, templates=args.templates, runs=args.runs, calls_per_run=args.calls,
+        error_rate=args.error_rate, empty_rate=args.empty_rate, latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma, regressions=args.regressions,
+        regression_factor=args.regression_factor, id_pool=args.id_pool, seed=args.seed,
+        start=datetime.fromisoformat(args.start.replace('Z', '+00:00')) if args.start else None,
+        interval_minutes=args.interval_minutes)
+    manifest = generator.write(args.out, args.formats.split(','), args.snapshot_format)
+
+    print(f"🧪 Generated {manifest['calls']:,} calls ({len(manifest['sites'])} sites x {args.runs} runs x "
+          f"{args.calls} calls) in {args.out}")
+    for regression in manifest['regressions']:
+        print(f"   regression: {regression['kind']} on {regression['site']} {regression['template']} "
+              f"from run {regression['from_run']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue for database persistence.
+
+Runs are queued by the processor and written by a background thread, several
+runs per transaction. When the database is unreachable the batch is retried
+with exponential backoff and finally spilled to a JSON-lines journal on disk,
+which is replayed once the database accepts writes again.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from pipeline_metrics import timed_stage
+
+# Queued by stop() to end the writer's batching wait early
+_WAKE = object()
+
+class WriteBehindQueue:
+    def __init__(self, db, max_pending: int = 1000, batch_size: int = 50,
+                 flush_interval: float = 1.0, put_timeout: float = 5.0,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 journal_path: str = None, on_commit: Optional[Callable[[List[str]], None]] = None,
+                 transient_errors: Tuple = None):
+        # A DatabaseManager, or a callable returning one. A callable is first called by a
+        # write, so a database that is down at startup is retried and journaled like any
+        # outage instead of failing the submit; pass its backend's transient_errors with it.
+        self._db = None if callable(db) else db
+        self._db_factory = db if callable(db) else None
+        # Errors that mean "database unreachable, try again later" for this backend
+        self.transient_errors = transient_errors if transient_errors is not None else self.db.backend.transient_errors
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.journal_path = journal_path or os.getenv(
+            'APILENS_DB_JOURNAL',
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'db_journal.jsonl'))
+        self.on_commit = on_commit
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._journal_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_replay = 0.0
+
+        self.stats = {'committed': 0, 'batches': 0, 'retries': 0, 'spilled': 0, 'replayed': 0, 'rejected': 0, 'corrupt': 0}
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = self._db_factory()
+        return self._db
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='apilens-write-behind', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, site: str, run_data: Dict, endpoint_stats: Dict = None) -> bool:
+        """Queue a run for persistence. Blocks up to put_timeout when the queue is
+        full (backpressure), then spills the run to the journal instead."""
+        item = (site, run_data, endpoint_stats)
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            print(f"Write-behind queue full, journaling run for {site}")
+            self._spill([item])
+            return False
+
+    def pending(self) -> int:
+        """Number of runs waiting to be written"""
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = None):
+        """Wait until every queued run has been written or journaled"""
+        if self._thread is None or not self._thread.is_alive():
+            while not self._queue.empty():
+                self._drain_once()
+            return
+
+        deadline = time.time() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(0.05)
+
+    def stop(self, timeout: float = 30.0):
+        """Flush outstanding runs and stop the writer thread"""
+        # Wake the writer so it does not linger for more runs that will never come
+        self._stop.set()
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+        self.flush(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Anything still queued (e.g. flush timed out) goes to the journal
+        leftover = self._take_batch(block=False, limit=None)
+        if leftover:
+            self._spill(leftover)
+            self._mark_done(len(leftover))
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                self._drain_once()
+            except Exception as e:
+                # The writer must outlive any one bad batch or journal, or submit() would queue forever
+                print(f"Write-behind writer error: {e}")
+
+    def _drain_once(self):
+        """Collect one batch, write it, and replay the journal when healthy"""
+        batch = self._take_batch(block=self._thread is not None, limit=self.batch_size)
+        if not batch:
+            # Idle: retry journaled runs left over from an earlier outage
+            if os.path.exists(self.journal_path) and time.time() - self._last_replay >= self.backoff_max:
+                self._last_replay = time.time()
+                self._replay_journal()
+            return
+
+        try:
+            if self._write_with_retry(batch):
+                self._replay_journal()
+            else:
+                self._spill(batch)
+        finally:
+            self._mark_done(len(batch))
+
+    def _take_batch(self, block: bool, limit: Optional[int]) -> List[Tuple]:
+        batch = []
+        deadline = None
+        while limit is None or len(batch) < limit:
+            try:
+                if block and deadline is None:
+                    item = self._queue.get(timeout=self.flush_interval)
+                    # Linger briefly so runs from several files share a transaction
+                    deadline = time.time() + self.flush_interval
+                elif block:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _WAKE:
+                self._queue.task_done()
+                break
+            batch.append(item)
+        return batch
+
+    def _mark_done(self, count: int):
+        for _ in range(count):
+            self._queue.task_done()
+
+    def _write_with_retry(self, batch: List[Tuple]) -> bool:
+        """Write a batch in one transaction, backing off on transient errors.
+        Returns False only when the database stayed unreachable."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed_stage('db_save', sum(len(run_data.get('results', [])) for _, run_data, _ in batch)):
+                    self.db.save_test_runs(batch)
+            except self.transient_errors as e:
+                if attempt == self.max_retries:
+                    print(f"Database unavailable after {attempt + 1} attempts: {e}")
+                    return False
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                self.stats['retries'] += 1
+                print(f"Database write failed ({e}), retrying in {delay:.1f}s")
+                if self._stop.wait(delay):
+                    # Shutting down: journal the batch instead of waiting it out
+                    return False
+                continue
+            except Exception as e:
+                print(f"Failed to save batch to database: {e}")
+                return self._write_individually(batch)
+
+            self.stats['committed'] += len(batch)
+            self.stats['batches'] += 1
+            self._notify_commit(batch)
+            return True
+        return False
+
+    def _write_individually(self, batch: List[Tuple]) -> bool:
+        """Isolate bad runs so one malformed file does not sink the whole batch"""
+        committed = []
+        for item in batch:
+            try:
+                self.db.save_test_runs([item])
+                committed.append(item)
+            except self.transient_errors:
+                self._spill([item])
+            except Exception as e:
+                # Bad data will not get better by retrying; keep it for inspection
+                print(f"Rejected run for {item[0]}: {e}")
+                self._spill([item], self.journal_path + '.rejected')
+                self.stats['rejected'] += 1
+
+        self.stats['committed'] += len(committed)
+        if committed:
+            self._notify_commit(committed)
+        return True
+
+    def _notify_commit(self, batch: List[Tuple]):
+        if not self.on_commit:
+            return
+        sites = sorted({site for site, _, _ in batch})
+        try:
+            self.on_commit(sites)
+        except Exception as e:
+            print(f"Post-commit hook failed: {e}")
+
+    def _spill(self, batch: List[Tuple], path: str = None):
+        """Append runs to the on-disk journal"""
+        path = path or self.journal_path
+        with self._journal_lock:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a+', encoding='utf-8') as f:
+                # Start on a fresh line after a line torn by a crash, so only that line is lost
+                if f.tell():
+                    f.seek(f.tell() - 1)
+                    if f.read(1) != '\n':
+                        f.write('\n')
+                for site, run_data, endpoint_stats in batch:
+                    f.write(json.dumps({'site': site, 'run': run_data, 'endpoint_stats': endpoint_stats}) + '\n')
+        if path == self.journal_path:
+            self.stats['spilled'] += len(batch)
+        print(f"Journaled {len(batch)} runs to {path}")
+
+    def _replay_journal(self):
+        """Write journaled runs back to the database, batch by batch"""
+        replay_path = self.journal_path + '.replay'
+        with self._journal_lock:
+            if os.path.exists(replay_path):
+                # An earlier replay was interrupted: replay its leftovers along with the journal
+                if os.path.exists(self.journal_path):
+                    with open(self.journal_path, 'rb') as src, open(replay_path, 'ab') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+            elif os.path.exists(self.journal_path):
+                os.replace(self.journal_path, replay_path)
+            else:
+                return
+
+        replayed = 0
+        batch = []
+        failed = False
+        with open(replay_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    item = (entry['site'], entry['run'], entry.get('endpoint_stats'))
+                except (ValueError, KeyError, TypeError):
+                    # e.g. a line torn by a crash while journaling; the other runs still replay
+                    self.stats['corrupt'] += 1
+                    print(f"Skipping unreadable journal line in {replay_path}")
+                    continue
+                if failed:
+                    # Database went away mid-replay: keep the rest for later
+                    self._spill([item])
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    failed = not self._replay_batch(batch)
+                    replayed += 0 if failed else len(batch)
+                    batch = []
+        if batch and not failed:
+            replayed += len(batch) if self._replay_batch(batch) else 0
+
+        os.remove(replay_path)
+        self.stats['replayed'] += replayed
+        if replayed:
+            print(f"Replayed {replayed} journaled runs")
+
+    def _replay_batch(self, batch: List[Tuple]) -> bool:
+        if self._write_with_retry(batch):
+            return True
+        self._spill(batch)
+        return False
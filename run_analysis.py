@@ -11,8 +11,16 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python'))
 
 from python.analyzer import ApiLensAnalyzer
+from profiling import profile_if_requested, start_sampling_if_requested
 
 def main():
+    # --profile / --profile-sampling work with every command
+    profiler = profile_if_requested('run_analysis')
+    start_sampling_if_requested('run_analysis')
+    with profiler:
+        run_command()
+
+def run_command():
     print("🐍 ApiLens Python Analytics")
     print("=" * 40)
     
@@ -26,6 +34,11 @@ def main():
             output_file = sys.argv[2] if len(sys.argv) > 2 else "analysis_summary.json"
             analyzer.analyze_latest_runs(output_file)
             
+        elif command == "trend":
+            print("📈 Running trend analysis...")
+            count = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+            analyzer.analyze_trend(count)
+            
         elif command == "server":
             print("🚀 Starting Prometheus metrics server...")
             analyzer.start_prometheus_server()
@@ -33,7 +46,9 @@ def main():
         else:
             print("Usage:")
             print("  python run_analysis.py analyze [output_file]")
+            print("  python run_analysis.py trend [count]")
             print("  python run_analysis.py server")
+            print("Options: --profile[=DIR] (cProfile + tracemalloc report), --profile-sampling (dump on SIGUSR1)")
     else:
         # Default: run analysis
         print("📊 Running default analysis...")